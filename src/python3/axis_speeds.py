@@ -32,3 +32,71 @@ class AxisSpeeds():
     # Transforms the axis specific speeds into motor specific speeds
     def toMotorSignals(self):
         return numpy.dot(self.asArray(),TRANSFORMATION_MATRIX).A1
+
+
+# Transforms the target speeds of the axes into motor signals in [0.0, 1.0], like AxisSpeeds.toMotorSignals, but
+# without creating arrays and with desaturation: when the motors cannot follow all axes, the vertical speed is given
+# up first, then the y/yaw rotation, and the x/roll and z/pitch rotations are only scaled down when they alone need more
+# than the whole range of the motors.
+# The signals are written into the preallocated array signals, it is reused by the next call of mix.
+class MotorMixer:
+
+    # matrix: transformation from axis speeds to motor speeds, like TRANSFORMATION_MATRIX.
+    #         The vertical speed must have the same weight for all motors.
+    def __init__(self, matrix=TRANSFORMATION_MATRIX):
+        matrix = numpy.asarray(matrix)
+        (self._roll, self._yaw, self._pitch, vertical) = matrix.tolist()
+        assert vertical.count(vertical[0]) == len(vertical)
+        self._vertical = vertical[0]
+
+        self.signals = numpy.zeros(len(vertical))
+
+        # number of mixed signals, how often the vertical speed had to be limited, and how often the rotations
+        # had to be scaled down
+        self.mixed = 0
+        self.vertical_limited = 0
+        self.rotation_limited = 0
+
+    # speeds: target speeds of x/roll, y/yaw and z/pitch rotation and the vertical speed, like AxisSpeeds.asArray
+    # returns the motor signals, each in [0.0, 1.0]
+    def mix(self, speeds):
+        (roll, yaw, pitch, up) = speeds.tolist() if isinstance(speeds, numpy.ndarray) else speeds
+        self.mixed += 1
+
+        # the rotations first: x/roll and z/pitch must fit into the range of the motors
+        rotation = [roll * r + pitch * p for (r, p) in zip(self._roll, self._pitch)]
+        spread = max(rotation) - min(rotation)
+        if spread > 1.0:
+            rotation = [value / spread for value in rotation]
+            self.rotation_limited += 1
+        elif yaw != 0.0:
+            # then y/yaw, as much as fits
+            with_yaw = [value + yaw * y for (value, y) in zip(rotation, self._yaw)]
+            spread_with_yaw = max(with_yaw) - min(with_yaw)
+            if spread_with_yaw > 1.0:
+                # the spread is convex in the yaw share, so this share leaves it at most 1
+                share = (1.0 - spread) / (spread_with_yaw - spread)
+                rotation = [value + share * yaw * y for (value, y) in zip(rotation, self._yaw)]
+                self.rotation_limited += 1
+            else:
+                rotation = with_yaw
+
+        # the vertical speed moves all motors together, it is limited to what keeps all of them in range
+        vertical = up * self._vertical
+        low = -min(rotation)
+        high = 1.0 - max(rotation)
+        if vertical < low:
+            vertical = low
+            self.vertical_limited += 1
+        elif vertical > high:
+            vertical = high
+            self.vertical_limited += 1
+
+        signals = self.signals
+        for (motor, value) in enumerate(rotation):
+            signals[motor] = min(1.0, max(0.0, value + vertical))
+        return signals
+
+    def __str__(self):
+        return "mixed: %d, vertical speed limited: %d, rotations limited: %d" % (
+            self.mixed, self.vertical_limited, self.rotation_limited)
@@ -1,6 +1,6 @@
 import unittest
 import numpy
-from axis_speeds import AxisSpeeds
+from axis_speeds import AxisSpeeds, MotorMixer
 
 class TestAxisSpeeds(unittest.TestCase):
 
@@ -74,5 +74,39 @@ class TestAxisSpeeds(unittest.TestCase):
         self.assertEqual(len(speeds.toMotorSignals()), 4)
         self.assertTrue((speeds.toMotorSignals() == numpy.array([0.25, 0.25, 0.25, 0.25])).all())
 
+
+class TestMotorMixer(unittest.TestCase):
+
+    def test_in_range(self):
+        speeds = AxisSpeeds()
+        speeds.axis_rotation_speeds[:] = [0.4, 0.2, -0.3]
+        speeds.vertical_speed = 2
+
+        mixer = MotorMixer()
+        numpy.testing.assert_allclose(mixer.mix(speeds.asArray()), speeds.toMotorSignals())
+        self.assertEqual((mixer.mixed, mixer.vertical_limited, mixer.rotation_limited), (1, 0, 0))
+
+    def test_vertical_given_up_first(self):
+        mixer = MotorMixer()
+
+        # full speed up and roll: the roll difference between the motors is kept
+        numpy.testing.assert_allclose(mixer.mix([0.4, 0, 0, 4]), [1.0, 0.8, 1.0, 0.8])
+        # down and roll: the motors on one side stop, the others keep the roll
+        numpy.testing.assert_allclose(mixer.mix([0.4, 0, 0, -2]), [0.2, 0.0, 0.2, 0.0])
+        self.assertEqual((mixer.vertical_limited, mixer.rotation_limited), (2, 0))
+
+    def test_rotation_limits(self):
+        mixer = MotorMixer()
+
+        # roll alone needs more than the range of the motors
+        numpy.testing.assert_allclose(mixer.mix([8, 0, 0, 0]), [1.0, 0.0, 1.0, 0.0])
+        # roll takes the whole range, yaw is given up
+        numpy.testing.assert_allclose(mixer.mix([2, 1, 0, 2]), [1.0, 0.0, 1.0, 0.0])
+        self.assertEqual(mixer.rotation_limited, 2)
+
+        signals = mixer.mix(numpy.array([-3.0, 2.5, 1.5, 7.0]))
+        self.assertTrue(((0.0 <= signals) & (signals <= 1.0)).all())
+
+
 if __name__ == '__main__':
     unittest.main()
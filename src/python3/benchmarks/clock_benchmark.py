@@ -0,0 +1,40 @@
+# Cost of reading the time: datetime.now (what the Timer and the SRF02 used before) compared to the util.clock clocks.
+# Run from src/python3 with: python3 -m benchmarks.clock_benchmark [number of calls]
+import sys
+import time
+from datetime import datetime
+from util.clock import MonotonicClock, SimulatedClock
+from util.timer import Timer
+
+
+def report(name, duration, N):
+    print("%-40s %8.3f us per call" % (name, duration / N * 1e6))
+
+
+def benchmark(N):
+    last = datetime.now()
+    start = time.perf_counter()
+    for i in range(N):
+        now = datetime.now()
+        (now - last).total_seconds()
+        last = now
+    report("datetime.now() difference", time.perf_counter() - start, N)
+
+    for (name, clock) in [("MonotonicClock", MonotonicClock()), ("SimulatedClock", SimulatedClock())]:
+        last = clock()
+        start = time.perf_counter()
+        for i in range(N):
+            now = clock()
+            now - last
+            last = now
+        report(name + " difference", time.perf_counter() - start, N)
+
+        timer = Timer(clock)
+        start = time.perf_counter()
+        for i in range(N):
+            timer.readAndReset()
+        report("Timer.readAndReset with " + name, time.perf_counter() - start, N)
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,47 @@
+# Cost of one ControlLoop step in a steady hover: planning on every step compared to the multi-rate mode, where the
+# PIDs follow plans that are only renewed every TIME_BETWEEN_REPLANNING seconds, and to reusing the plans while the
+# vehicle follows them.
+# Run from src/python3 with: python3 -m benchmarks.control_loop_benchmark [number of steps]
+import sys
+import time
+from types import SimpleNamespace
+from controlLoop import ControlLoop, TIME_BETWEEN_CONTROL_LOOP_UPDATES, TIME_BETWEEN_PID_UPDATES, \
+    TIME_BETWEEN_REPLANNING
+from pid import PIDControllerBank
+from state_change_planning import State
+from state_change_planning_3d import State3d
+
+
+class NoMotors:
+    def setSpeed(self, motor_speeds):
+        pass
+
+
+def pids():
+    return PIDControllerBank(1, 0.1, 0.01, [0, 0, 0, 0], -1, 1)
+
+
+def benchmark(N):
+    state = SimpleNamespace(attitude=SimpleNamespace(rotation=State3d(State(0.01, 0.002), State(-0.01, 0.0))),
+                            height=SimpleNamespace(height_above_ground=1.0, vertical_speed=0.001))
+    target = SimpleNamespace(rotation=State3d(), elevation=State(1.0, 0.0))
+
+    for (name, update_interval, replanning_interval, tracking_tolerance) in [
+            ("planning every step", TIME_BETWEEN_CONTROL_LOOP_UPDATES, None, None),
+            ("plan reuse", TIME_BETWEEN_CONTROL_LOOP_UPDATES, None, 0.05),
+            ("multi-rate", TIME_BETWEEN_PID_UPDATES, TIME_BETWEEN_REPLANNING, None),
+            ("multi-rate, plan reuse", TIME_BETWEEN_PID_UPDATES, TIME_BETWEEN_REPLANNING, 0.05)]:
+        loop = ControlLoop(NoMotors(), pids(), update_interval=update_interval, replanning_interval=replanning_interval,
+                           tracking_tolerance=tracking_tolerance)
+        loop.set_target_state(target)
+        start = time.perf_counter()
+        for i in range(N):
+            loop.step(update_interval, state)
+        duration = time.perf_counter() - start
+        print("%-24s %8.1f us per step, %5d plans, %5d reused, %.1f%% CPU at %d Hz" % (
+            name, duration / N * 1e6, loop.replans, loop.reuses, duration / N / update_interval * 100,
+            round(1 / update_interval)))
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,52 @@
+# Cost of appending one record to the FlightRecorder, compared to the text logging of the state that it replaces.
+# Run from src/python3 with: python3 -m benchmarks.flight_recorder_benchmark [number of records]
+import logging
+import os
+import sys
+import tempfile
+import time
+from util.flight_recorder import FlightRecorder, load_flight
+from util.flight_recorder_test import vehicle_state
+
+
+def report(name, duration, N):
+    print("%-40s %8.2f us per record" % (name, duration / N * 1e6))
+
+
+def benchmark(N):
+    states = [vehicle_state(i) for i in range(100)]
+    (handle, path) = tempfile.mkstemp(suffix=".rec")
+    os.close(handle)
+
+    try:
+        recorder = FlightRecorder(path, capacity=N)
+        start = time.perf_counter()
+        for i in range(N):
+            recorder.new_state(0.01, states[i % 100])
+            recorder.record_control((0.0, 0.0, 0.0, 0.5), (0.5, 0.5, 0.5, 0.5))
+        report("FlightRecorder append + record_control", time.perf_counter() - start, N)
+        recorder.close()
+
+        start = time.perf_counter()
+        flight = load_flight(path)
+        flight["height"].mean(axis=0)
+        report("load_flight and mean height", time.perf_counter() - start, N)
+        print("file size: %.1f MB" % (os.path.getsize(path) / 1e6))
+
+        handler = logging.FileHandler(path, mode="w")
+        log = logging.getLogger("flight_recorder_benchmark")
+        log.propagate = False
+        log.addHandler(handler)
+        log.setLevel(logging.DEBUG)
+        start = time.perf_counter()
+        for i in range(N):
+            state = states[i % 100]
+            log.debug("%s %s %s %s", state.attitude.raw, state.height, state.gps, state.air_pressure)
+        report("logging.debug of the state", time.perf_counter() - start, N)
+        handler.close()
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,26 @@
+# CPU usage and sample latency of the two IMU acquisition modes of the AttitudeProvider.
+# Needs the IMU hardware. Run from src/python3 with: python3 -m benchmarks.imu_acquisition_benchmark [seconds per mode]
+import sys
+import time
+from sensorfusion.attitude_provider import AttitudeProvider
+
+
+def benchmark(sleep_until_sample, duration):
+    provider = AttitudeProvider(sleep_until_sample=sleep_until_sample)
+
+    # warm up, then measure
+    for i in range(100):
+        provider.update()
+    provider.statistics.reset()
+
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        provider.update()
+
+    print("%-20s %s" % ("sleep until sample:" if sleep_until_sample else "busy wait:", provider.statistics))
+
+
+if __name__ == '__main__':
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    benchmark(False, duration)
+    benchmark(True, duration)
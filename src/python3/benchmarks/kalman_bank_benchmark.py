@@ -0,0 +1,54 @@
+# Throughput of the batched Kalman filter bank compared to stepping single filters one after another.
+# Run from src/python3 with: python3 -m benchmarks.kalman_bank_benchmark [number of filters]
+import sys
+import time
+from numpy import array, diag
+from numpy.random import RandomState
+from sensorfusion.kalman import PreallocatedKalmanFilter
+from sensorfusion.kalman_bank import KalmanFilterBank
+from sensorfusion.kalman_test import F, B, fill_F, fill_B, x0, P0, Q, H
+
+SENSOR_ERROR_MAX = 10000000
+STEPS = 10
+
+
+def benchmark_bank(N):
+    random = RandomState(1)
+    bank = KalmanFilterBank(N, x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+    dt = 0.01 + 0.001 * random.rand(N)
+    U = random.randn(N, 1)
+    Y = array([100, 0.5, 100]) + random.randn(N, 3)
+    R = array([40, 0.01, 7]) * (1 + random.rand(N, 3))
+    mask = random.rand(N, 3) > 0.3
+
+    start = time.perf_counter()
+    for step in range(STEPS):
+        bank.predictWithInput(U, dt)
+        bank.updateWithIndependentMeasurements(Y, R, mask, SENSOR_ERROR_MAX)
+    duration = (time.perf_counter() - start) / STEPS
+
+    print("KalmanFilterBank, N = %7d: %9.2f ms/step, %6.2f us per filter step" % (N, duration * 1e3, duration / N * 1e6))
+
+
+def benchmark_single_filters(N):
+    filters = [PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+               for i in range(N)]
+    U = array([0.1])
+    Y = array([[100.0], [0.5], [100.0]])
+    R = diag([40, 0.01, 7])
+
+    start = time.perf_counter()
+    for step in range(STEPS):
+        for kf in filters:
+            kf.predictWithInput(U, 0.01)
+            kf.updateWithIndependentMeasurements(Y, R, SENSOR_ERROR_MAX)
+    duration = (time.perf_counter() - start) / STEPS
+
+    print("single filters,   N = %7d: %9.2f ms/step, %6.2f us per filter step" % (N, duration * 1e3, duration / N * 1e6))
+
+
+if __name__ == '__main__':
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    benchmark_single_filters(min(N, 1000))
+    for n in [100, 1000, 10000, N]:
+        benchmark_bank(n)
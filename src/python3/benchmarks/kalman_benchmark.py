@@ -0,0 +1,81 @@
+# Micro benchmarks for the height fusion Kalman filter.
+# Run from src/python3 with: python3 -m benchmarks.kalman_benchmark [steps for the gain benchmark]
+import sys
+import time
+import timeit
+from numpy import array, diag, dot, abs
+from numpy.linalg import pinv
+from numpy.random import RandomState
+from sensorfusion.kalman import PreallocatedKalmanFilter, kf_predict, kf_update, kf_update_sequential, kalman_gain, \
+    gain_statistics
+from sensorfusion.kalman_test import F, B, fill_F, fill_B, x0, P0, Q, H
+
+SENSOR_ERROR_MAX = 10000000
+REPETITIONS = 20000
+
+
+# prints the time per call in microseconds
+def report(name, statement):
+    seconds = min(timeit.repeat(statement, number=REPETITIONS, repeat=3))
+    print("%-45s %8.2f us" % (name, seconds / REPETITIONS * 1e6))
+
+
+# The common case in flight: only the barometer delivers data, GPS and ultrasonic report SENSOR_ERROR_MAX
+def benchmark_update_barometer_only():
+    Y = array([[101.0], [0.0], [50.0]])
+    R = diag([40, SENSOR_ERROR_MAX, SENSOR_ERROR_MAX])
+    kf = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+
+    print("Update, barometer only:")
+    report("kf_update (pinv)", lambda: kf_update(x0, P0, Y, H, R))
+    report("kf_update_sequential", lambda: kf_update_sequential(x0, P0, Y, H, R, SENSOR_ERROR_MAX))
+    report("PreallocatedKalmanFilter.updateWithMeasurement", lambda: kf.updateWithMeasurement(Y, R))
+    report("PreallocatedKalmanFilter.updateWithIndependent",
+           lambda: kf.updateWithIndependentMeasurements(Y, R, SENSOR_ERROR_MAX))
+
+
+# the gain computation that kf_update used before kalman_gain
+def pinv_gain(PHt, IS):
+    return dot(PHt, pinv(IS))
+
+
+# one kf_predict / kf_update step with a selectable gain computation
+def step(x, P, u, dt, Y, R, gain):
+    (x, P) = kf_predict(x, P, F(dt), dt * Q, B(dt), u)
+    IM = dot(H, x)
+    PHt = dot(P, H.T)
+    IS = R + dot(H, PHt)
+    K = gain(PHt, IS)
+    x = x + dot(K, (Y - IM))
+    P = P - dot(K, dot(IS, K.T))
+    return x, P
+
+
+# Compares step time and the drift of the covariance matrix away from symmetry for the pseudo inverse and the solve
+# based gain. All sensors deliver data, so the innovation covariance is a full 3x3 matrix.
+def benchmark_gain(steps):
+    print("Predict + update, %d steps:" % steps)
+    for (name, gain) in [("pinv", pinv_gain), ("solve (kalman_gain)", kalman_gain)]:
+        random = RandomState(42)
+        x = x0
+        P = P0
+        max_asymmetry = 0.0
+        gain_statistics.reset()
+
+        start = time.perf_counter()
+        for i in range(steps):
+            dt = 0.01 + 0.001 * random.rand()
+            Y = array([[100 + random.randn()], [0.5 + 0.01 * random.randn()], [100 + 5 * random.randn()]])
+            (x, P) = step(x, P, array([random.randn()]), dt, Y, diag([40, 0.01, 7]), gain)
+            if i % 1000 == 0:
+                max_asymmetry = max(max_asymmetry, abs(P - P.T).max())
+        duration = time.perf_counter() - start
+
+        max_asymmetry = max(max_asymmetry, abs(P - P.T).max())
+        print("%-20s %8.2f us/step, max |P - P^T| = %g, pinv fallbacks: %d" % (
+            name, duration / steps * 1e6, max_asymmetry, gain_statistics.pinv_fallbacks))
+
+
+if __name__ == '__main__':
+    benchmark_update_barometer_only()
+    benchmark_gain(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,43 @@
+# Overhead of the loop profiler instrumentation: a disabled check (no profiler) compared to a mark per stage.
+# Run from src/python3 with: python3 -m benchmarks.loop_profiler_benchmark [number of iterations]
+# With "python3 -O -m benchmarks.loop_profiler_benchmark" the instrumented blocks are compiled out.
+import sys
+import time
+from util.loop_profiler import LoopProfiler, STAGE_NAMES
+
+
+class Instrumented:
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    # one loop iteration with a mark for every stage
+    def iteration(self):
+        for stage in range(len(STAGE_NAMES)):
+            if __debug__ and self.profiler is not None:
+                self.profiler.mark(stage)
+
+
+def report(name, duration, N):
+    print("%-30s %8.3f us per iteration of %d stages" % (name, duration / N * 1e6, len(STAGE_NAMES)))
+
+
+def benchmark(N):
+    uninstrumented = Instrumented(None)
+    start = time.perf_counter()
+    for i in range(N):
+        uninstrumented.iteration()
+    report("without profiler", time.perf_counter() - start, N)
+
+    profiler = LoopProfiler(0.02)
+    instrumented = Instrumented(profiler)
+    start = time.perf_counter()
+    for i in range(N):
+        profiler.start_iteration()
+        instrumented.iteration()
+        profiler.end_iteration()
+    report("with profiler", time.perf_counter() - start, N)
+    print(profiler.report())
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,50 @@
+# Timing of a loop with iterations of varying duration: sleeping for a period after every iteration (free running)
+# compared to the FixedRateScheduler with and without busy waiting before the deadline.
+# Run from src/python3 with: python3 -m benchmarks.loop_scheduler_benchmark [number of iterations] [priority]
+import sys
+import random
+from numpy import array, diff
+from util.clock import MonotonicClock
+from util.loop_scheduler import FixedRateScheduler
+
+PERIOD = 0.01
+
+
+def work(clock, seconds):
+    end = clock() + seconds
+    while clock() < end:
+        pass
+
+
+def report(name, starts, N):
+    periods = diff(array(starts)) * 1000
+    print("%-30s rate: %6.2f Hz  period mean: %6.3fms  std: %6.3fms  max: %6.3fms" % (
+        name, (N - 1) / (starts[-1] - starts[0]), periods.mean(), periods.std(), periods.max()))
+
+
+def benchmark(N, priority):
+    clock = MonotonicClock()
+    durations = [random.uniform(0.001, 0.006) for i in range(N)]
+
+    starts = []
+    for i in range(N):
+        starts.append(clock())
+        work(clock, durations[i])
+        clock.sleep(PERIOD)
+    report("free running", starts, N)
+
+    for spin in [0.0, 0.0005]:
+        starts = []
+        scheduler = FixedRateScheduler(PERIOD, priority=priority, spin=spin, clock=clock)
+
+        def step(time_delta):
+            starts.append(clock())
+            work(clock, durations[len(starts) - 1])
+
+        scheduler.run(step, N)
+        report("scheduler, spin %.1fms" % (spin * 1000), starts, N)
+        print("    " + str(scheduler))
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500, int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,36 @@
+# Cost of turning the PID outputs into motor signals: AxisSpeeds.toMotorSignals (numpy.append and a numpy.matrix
+# product, no limits) compared to the MotorMixer with desaturation.
+# Run from src/python3 with: python3 -m benchmarks.motor_mixer_benchmark [number of mixes]
+import sys
+import time
+import warnings
+from numpy import array
+from axis_speeds import AxisSpeeds, MotorMixer
+
+
+def report(name, duration, N):
+    print("%-30s %8.2f us per mix" % (name, duration / N * 1e6))
+
+
+def benchmark(N):
+    outputs = array([0.4, 0.2, -0.3, 3.0])
+
+    speeds = AxisSpeeds()
+    start = time.perf_counter()
+    for i in range(N):
+        speeds.axis_rotation_speeds[:] = outputs[:3]
+        speeds.vertical_speed = outputs[3]
+        speeds.toMotorSignals()
+    report("AxisSpeeds.toMotorSignals", time.perf_counter() - start, N)
+
+    mixer = MotorMixer()
+    start = time.perf_counter()
+    for i in range(N):
+        mixer.mix(outputs)
+    report("MotorMixer.mix", time.perf_counter() - start, N)
+    print(mixer)
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore", PendingDeprecationWarning)
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
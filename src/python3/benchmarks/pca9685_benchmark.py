@@ -0,0 +1,56 @@
+# I2C traffic of one motor update on an emulated PCA9685: 4 single byte writes per motor (what the Adafruit
+# PWM.setPWM does) compared to the block writes of the PCA9685BlockWriter, for the motor pins of motors.py and for
+# adjacent pins.
+# Run from src/python3 with: python3 -m benchmarks.pca9685_benchmark [number of updates]
+import sys
+import time
+from pca9685 import PCA9685BlockWriter, LED0_ON_L
+from pca9685_test import EmulatedPCA9685
+
+# the motor pins of motors.py
+MOTOR_PINS = [0, 4, 8, 12]
+ADJACENT_PINS = [0, 1, 2, 3]
+
+# 100 kHz standard mode I2C, 9 clocks per byte (8 bits and the acknowledge)
+BUS_SECONDS_PER_BYTE = 9 / 100000.0
+
+
+# the register writes of the Adafruit PWM.setPWM
+def set_pwm(i2c, channel, on, off):
+    i2c.write8(LED0_ON_L + 4 * channel, on & 0xFF)
+    i2c.write8(LED0_ON_L + 4 * channel + 1, on >> 8)
+    i2c.write8(LED0_ON_L + 4 * channel + 2, off & 0xFF)
+    i2c.write8(LED0_ON_L + 4 * channel + 3, off >> 8)
+
+
+def report(name, device, duration, N):
+    print("%-32s %3d transactions %4d bytes (%.2fms at 100kHz) per update, %6.2f us CPU" % (
+        name, device.transactions / N, device.bytes / N, device.bytes / N * BUS_SECONDS_PER_BYTE * 1000,
+        duration / N * 1e6))
+
+
+def benchmark(N):
+    pulses = [150, 300, 450, 600]
+
+    device = EmulatedPCA9685()
+    start = time.perf_counter()
+    for i in range(N):
+        for (channel, pulse) in zip(MOTOR_PINS, pulses):
+            set_pwm(device, channel, 0, pulse)
+    report("setPWM per motor", device, time.perf_counter() - start, N)
+
+    for (name, pins) in [("block writes, pins 0, 4, 8, 12", MOTOR_PINS),
+                         ("block writes, pins 0, 1, 2, 3", ADJACENT_PINS)]:
+        device = EmulatedPCA9685()
+        writer = PCA9685BlockWriter(device, pins)
+        writer.enable_auto_increment()
+        device.transactions = device.bytes = 0
+        start = time.perf_counter()
+        for i in range(N):
+            writer.write(pulses)
+        report(name, device, time.perf_counter() - start, N)
+        assert [device.off(channel) for channel in pins] == pulses
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,43 @@
+# Cost of computing the outputs of several PID controllers: one PIDController per controlled quantity, the same
+# controllers in a PIDControllerGroup (as used by the ControlLoop), and a PIDControllerBank that computes all of them
+# at once.
+# Run from src/python3 with: python3 -m benchmarks.pid_bank_benchmark [number of steps]
+import sys
+import time
+from numpy import linspace
+from pid import PIDController, PIDControllerBank, PIDControllerGroup
+
+
+def report(name, size, duration, N):
+    print("%-18s %2d controllers %8.2f us per step" % (name, size, duration / N * 1e6))
+
+
+def benchmark(N):
+    for size in [4, 6, 8, 16]:
+        current_states = linspace(-0.5, 0.5, size)
+        target_states = linspace(0.3, -0.2, size)
+        currents = current_states.tolist()
+        targets = target_states.tolist()
+
+        controllers = [PIDController(1.0, 0.5, 0.1, 0, -1.0, 1.0) for i in range(size)]
+        start = time.perf_counter()
+        for i in range(N):
+            [controller.compute(current, target, 0.004)
+             for (controller, current, target) in zip(controllers, currents, targets)]
+        report("PIDController", size, time.perf_counter() - start, N)
+
+        group = PIDControllerGroup(PIDController(1.0, 0.5, 0.1, 0, -1.0, 1.0) for i in range(size))
+        start = time.perf_counter()
+        for i in range(N):
+            group.compute(current_states, target_states, 0.004)
+        report("PIDControllerGroup", size, time.perf_counter() - start, N)
+
+        bank = PIDControllerBank(1.0, 0.5, 0.1, [0] * size, -1.0, 1.0)
+        start = time.perf_counter()
+        for i in range(N):
+            bank.compute(current_states, target_states, 0.004)
+        report("PIDControllerBank", size, time.perf_counter() - start, N)
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
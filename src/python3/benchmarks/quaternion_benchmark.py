@@ -0,0 +1,53 @@
+# Per sample cost of the quaternion operations of the sensor loop: pyquaternion objects compared to util.quaternion.
+# Run from src/python3 with: python3 -m benchmarks.quaternion_benchmark [number of samples]
+import sys
+import time
+import math
+import numpy
+from numpy import array
+from numpy.random import RandomState
+from pyquaternion import Quaternion
+from util.quaternion import inverse_rotate, angle_to_axis, inverse_rotate_batch, angle_to_axis_batch
+
+UP_AXIS = array([0, 0, 1])
+
+
+def samples(N):
+    random = RandomState(1)
+    q = random.randn(N, 4)
+    q /= ((q * q).sum(axis=1) ** 0.5)[:, None]
+    return q, random.randn(N, 3)
+
+
+def report(name, duration, N):
+    print("%-45s %8.2f us per sample" % (name, duration / N * 1e6))
+
+
+def benchmark(N):
+    q, acceleration = samples(N)
+    # the IMU delivers tuples
+    q_tuples = [tuple(row) for row in q]
+    acceleration_tuples = [tuple(row) for row in acceleration]
+
+    start = time.perf_counter()
+    for i in range(N):
+        orientation = Quaternion(array=q_tuples[i])
+        orientation.inverse.rotate(acceleration_tuples[i])
+        math.acos(numpy.dot(orientation.rotate(UP_AXIS), UP_AXIS))
+    report("pyquaternion: object, inverse.rotate, angle", time.perf_counter() - start, N)
+
+    start = time.perf_counter()
+    for i in range(N):
+        orientation = array(q_tuples[i])
+        inverse_rotate(orientation, acceleration_tuples[i])
+        angle_to_axis(orientation, UP_AXIS, UP_AXIS)
+    report("util.quaternion: array, inverse_rotate, angle", time.perf_counter() - start, N)
+
+    start = time.perf_counter()
+    inverse_rotate_batch(q, acceleration)
+    angle_to_axis_batch(q, UP_AXIS, UP_AXIS)
+    report("util.quaternion batch of %d" % N, time.perf_counter() - start, N)
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,37 @@
+# Runtime of the offline RTS smoother over a long synthetic height-fusion log.
+# Run from src/python3 with: python3 -m benchmarks.rts_smoother_benchmark [number of samples]
+import sys
+import time
+from numpy import array, diag, tile
+from numpy.random import RandomState
+from sensorfusion.rts_smoother import RauchTungStriebelSmoother
+from sensorfusion.kalman_test import F, B, fill_F, fill_B, x0, P0, H
+
+SENSOR_ERROR_MAX = 10000000
+Q = diag([0.3, 0.5, 0.01, 0])
+
+
+def benchmark_smoother(T):
+    random = RandomState(1)
+    dt = 0.005 + 0.01 * random.rand(T)
+    U = random.randn(T, 1)
+    Y = array([120, 1, 130]) + random.randn(T, 3)
+    R = tile([40, 0.01, 7.0], (T, 1))
+    R[random.rand(T, 3) < 0.3] = SENSOR_ERROR_MAX
+
+    smoother = RauchTungStriebelSmoother(A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+
+    start = time.perf_counter()
+    xf, Pf = smoother.filter(x0, P0, dt, U, Y, R, SENSOR_ERROR_MAX)
+    filtered = time.perf_counter()
+    smoother.smooth_filtered(xf, Pf, dt, U)
+    smoothed = time.perf_counter()
+
+    print("T = %8d: forward filter %6.2f s, backward pass %6.2f s, %5.2f us per sample"
+          % (T, filtered - start, smoothed - filtered, (smoothed - start) / T * 1e6))
+
+
+if __name__ == '__main__':
+    T = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for t in [10000, 100000, T]:
+        benchmark_smoother(t)
@@ -0,0 +1,42 @@
+# Cost of planning the x, y, z rotations and the elevation and sampling the target speeds for the next update:
+# one StateChangePlan (with a numpy Polynomial) per axis compared to one StateChangePlanVector for all axes.
+# Run from src/python3 with: python3 -m benchmarks.state_change_planning_benchmark [number of plans]
+import sys
+import time
+from numpy import array
+from state_change_planning import State, StateChangePlanVector
+from state_change_planning_3d import State3d
+
+
+def report(name, duration, N):
+    print("%-30s %8.2f us per plan and sample" % (name, duration / N * 1e6))
+
+
+def benchmark(N):
+    rotation = State3d(State(0.1, 0.2), State(-0.1, 0.0), State(0.3, -0.1))
+    elevation = State(0.5, 0.1)
+    target_rotation = State3d()
+    target_elevation = State(1.0, 0.0)
+
+    start = time.perf_counter()
+    for i in range(N):
+        rotation_plan = rotation.plan_change_to(target_rotation).in_seconds(0.2)
+        elevation_plan = elevation.plan_change_to(target_elevation).in_seconds(0.2)
+        rotation_plan.calculate_target_speed_for_time_period(0, 0.02)
+        elevation_plan.calculate_target_speed_for_time_period(0, 0.02)
+    report("StateChangePlan per axis", time.perf_counter() - start, N)
+
+    plan = StateChangePlanVector(4)
+    current_values = array([0.1, -0.1, 0.3, 0.5])
+    current_speeds = array([0.2, 0.0, -0.1, 0.1])
+    target_values = array([0.0, 0.0, 0.0, 1.0])
+    target_speeds = array([0.0, 0.0, 0.0, 0.0])
+    start = time.perf_counter()
+    for i in range(N):
+        plan.replan(current_values, current_speeds, target_values, target_speeds, 0.2)
+        plan.calculate_target_speeds_for_time_period(0, 0.02)
+    report("StateChangePlanVector", time.perf_counter() - start, N)
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,65 @@
+# Cost of fusing a delayed measurement with the StateHistory compared to running the filter again over the same steps.
+# Run from src/python3 with: python3 -m benchmarks.state_history_benchmark [delay in steps]
+import sys
+import time
+from numpy import array, diag
+from numpy.random import RandomState
+from sensorfusion.kalman import PreallocatedKalmanFilter
+from sensorfusion.kalman_test import F, B, fill_F, fill_B, x0, P0, H
+from sensorfusion.state_history import StateHistory
+
+SENSOR_ERROR_MAX = 10000000
+Q = diag([0.3, 0.5, 0.01, 0])
+REPEATS = 1000
+
+
+def new_filter():
+    return PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+
+
+def recorded_steps(count):
+    random = RandomState(1)
+    steps = []
+    for step in range(count):
+        u = array([random.randn()])
+        Y = array([[120 + random.randn()], [1 + 0.1 * random.randn()], [0]])
+        R = diag([40, 0.01 if step % 7 else SENSOR_ERROR_MAX, SENSOR_ERROR_MAX])
+        steps.append((step * 0.01, 0.01, u, Y, R))
+    return steps
+
+
+def benchmark_delayed_measurement(delay):
+    steps = recorded_steps(delay + 1)
+    history = StateHistory(new_filter(), size=delay + 1, max_variance=SENSOR_ERROR_MAX)
+    for (timestamp, dt, u, Y, R) in steps:
+        history.predictWithInput(timestamp, u, dt)
+        history.updateWithIndependentMeasurements(Y, R)
+
+    start = time.perf_counter()
+    for repeat in range(REPEATS):
+        # the GPS row of the oldest entry is cleared again, so the same measurement can be applied every time
+        history.r[history.count % history.size, 2] = SENSOR_ERROR_MAX
+        history.updateWithDelayedMeasurement(steps[0][0], 2, 130, 7)
+    duration = (time.perf_counter() - start) / REPEATS
+
+    print("StateHistory,  delay %3d steps: %7.1f us per delayed measurement" % (delay, duration * 1e6))
+
+
+def benchmark_rerun(delay):
+    steps = recorded_steps(delay + 1)
+    kf = new_filter()
+
+    start = time.perf_counter()
+    for repeat in range(REPEATS // 10):
+        for (timestamp, dt, u, Y, R) in steps:
+            kf.predictWithInput(u, dt)
+            kf.updateWithIndependentMeasurements(Y, R, SENSOR_ERROR_MAX)
+    duration = (time.perf_counter() - start) / (REPEATS // 10)
+
+    print("filter re-run, delay %3d steps: %7.1f us per delayed measurement" % (delay, duration * 1e6))
+
+
+if __name__ == '__main__':
+    delay = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    benchmark_rerun(delay)
+    benchmark_delayed_measurement(delay)
@@ -0,0 +1,120 @@
+# Memory and garbage collector load of the state records that the sensor loop creates for every tick:
+# AttitudeState, HeightState, GPSState and VehicleState with __slots__ compared to the same records with a __dict__.
+# Run from src/python3 with: python3 -m benchmarks.state_records_benchmark [number of ticks]
+import gc
+import sys
+import time
+import tracemalloc
+from collections import deque
+from types import SimpleNamespace
+from numpy import array
+from state.attitude_state import AttitudeState
+from state.height_state import HeightState
+from state.gps_state import GPSState
+from state.pressure_temp_state import PressureTemperatureState
+from state.vehicle_state import VehicleState
+from state_change_planning import State
+from state_change_planning_3d import State3d
+
+# the records of the last second at 100 Hz stay alive, like in a log buffer
+KEPT_TICKS = 100
+
+
+# Subclasses without __slots__ get a __dict__ again, like the records had before.
+class DictState(State):
+    pass
+
+
+class DictState3d(State3d):
+    pass
+
+
+class DictAttitudeState(AttitudeState):
+    def __init__(self, imu_data):
+        AttitudeState.__init__(self, imu_data)
+        rotation = self.rotation
+        self.rotation = DictState3d(DictState(rotation.x.value, rotation.x.speed),
+                                    DictState(rotation.y.value, rotation.y.speed),
+                                    DictState(rotation.z.value, rotation.z.speed))
+
+
+class DictHeightState(HeightState):
+    pass
+
+
+class DictGPSState(GPSState):
+    pass
+
+
+class DictVehicleState(VehicleState):
+    pass
+
+
+def imu_reading(i):
+    return {"timestamp": i * 10000,
+            "fusionPose": (0.01 * i, 0.02, 0.03),
+            "fusionQPose": (1.0, 0.0, 0.0, 0.0),
+            "gyro": (0.1, 0.2, 0.3),
+            "accel": (0.0, 0.0, 1.0)}
+
+
+def gps_reading():
+    fix = SimpleNamespace(time="2016-01-05T10:34:48.283Z", latitude=48.1, longitude=11.5, epx=3.0, epy=3.0,
+                          altitude=520.0, epv=10.0, speed=0.0, eps=0.5, climb=0.0, epc=0.5, track=0.0, epd=5.0,
+                          mode=3)
+    return SimpleNamespace(fix=fix, utc=fix.time, satellites=[None] * 8)
+
+
+def tick(records, imu_data, height_vector, gps_data, pressure_temp):
+    attitude_type, height_type, gps_type, vehicle_type = records
+    attitude = attitude_type(imu_data)
+    height = height_type(*height_vector)
+    gps = gps_type(gps_data)
+    return vehicle_type(attitude, height, gps, pressure_temp)
+
+
+def fill(kept, records, imu_data, height_vector, gps_data, pressure_temp):
+    for i in range(KEPT_TICKS):
+        kept.append(tick(records, imu_data[i], height_vector, gps_data, pressure_temp))
+
+
+def benchmark(name, records, N):
+    imu_data = [imu_reading(i) for i in range(N)]
+    height_vector = array([1.0, 0.1, 500.0, 520.0]).tolist()
+    gps_data = gps_reading()
+    pressure_temp = PressureTemperatureState(True, 1000.0, True, 20.0)
+    kept = deque(maxlen=KEPT_TICKS)
+
+    # size of the records that are alive at the same time
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fill(kept, records, imu_data, height_vector, gps_data, pressure_temp)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    statistics = after.compare_to(before, "filename")
+    size = sum(s.size_diff for s in statistics)
+    blocks = sum(s.count_diff for s in statistics)
+    del before, after, statistics
+
+    # objects that the garbage collector has to traverse in every collection of their generation
+    kept.clear()
+    gc.collect()
+    gc.disable()
+    tracked = len(gc.get_objects())
+    fill(kept, records, imu_data, height_vector, gps_data, pressure_temp)
+    tracked = len(gc.get_objects()) - tracked
+    gc.enable()
+
+    start = time.perf_counter()
+    for i in range(N):
+        kept.append(tick(records, imu_data[i], height_vector, gps_data, pressure_temp))
+    duration = time.perf_counter() - start
+
+    print("%-10s %5.0f bytes, %4.1f memory blocks, %4.1f tracked objects, %5.2f us per tick"
+          % (name, size / KEPT_TICKS, blocks / KEPT_TICKS, tracked / KEPT_TICKS, duration / N * 1e6))
+
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    benchmark("__dict__", (DictAttitudeState, DictHeightState, DictGPSState, DictVehicleState), N)
+    benchmark("__slots__", (AttitudeState, HeightState, GPSState, VehicleState), N)
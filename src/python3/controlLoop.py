@@ -1,64 +1,154 @@
-from axis_speeds import AxisSpeeds
-from state_change_planning import State
+from numpy import zeros, broadcast_to
+from axis_speeds import MotorMixer
+from state_change_planning import StateChangePlanVector
+from util.loop_profiler import PLANNING, PID, MIXER, MOTOR_WRITE
 
 TIME_BETWEEN_CONTROL_LOOP_UPDATES = 0.02 # 50 Hz
 TIME_TO_REACH_TARGET_STATE = 0.2
 
+# multi-rate control: the PIDs run at 250 Hz and follow plans that are renewed every 0.1 seconds
+TIME_BETWEEN_PID_UPDATES = 0.004
+TIME_BETWEEN_REPLANNING = 0.1
+
 
 # Responsible for keeping the Quadrocopter in the air
 # by following some given flight plan
 class ControlLoop:
 
-    def __init__(self, motors, pidclass):
+    # pids: the 4 PIDs for the x, y, z rotation speeds and the vertical speed, as PIDControllerGroup or
+    #       PIDControllerBank (see pid). For 4 PIDs the group is faster.
+    # recorder: optional FlightRecorder that gets the PID outputs and motor signals of every step
+    # profiler: optional LoopProfiler that gets the times of planning, PIDs, mixer and motor write
+    # update_interval: seconds between two calls of step, the PIDs aim for the planned speeds of this period
+    # replanning_interval: seconds after which new plans are made. The steps in between follow the later segments
+    #                      of the plans. None to plan on every step.
+    # tracking_tolerance: when a new plan is due, the current plan is kept as long as the values of all axes differ
+    #                     from the planned ones by at most this much, and the plan has not ended. One value for all
+    #                     axes or one per axis (x, y, z rotation in radian, elevation in meters). None to always make
+    #                     a new plan.
+    def __init__(self, motors, pids, recorder=None, profiler=None,
+                 update_interval=TIME_BETWEEN_CONTROL_LOOP_UPDATES, replanning_interval=None, tracking_tolerance=None):
+        if replanning_interval is not None and replanning_interval + update_interval > TIME_TO_REACH_TARGET_STATE:
+            raise ValueError("plans end after %fs, the replanning interval %fs is too long"
+                             % (TIME_TO_REACH_TARGET_STATE, replanning_interval))
+
         self.motors = motors
-        self.xRotPID = pidclass()
-        self.yRotPID = pidclass()
-        self.zRotPID = pidclass()
-        self.vertSpdPID = pidclass()
+        self.recorder = recorder
+        self.profiler = profiler
+        assert len(pids) == 4
+        self.pids = pids
+        self.mixer = MotorMixer()
         self.target_state = None
 
+        self.update_interval = update_interval
+        self.replanning_interval = replanning_interval
+        self.tracking_tolerance = tracking_tolerance
+        if tracking_tolerance is not None:
+            self._tolerances = broadcast_to(tracking_tolerance, 4).tolist()
+
+        # current and target states of the 4 axes: x, y, z rotation and elevation.
+        # The current speeds are also the inputs of the PIDs.
+        self._current_values = zeros(4)
+        self._current_speeds = zeros(4)
+        self._target_values = zeros(4)
+        self._target_speeds = zeros(4)
+
+        # the plans of all axes and the seconds since they were made
+        self.plan = StateChangePlanVector(4)
+        self.plan_valid = False
+        self.time_in_plan = 0.0
+        # number of plans made, and number of times that a plan was due but the current one was kept
+        self.replans = 0
+        self.reuses = 0
+
+    # target_state: has the target rotation (State3d) and the target elevation (State)
+    # that we should reach within TIME_TO_REACH_TARGET_STATE seconds. Setting a target starts a new plan.
     def set_target_state(self, target_state):
         self.target_state = target_state
+        rotation = target_state.rotation
+        self._target_values[:] = (rotation.x.value, rotation.y.value, rotation.z.value, target_state.elevation.value)
+        self._target_speeds[:] = (rotation.x.speed, rotation.y.speed, rotation.z.speed, target_state.elevation.speed)
+        self.plan_valid = False
+
+    # Plans the rotation of all 3 axes and the elevation from the current to the target state at once
+    def replan(self):
+        self.plan.replan(self._current_values, self._current_speeds, self._target_values, self._target_speeds,
+                         TIME_TO_REACH_TARGET_STATE)
+        self.plan_valid = True
+        self.time_in_plan = 0.0
+        self.replans += 1
+
+    # True if the current plan can be followed further: the vehicle is within the tracking tolerance of the planned
+    # values, and the plan does not end before the next update
+    def on_track(self):
+        if self.tracking_tolerance is None or \
+                self.time_in_plan + self.update_interval > TIME_TO_REACH_TARGET_STATE:
+            return False
+        # for 4 axes, comparing Python floats is faster than NumPy operations and a reduction
+        planned = self.plan.values_at(self.time_in_plan).tolist()
+        current = self._current_values.tolist()
+        for axis in range(4):
+            if abs(planned[axis] - current[axis]) > self._tolerances[axis]:
+                return False
+        return True
 
-    # TODO: break this apart so that we have an update function and a function to set a new target state
     # Do one loop iteration
     # - time_delta:    seconds since last update
-    # - quadro_state:  current state from sensor fusion
-    # - quadro_target: the target state (from high-level path planning)
-    #                  that we should reach within TIME_TO_REACH_TARGET_STATE seconds
+    # - quadro_state:  current VehicleState from sensor fusion
     def step(self, time_delta, quadro_state):
+        rotation = quadro_state.attitude.rotation
+        height = quadro_state.height
+        values = self._current_values
+        values[0] = rotation.x.value
+        values[1] = rotation.y.value
+        values[2] = rotation.z.value
+        values[3] = height.height_above_ground
+        speeds = self._current_speeds
+        speeds[0] = rotation.x.speed
+        speeds[1] = rotation.y.speed
+        speeds[2] = rotation.z.speed
+        speeds[3] = height.vertical_speed
 
-        # --------------------------------------------------
-        # Axis rotation planning for all 3 axis
-        rotPlans = quadro_state.rotation.plan_change_to(self.target_state.rotation).in_seconds(TIME_TO_REACH_TARGET_STATE)
+        # the time since the previous mark went into the sensor fusion and the listeners of its states
+        if __debug__ and self.profiler is not None:
+            self.profiler.begin()
 
         # --------------------------------------------------
-        # do elevation planning for altitude
-        elevationPlan = quadro_state.elevation.plan_change_to(self.target_state.elevation).in_seconds(TIME_TO_REACH_TARGET_STATE)
+        # Planning: with a replanning interval, the plans are followed until the interval is over.
+        # A new target always needs a new plan, otherwise the plan is kept while the vehicle follows it.
+        if not self.plan_valid:
+            self.replan()
+        else:
+            self.time_in_plan += time_delta
+            if self.replanning_interval is None or self.time_in_plan >= self.replanning_interval:
+                if self.on_track():
+                    self.reuses += 1
+                else:
+                    self.replan()
 
         # --------------------------------------------------
         # Prepare inputs for PIDs
 
-        # calculate the target rotation speeds for the very next update
-        targetRotSpeeds = map(
-            lambda plan: plan.calculate_target_speed_for_time_period(0, TIME_BETWEEN_CONTROL_LOOP_UPDATES),
-            rotPlans
-        )
-        # calculate the target elevation speed for the very next update
-        targetElevationSpeed = elevationPlan.calculate_target_speed_for_time_period(0, TIME_BETWEEN_CONTROL_LOOP_UPDATES)
+        # calculate the target rotation and elevation speeds for the very next update
+        begin = self.time_in_plan
+        planned_speeds = self.plan.calculate_target_speeds_for_time_period(begin, begin + self.update_interval)
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(PLANNING)
 
         #--------------------------------------------------
         # Update PIDs
-        # At the moment we only use the first plan segments above, because we always
-        # do a replanning. We could break the control loop into two loops:
-        # fast PIDs and slower state change planning. Then, also the other plan
-        # segments would be used. For example, a replanning could be done
-        # every 0.1 seconds and the PIDs could adjust the motors every 0.01 seconds.
-        axisSpeeds = AxisSpeeds()
-        axisSpeeds.axis_rotation_speeds[0] = self.xRotPID.update(quadro_state.rotation.x, targetRotSpeeds(0), time_delta)
-        axisSpeeds.axis_rotation_speeds[1] = self.yRotPID.update(quadro_state.rotation.y, targetRotSpeeds(1), time_delta)
-        axisSpeeds.axis_rotation_speeds[2] = self.zRotPID.update(quadro_state.rotation.z, targetRotSpeeds(2), time_delta)
-        axisSpeeds.vertical_speed = self.vertSpdPID.update(quadro_state.elevationState, targetElevationSpeed, time_delta)
+        # The PIDs control the speeds, the current rotation speeds and vertical speed are compared with the planned
+        # ones.
+        outputs = self.pids.compute(speeds, planned_speeds, time_delta)
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(PID)
 
         # transform to motor speeds and send to motors
-        self.motors.setSpeed(axisSpeeds.toMotorSignals())
+        motor_signals = self.mixer.mix(outputs)
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(MIXER)
+        self.motors.setSpeed(motor_signals)
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(MOTOR_WRITE)
+        if self.recorder is not None:
+            self.recorder.record_control(outputs, motor_signals)
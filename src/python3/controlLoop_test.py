@@ -0,0 +1,142 @@
+import unittest
+from types import SimpleNamespace
+from controlLoop import ControlLoop, TIME_BETWEEN_PID_UPDATES, TIME_BETWEEN_REPLANNING
+from pid import PIDController, PIDControllerBank, PIDControllerGroup
+from state_change_planning import State
+from state_change_planning_3d import State3d
+from util.clock import SimulatedClock
+from util.loop_profiler import LoopProfiler, PLANNING, PID, MIXER, MOTOR_WRITE
+
+
+class RecordingMotors:
+    def __init__(self):
+        self.signals = []
+
+    def setSpeed(self, motor_speeds):
+        self.signals.append(motor_speeds)
+
+
+# motors and flight recorder that take the given time, see test_profiler_stages
+class SlowMotors(RecordingMotors):
+    def __init__(self, clock):
+        RecordingMotors.__init__(self)
+        self.clock = clock
+
+    def setSpeed(self, motor_speeds):
+        RecordingMotors.setSpeed(self, motor_speeds)
+        self.clock.advance(0.0005)
+
+
+class SlowRecorder:
+    def __init__(self, clock):
+        self.clock = clock
+
+    def record_control(self, outputs, motor_signals):
+        self.clock.advance(0.003)
+
+
+# a VehicleState with the parts that the control loop uses
+def vehicle_state(roll=0.0, roll_speed=0.0, height=0.0, vertical_speed=0.0):
+    return SimpleNamespace(attitude=SimpleNamespace(rotation=State3d(State(roll, roll_speed))),
+                           height=SimpleNamespace(height_above_ground=height, vertical_speed=vertical_speed))
+
+
+def proportional_pids():
+    return PIDControllerBank(1, 0, 0, [0, 0, 0, 0], -10, 10)
+
+
+class TestControlLoop(unittest.TestCase):
+
+    def test_plan_every_step(self):
+        motors = RecordingMotors()
+        loop = ControlLoop(motors, proportional_pids())
+        loop.set_target_state(SimpleNamespace(rotation=State3d(), elevation=State(1.0, 0.0)))
+        for i in range(10):
+            loop.step(0.02, vehicle_state())
+
+        self.assertEqual(loop.replans, 10)
+        self.assertEqual(len(motors.signals), 10)
+
+        # rising: all motors get the same positive signal
+        self.assertGreater(motors.signals[0][0], 0)
+        self.assertTrue((motors.signals[0] == motors.signals[0][0]).all())
+
+    def test_group_same_as_bank(self):
+        signals = []
+        for pids in [proportional_pids(), PIDControllerGroup(PIDController(1, 0, 0, 0, -10, 10) for i in range(4))]:
+            motors = RecordingMotors()
+            loop = ControlLoop(motors, pids)
+            loop.set_target_state(SimpleNamespace(rotation=State3d(State(0.5, 0.0)), elevation=State(1.0, 0.0)))
+            for i in range(10):
+                loop.step(0.02, vehicle_state(roll=0.01 * i, height=0.05 * i))
+            signals.append([signal.tolist() for signal in motors.signals])
+
+        self.assertEqual(signals[1], signals[0])
+
+    def test_multi_rate(self):
+        motors = RecordingMotors()
+        loop = ControlLoop(motors, proportional_pids(), update_interval=TIME_BETWEEN_PID_UPDATES,
+                           replanning_interval=TIME_BETWEEN_REPLANNING)
+        loop.set_target_state(SimpleNamespace(rotation=State3d(State(1.0, 0.0)), elevation=State(0.0, 0.0)))
+
+        state = vehicle_state()
+        plan_speeds = []
+        for i in range(100):
+            loop.step(TIME_BETWEEN_PID_UPDATES, state)
+            plan_speeds.append(motors.signals[-1][0])
+
+        # 0.4 seconds with a new plan every 0.1 seconds
+        self.assertIn(loop.replans, (4, 5))
+
+        # the steps in between follow the plan, which speeds up during its first half (replanning on every step
+        # would keep the same speed, as the state does not change)
+        self.assertLess(plan_speeds[0], plan_speeds[12])
+        self.assertLess(plan_speeds[12], plan_speeds[24])
+
+        # a new target starts a new plan
+        replans = loop.replans
+        loop.set_target_state(SimpleNamespace(rotation=State3d(), elevation=State(0.0, 0.0)))
+        loop.step(TIME_BETWEEN_PID_UPDATES, state)
+        self.assertEqual(loop.replans, replans + 1)
+
+    def test_plan_reuse(self):
+        loop = ControlLoop(RecordingMotors(), proportional_pids(), tracking_tolerance=0.05)
+        loop.set_target_state(SimpleNamespace(rotation=State3d(), elevation=State(1.0, 0.0)))
+
+        # hovering at the target: a plan lasts until it ends after TIME_TO_REACH_TARGET_STATE seconds
+        hover = vehicle_state(height=1.0)
+        for i in range(100):
+            loop.step(0.02, hover)
+        self.assertEqual(loop.replans + loop.reuses, 100)
+        self.assertLessEqual(loop.replans, 12)
+
+        # a drift beyond the tolerance needs a new plan
+        replans = loop.replans
+        loop.step(0.02, vehicle_state(roll=0.1, height=1.0))
+        self.assertEqual(loop.replans, replans + 1)
+
+    def test_profiler_stages(self):
+        clock = SimulatedClock()
+        profiler = LoopProfiler(0.02, clock=clock)
+        loop = ControlLoop(SlowMotors(clock), proportional_pids(), SlowRecorder(clock), profiler)
+        loop.set_target_state(SimpleNamespace(rotation=State3d(), elevation=State(1.0, 0.0)))
+        for i in range(10):
+            profiler.start_iteration()
+            # the sensor fusion and the listeners of its states
+            clock.advance(0.005)
+            loop.step(0.02, vehicle_state())
+            profiler.end_iteration()
+
+        # only the motor write takes time, neither the sensor fusion before the step nor the recording go into a stage
+        self.assertEqual(profiler.stages[PLANNING].total, 0.0)
+        self.assertEqual(profiler.stages[PID].total, 0.0)
+        self.assertEqual(profiler.stages[MIXER].total, 0.0)
+        self.assertAlmostEqual(profiler.stages[MOTOR_WRITE].total, 10 * 0.0005)
+        self.assertAlmostEqual(profiler.loop.total, 10 * 0.0085)
+
+    def test_replanning_interval_too_long(self):
+        self.assertRaises(ValueError, ControlLoop, RecordingMotors(), proportional_pids(), replanning_interval=0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
+from state_change_planning import State
+from state_change_planning_3d import State3d
+
+
 # Responsible for giving targets to the Quadrocopter control lopp
 class HighLevelLogic:
 
+    # control_loop: the ControlLoop that gets the target states
+    # state_provider: provider of the VehicleStates, like the HeightProvider of the sensor fusion
     def __init__(self, control_loop, state_provider):
-        self.controllers
+        self.name = "HighLevelLogic"
         self.flightmode = FlightModeLanded()
         self.control_loop = control_loop
 
@@ -19,29 +25,47 @@ class HighLevelLogic:
             print("HighLevelLogic: changing FlightMode from %s to %s" % (self.flightmode.name, newmode.name))
             self.flightmode = newmode
 
-        # TODO: do we need to update the control loop?
-
     # will be called by State Provider whenever a new sensor reading is ready
     # timeDelta is the time since the last newState call in seconds
-    def new_sensor_reading(self, timedelta, state):
+    def new_state(self, timedelta, state):
         target_state = self.flightmode.calculate_target_state(state)
-        self.control_loop.setTargetState(target_state)
+
+        # a new target starts a new plan, so it is only set when it changes
+        if target_state is not self.control_loop.target_state:
+            self.control_loop.set_target_state(target_state)
+
+
+# Target of the ControlLoop: the rotation (State3d) and the elevation (State) to reach
+class TargetState:
+    __slots__ = ("rotation", "elevation")
+
+    # elevation: target height above ground in meters
+    def __init__(self, elevation):
+        self.rotation = State3d()
+        self.elevation = State(elevation, 0.0)
 
 
 class FlightMode:
 
-    def __init__(self):
+    # target_state: the TargetState of this mode
+    def __init__(self, name, target_state):
+        self.name = name
+        self.target_state = target_state
         self.timeInState = 0
 
     def update(self, time_delta):
         self.timeInState += time_delta
         return self._update(time_delta)
 
+    def calculate_target_state(self, current_state):
+        # no need to react to anything
+        return self.target_state
+
 
 class FlightModeLanded(FlightMode):
 
     def __init__(self):
-        self.name = "FlightModeLanded"
+        super().__init__("FlightModeLanded", TargetState(0.0))
 
     def _update(self, timedelta):
         if self.timeInState > 2.0:
@@ -49,16 +73,11 @@ class FlightModeLanded(FlightMode):
 
         return self
 
-    def calculate_target_state(self, current_state):
-
-        # no need to react to anything
-        return self
-
 
 class FlightModeRiseTo1m(FlightMode):
     def __init__(self):
         # TODO: start motors
-        self.name = "FlightModeRiseTo1m"
+        super().__init__("FlightModeRiseTo1m", TargetState(1.0))
 
     def _update(self, timedelta):
         if self.timeInState > 3.0:
@@ -66,14 +85,10 @@ class FlightModeRiseTo1m(FlightMode):
 
         return self
 
-    def calculate_target_state(self, current_state):
-        # no need to react to anything
-        return self
-
 
 class FlightModeHover(FlightMode):
     def __init__(self):
-        self.name = "FlightModeHover"
+        super().__init__("FlightModeHover", TargetState(1.0))
 
     def _update(self, timedelta):
         if self.timeInState > 5.0:
@@ -81,22 +96,13 @@ class FlightModeHover(FlightMode):
 
         return self
 
-    def calculate_target_state(self, current_state):
-        # no need to react to anything
-        return self
-
 
 class FlightModeGoDown(FlightMode):
     def __init__(self):
-        self.name = "FlightModeGoDown"
+        super().__init__("FlightModeGoDown", TargetState(0.0))
 
     def _update(self, timedelta):
         if self.timeInState > 7.0:
             return FlightModeLanded()
 
         return self
-
-    def calculate_target_state(self, current_state):
-        # no need to react to anything
-        return self
-
@@ -1,46 +1,102 @@
+import json
+import sys
 from datetime import datetime
-from pid import PIDController
+from pid import PIDController, PIDControllerGroup
 from motors import AdafruitPwmControlledMotors
 from sensorfusion.attitude_provider import AttitudeProvider
 from sensorfusion.fusion_master import SensorFusionMaster
 from high_level_logic import HighLevelLogic
 from controlLoop import ControlLoop
+from util.flight_recorder import FlightRecorder
+from util.clock import default_clock
+from util.loop_profiler import LoopProfiler
+from util.loop_scheduler import FixedRateScheduler, SKIP
+from controlLoop import TIME_BETWEEN_CONTROL_LOOP_UPDATES
 import logging
 
+# binary recording of every sensor fusion step, see util.flight_recorder.load_flight
+FLIGHT_RECORDER_FILE = "flight-%Y%m%d-%H%M%S.rec"
+
+# scheduling of the loop, see util.loop_scheduler.FixedRateScheduler
+LOOP_OVERRUN_POLICY = SKIP
+LOOP_PRIORITY = 50
+LOOP_CPUS = {3}  # the last of the 4 cores of the Raspberry Pi
+LOOP_SPIN = 0.0005
+
 
 # The Initiator binds the various freecopter modules together, following the inversion of control pattern.
 class Initiator:
 
     # Here we wire all the components together
-    def __init__(self):
-        logging.basicConfig(filename='freecopter.log', level=logging.INFO)
-
-        self.motors = AdafruitPwmControlledMotors(debug_flag=True)
-        self.controlLoop = ControlLoop(self.motors, PIDController)
-        self.sensor_fusion = SensorFusionMaster()
-        self.highLevelLogic = HighLevelLogic(self.controlLogic)
+    # pids: the PIDs of the ControlLoop, tuned for the vehicle, see ControlLoop and load_pids
+    # clock: see util.clock, the default clock if None
+    # motors, sensor_fusion, flight_recorder, scheduler: components to use instead of the ones on the hardware (like
+    #                                                    stand-ins in a simulation), the default ones if None
+    # profiler: LoopProfiler of the loop and the components, a new one if None. Components that are given above need
+    #           to have it already.
+    def __init__(self, pids, clock=None, motors=None, sensor_fusion=None, flight_recorder=None, scheduler=None,
+                 profiler=None):
+        self.clock = clock if clock is not None else default_clock()
+        self.flight_recorder = flight_recorder if flight_recorder is not None \
+            else FlightRecorder(datetime.now().strftime(FLIGHT_RECORDER_FILE), clock=self.clock)
 
-        # Will be set on the first update.
-        self.time_of_last_update = None
+        # stage latencies of every update, logged on "kill -USR1 <pid>"
+        self.profiler = profiler if profiler is not None \
+            else LoopProfiler(TIME_BETWEEN_CONTROL_LOOP_UPDATES, clock=self.clock)
+        self.profiler.dump_on_signal()
 
-    def update(self):
+        self.motors = motors if motors is not None else AdafruitPwmControlledMotors(debug_flag=True)
+        self.controlLoop = ControlLoop(self.motors, pids, self.flight_recorder, self.profiler)
+        self.sensor_fusion = sensor_fusion if sensor_fusion is not None \
+            else SensorFusionMaster(clock=self.clock, profiler=self.profiler)
+        self.sensor_fusion.heightProvider.registerListener(self.flight_recorder)
+        # gets the new states before the control loop and sets its targets
+        self.highLevelLogic = HighLevelLogic(self.controlLoop, self.sensor_fusion.heightProvider)
+        self.scheduler = scheduler if scheduler is not None \
+            else FixedRateScheduler(TIME_BETWEEN_CONTROL_LOOP_UPDATES, LOOP_OVERRUN_POLICY, LOOP_PRIORITY, LOOP_CPUS,
+                                    LOOP_SPIN, self.clock)
 
-        now = datetime.now()
-
-        if self.time_of_last_update is None:
-            # some very small time Delta for the start
-            time_delta = 0.000001
-        else:
-            time_delta = (now - self.time_of_last_update).total_seconds()
+    # One iteration of the loop
+    # time_delta: seconds since the start of the previous iteration, from the scheduler
+    def update(self, time_delta):
+        self.profiler.start_iteration()
 
         # gather sensor information
-        vehicle_state = self.sensor_fusion.readState()
+        vehicle_state = self.sensor_fusion.update()
 
         # high level logic updates the other systems
         self.highLevelLogic.update(time_delta)
 
-        # save time for next iteration
-        self.time_of_last_update = now
+        # keep the vehicle on its way to the target
+        self.controlLoop.step(time_delta, vehicle_state)
+
+        self.profiler.end_iteration()
+
+    # Runs update at the fixed rate of TIME_BETWEEN_CONTROL_LOOP_UPDATES until the scheduler is stopped
+    # iterations: number of iterations to run, None to run until the scheduler is stopped
+    def run(self, iterations=None):
+        try:
+            self.scheduler.run(self.update, iterations)
+        finally:
+            logging.info("loop timing: %s", self.scheduler)
+
+
+# Reads the gains of the PIDs for the x, y, z rotation speeds and the vertical speed from a JSON file like
+# {"kp": [...], "ki": [...], "kd": [...], "min_output": [...], "max_output": [...]} with 4 values each.
+# returns the PIDControllerGroup for the ControlLoop
+def load_pids(path):
+    with open(path) as file:
+        gains = json.load(file)
+    return PIDControllerGroup(PIDController(kp, ki, kd, 0.0, min_output, max_output)
+                              for (kp, ki, kd, min_output, max_output)
+                              in zip(gains["kp"], gains["ki"], gains["kd"], gains["min_output"], gains["max_output"]))
+
 
 if __name__ == '__main__':
-    initiator = Initiator()
+    if len(sys.argv) != 2:
+        print("usage: python3 initiator.py <PID gains file>, see load_pids")
+        sys.exit(1)
+
+    logging.basicConfig(filename='freecopter.log', level=logging.INFO)
+    initiator = Initiator(load_pids(sys.argv[1]))
+    initiator.run()
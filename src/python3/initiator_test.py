@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+import unittest
+from numpy import isfinite
+
+from controlLoop import TIME_BETWEEN_CONTROL_LOOP_UPDATES
+from controlLoop_test import RecordingMotors, SlowMotors
+from initiator import Initiator, load_pids
+from sensorfusion.attitude_provider import AttitudeProvider
+from sensorfusion.fusion_master import SensorFusionMaster
+from sensorfusion.height_provider import HeightProvider
+from sensorfusion.height_provider_test import NoBarometer, NoEcho, NoGps
+from state.attitude_state_test import imu_reading
+from util.clock import SimulatedClock
+from util.flight_recorder import FlightRecorder, load_flight
+from util.loop_profiler import LoopProfiler, IMU_READ, BAROMETER_READ, ULTRASONIC_READ, GPS_READ, KALMAN_PREDICT, \
+    KALMAN_UPDATE, PLANNING, PID, MIXER, MOTOR_WRITE
+from util.loop_scheduler import FixedRateScheduler
+
+
+# Stand-in for the RTIMULib IMU: always has a new sample of the level vehicle at rest
+class LevelIMU:
+    def __init__(self, clock):
+        self.clock = clock
+
+    def IMUName(self):
+        return "level"
+
+    def IMUInit(self):
+        return True
+
+    def setSlerpPower(self, power):
+        pass
+
+    def setGyroEnable(self, enable):
+        pass
+
+    def setAccelEnable(self, enable):
+        pass
+
+    def setCompassEnable(self, enable):
+        pass
+
+    def IMUGetPollInterval(self):
+        return 4
+
+    def IMURead(self):
+        return True
+
+    def getIMUData(self):
+        # RTIMULib timestamps are microseconds
+        return dict(imu_reading, timestamp=self.clock.now_ns() // 1000)
+
+
+# Stand-ins that take the given time, see test_stage_times
+class SlowIMU(LevelIMU):
+    def getIMUData(self):
+        self.clock.advance(0.001)
+        return LevelIMU.getIMUData(self)
+
+
+class SlowBarometer(NoBarometer):
+    def __init__(self, clock):
+        self.clock = clock
+
+    def read(self):
+        self.clock.advance(0.002)
+        return NoBarometer.read(self)
+
+
+class SlowListener:
+    def __init__(self, clock):
+        self.name = "SlowListener"
+        self.clock = clock
+
+    def new_state(self, time_delta, state):
+        self.clock.advance(0.004)
+
+
+class TestInitiator(unittest.TestCase):
+
+    def setUp(self):
+        (handle, self.path) = tempfile.mkstemp(suffix=".rec")
+        os.close(handle)
+        (handle, self.gains_path) = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w") as file:
+            json.dump({"kp": [1, 1, 1, 2], "ki": [0, 0, 0, 0.5], "kd": [0, 0, 0, 0.1],
+                       "min_output": [-1, -1, -1, -1], "max_output": [1, 1, 1, 1]}, file)
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.remove(self.gains_path)
+
+    def test_load_pids(self):
+        pids = load_pids(self.gains_path)
+        self.assertEqual(len(pids), 4)
+        self.assertEqual([(pid.kp, pid.ki, pid.kd) for pid in pids.controllers][3], (2, 0.5, 0.1))
+        self.assertEqual(pids.controllers[0].maxOutput, 1)
+
+    def test_loop(self):
+        clock = SimulatedClock()
+        motors = RecordingMotors()
+        sensor_fusion = SensorFusionMaster(AttitudeProvider(imu=LevelIMU(clock), clock=clock),
+                                           HeightProvider(barometer=NoBarometer(), ultrasonic=NoEcho(), gps=NoGps(),
+                                                          clock=clock))
+        recorder = FlightRecorder(self.path, capacity=1000, clock=clock)
+        initiator = Initiator(load_pids(self.gains_path), clock, motors, sensor_fusion, recorder,
+                              FixedRateScheduler(TIME_BETWEEN_CONTROL_LOOP_UPDATES, clock=clock))
+
+        # 3 seconds: the vehicle starts to rise after 2 seconds on the ground
+        initiator.run(150)
+        recorder.close()
+
+        self.assertEqual(len(motors.signals), 150)
+        self.assertTrue(isfinite(motors.signals[-1]).all())
+        self.assertEqual(initiator.highLevelLogic.flightmode.name, "FlightModeRiseTo1m")
+        self.assertEqual(initiator.controlLoop.target_state.elevation.value, 1.0)
+        self.assertEqual(initiator.profiler.loop.count, 150)
+
+        # the loop ran at the fixed rate of the scheduler
+        self.assertAlmostEqual(clock(), 150 * TIME_BETWEEN_CONTROL_LOOP_UPDATES)
+        flight = load_flight(self.path)
+        self.assertEqual(len(flight), 150)
+        self.assertTrue(isfinite(flight["motor_signals"]).all())
+
+    def test_stage_times(self):
+        clock = SimulatedClock()
+        profiler = LoopProfiler(TIME_BETWEEN_CONTROL_LOOP_UPDATES, clock=clock)
+        height_provider = HeightProvider(barometer=SlowBarometer(clock), ultrasonic=NoEcho(), gps=NoGps(),
+                                         clock=clock, profiler=profiler)
+        height_provider.registerListener(SlowListener(clock))
+        attitude_provider = AttitudeProvider(imu=SlowIMU(clock), clock=clock, profiler=profiler)
+        attitude_provider.registerListener(SlowListener(clock))
+        sensor_fusion = SensorFusionMaster(attitude_provider, height_provider)
+        recorder = FlightRecorder(self.path, capacity=1000, clock=clock)
+        initiator = Initiator(load_pids(self.gains_path), clock, SlowMotors(clock), sensor_fusion, recorder,
+                              FixedRateScheduler(TIME_BETWEEN_CONTROL_LOOP_UPDATES, clock=clock), profiler)
+        initiator.run(10)
+        recorder.close()
+
+        # every stage gets exactly the time of its own work, the listeners of the states go into no stage
+        stages = profiler.stages
+        self.assertAlmostEqual(stages[IMU_READ].total, 10 * 0.001)
+        self.assertAlmostEqual(stages[BAROMETER_READ].total, 10 * 0.002)
+        self.assertAlmostEqual(stages[MOTOR_WRITE].total, 10 * 0.0005)
+        for stage in (ULTRASONIC_READ, GPS_READ, KALMAN_UPDATE, PLANNING, PID, MIXER):
+            self.assertEqual(stages[stage].count, 10)
+            self.assertEqual(stages[stage].total, 0.0)
+        self.assertEqual(stages[KALMAN_PREDICT].count, 10)
+        self.assertAlmostEqual(profiler.loop.total, 10 * 0.0115)
+
+
+if __name__ == '__main__':
+    unittest.main()
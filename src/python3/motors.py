@@ -1,4 +1,5 @@
 from Adafruit_PWM_Servo_Driver import PWM
+from pca9685 import PCA9685BlockWriter
 import time
 
 # set PWM frequency in Hz
@@ -12,6 +13,7 @@ PIN_MOTOR_1 = 0
 PIN_MOTOR_2 = 4
 PIN_MOTOR_3 = 8
 PIN_MOTOR_4 = 12
+# on adjacent pins, like 0, 1, 2, 3, all motors are set with a single I2C block write
 
 
 # Used to control four brushless motors (quadrocopter)
@@ -19,7 +21,9 @@ PIN_MOTOR_4 = 12
 # See tutorial: https://learn.adafruit.com/adafruit-16-channel-servo-driver-with-raspberry-pi/library-reference
 class AdafruitPwmControlledMotors:
 
-    def __init__(self, debug_flag):
+    # block_writes: set all motors with as few I2C block writes as possible (see pca9685.PCA9685BlockWriter) instead
+    #               of 4 single byte writes per motor
+    def __init__(self, debug_flag, block_writes=True):
         self.pwmController = PWM(ADAFRUIT_PWM_ADRESS, debug = debug_flag)
         self.pwmController.setPWMFreq(ADAFRUIT_PWM_FREQUENCY)
 
@@ -28,19 +32,32 @@ class AdafruitPwmControlledMotors:
         self.servoMin = 150  # min pulse length out of 4096
         self.servoMax = 600  # max pulse length out of 4096
 
-    # channel: pin on PCA9685 where this motor is connected
-    # motorSpeed: desired motor speed in [0.0, 1.0]
-    def _servo_pulse(self, channel, motor_speed):
+        self.blockWriter = None
+        if block_writes:
+            self.blockWriter = PCA9685BlockWriter(self.pwmController.i2c,
+                                                  [PIN_MOTOR_1, PIN_MOTOR_2, PIN_MOTOR_3, PIN_MOTOR_4])
+            self.blockWriter.enable_auto_increment()
+        self._pulses = [0] * 4
 
-        assert motor_speed >= 0.0
-        assert motor_speed <= 1.0
+    # motorSpeed: desired motor speed in [0.0, 1.0]
+    # returns the tick (between 0..4095) at which the pulse for this speed ends
+    def _pwm_pulse(self, motor_speed):
 
         # TODO: check formula!
         # pulse length in us (1.000.000 per second) per bit
 #        pulseLength = 1000000 * self.pwmFrequency / 4096
 #        pwmPulse = pulse * 1000 / pulseLength
 
-        pwm_pulse = motor_speed * (self.servoMax - self.servoMin) + self.servoMin
+        return int(round(motor_speed * (self.servoMax - self.servoMin) + self.servoMin))
+
+    # channel: pin on PCA9685 where this motor is connected
+    # motorSpeed: desired motor speed in [0.0, 1.0]
+    def _servo_pulse(self, channel, motor_speed):
+
+        assert motor_speed >= 0.0
+        assert motor_speed <= 1.0
+
+        pwm_pulse = self._pwm_pulse(motor_speed)
 
         # setPWM(self, channel, on, off)
         # on: The tick (between 0..4095) when the signal should transition from low to high
@@ -55,6 +72,13 @@ class AdafruitPwmControlledMotors:
         for i in range(0,4):
             assert 0.0 <= motor_speeds[i] <= 1.0
 
+        if self.blockWriter is not None:
+            pulses = self._pulses
+            for i in range(0, 4):
+                pulses[i] = self._pwm_pulse(motor_speeds[i])
+            self.blockWriter.write(pulses)
+            return
+
         self._servo_pulse(PIN_MOTOR_1, motor_speeds[0])
         self._servo_pulse(PIN_MOTOR_2, motor_speeds[1])
         self._servo_pulse(PIN_MOTOR_3, motor_speeds[2])
@@ -0,0 +1,58 @@
+# Registers of the PCA9685 PWM controller, see the datasheet: https://www.nxp.com/docs/en/data-sheet/PCA9685.pdf
+MODE1 = 0x00
+LED0_ON_L = 0x06
+# every channel has 4 registers: ON_L, ON_H, OFF_L, OFF_H
+REGISTERS_PER_CHANNEL = 4
+
+# MODE1 bit: the register address is incremented after every byte of a write, so consecutive registers can be written
+# with one block write
+MODE1_AUTO_INCREMENT = 0x20
+
+# SMBus block writes carry at most 32 data bytes, which are the registers of 8 channels
+MAX_BLOCK_CHANNELS = 8
+
+
+# Writes the pulses of several channels of a PCA9685 with as few I2C transactions as possible.
+# Setting a channel with the Adafruit PWM.setPWM writes its 4 registers with 4 single byte writes, each one a
+# transaction on the bus. With register auto-increment, the registers of consecutive channels are written in one block
+# write: channels that are next to each other share a transaction, others get one transaction each.
+class PCA9685BlockWriter:
+
+    # i2c: the I2C device of the PCA9685, with the interface of Adafruit_I2C (readU8, write8 and writeList), like the
+    #      i2c field of the Adafruit PWM
+    # channels: the channels that write sets, in the order of the pulses given to write
+    def __init__(self, i2c, channels):
+        self.i2c = i2c
+        self.channels = list(channels)
+
+        # (first channel, positions of its channel and the following ones in the pulses given to write)
+        self.blocks = []
+        for (position, channel) in sorted(enumerate(self.channels), key=lambda position_channel: position_channel[1]):
+            if self.blocks:
+                (first, positions) = self.blocks[-1]
+                if channel == first + len(positions) and len(positions) < MAX_BLOCK_CHANNELS:
+                    positions.append(position)
+                    continue
+            self.blocks.append((channel, [position]))
+
+        # the register values of every block, rewritten in place by write
+        self._data = [[0] * (REGISTERS_PER_CHANNEL * len(positions)) for (first, positions) in self.blocks]
+
+    # Sets the auto-increment bit of MODE1. Must be called after the PWM frequency is set, as that rewrites MODE1.
+    def enable_auto_increment(self):
+        mode = self.i2c.readU8(MODE1)
+        self.i2c.write8(MODE1, mode | MODE1_AUTO_INCREMENT)
+
+    # pulses: for every channel the tick (0..4095) at which the signal goes from high to low, it always goes from low
+    #         to high at tick 0
+    def write(self, pulses):
+        for ((first, positions), data) in zip(self.blocks, self._data):
+            index = 0
+            for position in positions:
+                off = pulses[position]
+                data[index] = 0
+                data[index + 1] = 0
+                data[index + 2] = off & 0xFF
+                data[index + 3] = off >> 8
+                index += REGISTERS_PER_CHANNEL
+            self.i2c.writeList(LED0_ON_L + REGISTERS_PER_CHANNEL * first, data)
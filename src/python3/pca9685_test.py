@@ -0,0 +1,71 @@
+import unittest
+from pca9685 import PCA9685BlockWriter, MODE1, MODE1_AUTO_INCREMENT, LED0_ON_L
+
+
+# The registers of a PCA9685 behind the Adafruit_I2C interface. Counts the I2C transactions and the bytes on the bus,
+# including the address and register bytes.
+class EmulatedPCA9685:
+
+    def __init__(self):
+        self.registers = [0] * 256
+        self.transactions = 0
+        self.bytes = 0
+
+    def readU8(self, register):
+        # address + register, then address + value
+        self.transactions += 1
+        self.bytes += 4
+        return self.registers[register]
+
+    def write8(self, register, value):
+        self.transactions += 1
+        self.bytes += 3
+        self.registers[register] = value
+
+    def writeList(self, register, data):
+        self.transactions += 1
+        self.bytes += 2 + len(data)
+        auto_increment = self.registers[MODE1] & MODE1_AUTO_INCREMENT
+        for value in data:
+            self.registers[register] = value
+            if auto_increment:
+                register += 1
+
+    # the tick at which the given channel goes from high to low
+    def off(self, channel):
+        register = LED0_ON_L + 4 * channel
+        assert self.registers[register:register + 2] == [0, 0]
+        return self.registers[register + 2] | (self.registers[register + 3] << 8)
+
+
+class TestPCA9685BlockWriter(unittest.TestCase):
+
+    def test_separate_channels(self):
+        device = EmulatedPCA9685()
+        writer = PCA9685BlockWriter(device, [0, 4, 8, 12])
+        writer.enable_auto_increment()
+        self.assertTrue(device.registers[MODE1] & MODE1_AUTO_INCREMENT)
+
+        device.transactions = 0
+        writer.write([150, 375, 599, 4095])
+        self.assertEqual([device.off(channel) for channel in [0, 4, 8, 12]], [150, 375, 599, 4095])
+        self.assertEqual(device.transactions, 4)
+
+    def test_adjacent_channels(self):
+        device = EmulatedPCA9685()
+        writer = PCA9685BlockWriter(device, [3, 2, 1, 0])
+        writer.enable_auto_increment()
+
+        device.transactions = 0
+        writer.write([300, 301, 302, 303])
+        self.assertEqual([device.off(channel) for channel in [3, 2, 1, 0]], [300, 301, 302, 303])
+        self.assertEqual(device.transactions, 1)
+        self.assertEqual(len(writer.blocks), 1)
+
+    def test_block_size(self):
+        writer = PCA9685BlockWriter(EmulatedPCA9685(), range(10))
+        self.assertEqual([(first, len(positions)) for (first, positions) in writer.blocks], [(0, 8), (8, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -45,3 +45,86 @@ class PIDController:
 
     def _limitOutput(self, x):
         return max(self.minOutput, min(x, self.maxOutput))
+
+
+# Several PIDControllers in one: gains, error sums, last states and output limits of all controllers are kept in
+# NumPy arrays, and compute calculates all outputs at once with the same formulas as PIDController. The cost of a step
+# hardly depends on the number of controllers. The arrays are preallocated, compute writes into them in place.
+class PIDControllerBank:
+
+    # kp, ki, kd, minOutput, maxOutput: one value per controller, or one value for all of them
+    # states: current states of the systems that we want to control, one per controller
+    def __init__(self, kp, ki, kd, states, minOutput, maxOutput):
+        self.lastStates = numpy.array(states, dtype=float)
+        size = len(self.lastStates)
+        self.kp = numpy.broadcast_to(numpy.asarray(kp, dtype=float), size).copy()
+        self.ki = numpy.broadcast_to(numpy.asarray(ki, dtype=float), size).copy()
+        self.kd = numpy.broadcast_to(numpy.asarray(kd, dtype=float), size).copy()
+        self.minOutput = numpy.broadcast_to(numpy.asarray(minOutput, dtype=float), size).copy()
+        self.maxOutput = numpy.broadcast_to(numpy.asarray(maxOutput, dtype=float), size).copy()
+        self.time = 0  # absolute point in time in seconds
+        self.errorSums = numpy.zeros(size)
+
+        self._error = numpy.zeros(size)
+        self._term = numpy.zeros(size)
+        self._output = numpy.zeros(size)
+
+    def __len__(self):
+        return len(self.lastStates)
+
+    # currentStates, targetStates: one value per controller
+    # timeDelta: seconds since last compute
+    # returns the outputs of all controllers. The array is reused by the next compute, copy it to keep it.
+    def compute(self, currentStates, targetStates, timeDelta):
+        error = numpy.subtract(targetStates, currentStates, out=self._error)
+        term = numpy.multiply(error, timeDelta, out=self._term)
+        self.errorSums += term
+
+        # iTerm, limited per controller against the reset windup
+        output = numpy.multiply(self.errorSums, self.ki, out=self._output)
+        numpy.minimum(output, self.maxOutput, out=output)
+        numpy.maximum(output, self.minOutput, out=output)
+
+        # proportional part
+        numpy.multiply(error, self.kp, out=term)
+        output += term
+
+        # derivative on input
+        numpy.subtract(self.lastStates, currentStates, out=term)
+        term *= self.kd
+        term /= timeDelta
+        output += term
+
+        # obey limits
+        numpy.minimum(output, self.maxOutput, out=output)
+        numpy.maximum(output, self.minOutput, out=output)
+
+        # save values for next iteration
+        self.time += timeDelta
+        self.lastStates[:] = currentStates
+
+        return output
+
+
+# The PIDControllers of several controlled quantities behind the interface of PIDControllerBank. Every controller
+# computes its output with Python floats, which is faster than the NumPy operations of the bank for a few controllers:
+# see benchmarks/pid_bank_benchmark.py, the bank only breaks even at about 7 controllers.
+class PIDControllerGroup:
+
+    # controllers: one PIDController per controlled quantity
+    def __init__(self, controllers):
+        self.controllers = list(controllers)
+        self._output = numpy.zeros(len(self.controllers))
+
+    def __len__(self):
+        return len(self.controllers)
+
+    # currentStates, targetStates: one value per controller
+    # timeDelta: seconds since last compute
+    # returns the outputs of all controllers. The array is reused by the next compute, copy it to keep it.
+    def compute(self, currentStates, targetStates, timeDelta):
+        currents = numpy.asarray(currentStates).tolist()
+        targets = numpy.asarray(targetStates).tolist()
+        self._output[:] = [controller.compute(current, target, timeDelta)
+                           for (controller, current, target) in zip(self.controllers, currents, targets)]
+        return self._output
@@ -1,6 +1,6 @@
 import unittest
 import numpy
-from pid import PIDController
+from pid import PIDController, PIDControllerBank, PIDControllerGroup
 
 class TestPIDController(unittest.TestCase):
 
@@ -154,5 +154,55 @@ class TestPIDController(unittest.TestCase):
 
         self.assertEqual(output, -500)
 
+
+class TestPIDControllerBank(unittest.TestCase):
+
+    def test_same_as_single_controllers(self):
+        kp = [1, 0.5, 2, 0.1]
+        ki = [0.3, 1, 0, 2]
+        kd = [0.1, 0, 0.2, 0.05]
+        minOutput = [-1, -2, -1, 0]
+        maxOutput = [1, 2, 1, 0.5]
+
+        bank = PIDControllerBank(kp, ki, kd, [0, 0, 0, 0], minOutput, maxOutput)
+        controllers = [PIDController(kp[i], ki[i], kd[i], 0, minOutput[i], maxOutput[i]) for i in range(4)]
+
+        random = numpy.random.RandomState(1)
+        for step in range(100):
+            currentStates = random.uniform(-1, 1, 4)
+            targetStates = random.uniform(-1, 1, 4)
+            timeDelta = random.uniform(0.001, 0.02)
+
+            outputs = bank.compute(currentStates, targetStates, timeDelta)
+            expected = [controllers[i].compute(currentStates[i], targetStates[i], timeDelta) for i in range(4)]
+            numpy.testing.assert_allclose(outputs, expected, rtol=1e-12, atol=1e-12)
+
+    def test_I_limit_per_controller(self):
+        bank = PIDControllerBank(0, 1, 0, [0, 0], [-1, -10], [1, 10])
+
+        # the error sums grow beyond the limits, but the iTerm of each controller stays within its own limits
+        for step in range(20):
+            outputs = bank.compute([0, 0], [1, 1], 1)
+        self.assertEqual(outputs.tolist(), [1, 10])
+        self.assertEqual(bank.errorSums.tolist(), [20, 20])
+
+
+class TestPIDControllerGroup(unittest.TestCase):
+
+    def test_same_as_bank(self):
+        bank = PIDControllerBank([1, 0.5], [0.3, 1], [0.1, 0], [0, 0], [-1, -2], [1, 2])
+        group = PIDControllerGroup([PIDController(1, 0.3, 0.1, 0, -1, 1), PIDController(0.5, 1, 0, 0, -2, 2)])
+        self.assertEqual(len(group), 2)
+
+        random = numpy.random.RandomState(2)
+        for step in range(100):
+            currentStates = random.uniform(-1, 1, 2)
+            targetStates = random.uniform(-1, 1, 2)
+            timeDelta = random.uniform(0.001, 0.02)
+
+            numpy.testing.assert_allclose(group.compute(currentStates, targetStates, timeDelta),
+                                          bank.compute(currentStates, targetStates, timeDelta), rtol=1e-12, atol=1e-12)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,32 +4,120 @@
 import logging
 import os.path
 import sys
+import time
 from datetime import datetime
 
 import RTIMU
+from numpy import zeros
 
 from state.attitude_state import AttitudeState
 from state.logging_state_provider import LoggingStateProviderWithListeners
 
 from util.definitions import *
+from util.clock import default_clock
+from util.loop_profiler import IMU_READ
 
 
+# In sleeping acquisition mode we wake up this many seconds before the next sample is expected
+WAKE_UP_MARGIN = 0.0005
+
+# In sleeping acquisition mode we sleep this many seconds between two polls after waking up
+POLL_SLEEP = 0.0001
+
+# In batch drain mode at most this many IMU samples are read in one update
+MAX_BATCH_SIZE = 64
+
+
+class AcquisitionStatistics:
+    """ Measures the CPU usage of the thread that reads the IMU and the latency of the samples, which is the time from
+    the moment a sample was expected (one poll interval after the last one) until it was read.
+    The CPU time is measured for the calling thread, so it includes the listeners that run in the same loop. It is
+    compared with the time that passed on the given clock.
+    """
+
+    # clock: see util.clock, the default clock if None
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else default_clock()
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.polls = 0
+        # samples that were read in addition in batch drain mode
+        self.batched = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self._start_wall = self.clock()
+        self._start_cpu = time.thread_time()
+
+    # latency: seconds between the expected and the actual time of the sample
+    # polls: number of IMURead calls needed for the sample
+    def add_sample(self, latency, polls):
+        self.samples += 1
+        self.polls += polls
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    # fraction of one core that was used since the last reset
+    def cpu_usage(self):
+        wall = self.clock() - self._start_wall
+        return (time.thread_time() - self._start_cpu) / wall if wall > 0 else 0.0
+
+    def mean_latency(self):
+        return self.latency_sum / self.samples if self.samples > 0 else 0.0
+
+    def __str__(self):
+        return "samples: %d (+%d batched), polls per sample: %.1f, CPU usage: %.1f%%, latency mean: %.2fms, " \
+               "max: %.2fms" % (self.samples, self.batched, self.polls / max(self.samples, 1), self.cpu_usage() * 100,
+                                self.mean_latency() * 1000, self.latency_max * 1000)
+
+
+class BatchStatistics:
+    """ Describes the IMU samples that were drained and averaged into one AttitudeState in batch drain mode. """
+
+    # size: number of samples in the batch
+    # span: seconds between the first and the last sample, from the IMU timestamps
+    # acceleration_std: standard deviation of the body frame acceleration in the batch, per axis
+    def __init__(self, size, span, acceleration_std):
+        self.size = size
+        self.span = span
+        self.acceleration_std = acceleration_std
+
+    def __str__(self):
+        return "batch of %d samples over %.1fms" % (self.size, self.span * 1000)
+
 
 class AttitudeProvider (LoggingStateProviderWithListeners):
     """
     Accumulates data from gyroscope, accelerometer, magnetometer into one AttitudeState that describes the orientation
     of the vehicle in the air. Uses the RTIMULib Attitude Sensor Fusion.
+
+    By default update() busily polls the IMU until a sample is there. With sleep_until_sample, it sleeps until shortly
+    before the next sample is expected (one poll interval after the last one) and only polls from then on, which
+    leaves the CPU to the other threads. The statistics field allows to compare both modes.
+
+    With batch_drain, every update also reads all further samples that are already waiting (when the loop fell
+    behind). The orientation is taken from the newest sample, acceleration and rotation speeds are averaged over the
+    batch, and the listeners are notified once with BatchStatistics in AttitudeState.batch.
+
+    Instead of the RTIMULib IMU, a stand-in with the same interface can be given (like in a replay), together with the
+    clock that it follows. An optional LoopProfiler gets the time of waiting for and reading the IMU.
     """
-    def __init__(self):
+    def __init__(self, sleep_until_sample=False, batch_drain=False, imu=None, clock=None, profiler=None):
 
-        super().__init__("AttitudeProvider")
+        self.clock = clock if clock is not None else default_clock()
+        self.profiler = profiler
+        super().__init__("AttitudeProvider", self.clock)
 
-        self.log.info("Using settings file " + RT_IMU_LIB_SETTINGS_FILE + ".ini")
-        if not os.path.exists(RT_IMU_LIB_SETTINGS_FILE + ".ini"):
-            self.log.info("Settings file does not exist, will be created")
+        if imu is not None:
+            self.imu = imu
+        else:
+            self.log.info("Using settings file " + RT_IMU_LIB_SETTINGS_FILE + ".ini")
+            if not os.path.exists(RT_IMU_LIB_SETTINGS_FILE + ".ini"):
+                self.log.info("Settings file does not exist, will be created")
 
-        self.settings = RTIMU.Settings(RT_IMU_LIB_SETTINGS_FILE)
-        self.imu = RTIMU.RTIMU(self.settings)
+            self.settings = RTIMU.Settings(RT_IMU_LIB_SETTINGS_FILE)
+            self.imu = RTIMU.RTIMU(self.settings)
 
         self.log.info("IMU Name: " + self.imu.IMUName())
 
@@ -56,6 +144,14 @@ class AttitudeProvider (LoggingStateProviderWithListeners):
 
         self.state = None
 
+        self.sleep_until_sample = sleep_until_sample
+        self.statistics = AcquisitionStatistics(self.clock)
+        self._next_sample = self.clock()
+
+        # accelerations and rotation speeds of the samples of one batch
+        self.batch_drain = batch_drain
+        self._batch = zeros((MAX_BATCH_SIZE, 6))
+
     def _read_state(self, imu_data):
         """
         Combines IMU and Pressure readings into a state
@@ -75,16 +171,86 @@ class AttitudeProvider (LoggingStateProviderWithListeners):
         return AttitudeState(imu_data)
 
     def update(self):
-        """ Busily waits for the next IMU sensor reading (this should not take too long).
-        Then notifies listeners of the new state.
+        """ Waits for the next IMU sensor reading (this should not take too long), busily or sleeping depending on
+        sleep_until_sample. Then notifies listeners of the new state.
         :return: The new AttitudeState (describing the orientation of the vehicle)
         """
-        finished = False
-        while not finished:
-            if self.imu.IMURead():
-                newstate = self._read_state(self.imu.getIMUData())
-                self.notify_listeners(newstate)
-                finished = True
-
-                return newstate
+        if self.sleep_until_sample:
+            polls = self._sleep_and_poll()
+        else:
+            polls = self._busy_poll()
+
+        now = self.clock()
+        self.statistics.add_sample(max(0.0, now - self._next_sample), polls)
+
+        # the next sample is expected one poll interval after this one. If we fell behind by more than one
+        # interval, we start again from now instead of trying to catch up.
+        self._next_sample += self.pollInterval
+        if self._next_sample < now:
+            self._next_sample = now + self.pollInterval
+
+        if self.batch_drain:
+            newstate = self._read_batch(self.imu.getIMUData())
+        else:
+            newstate = self._read_state(self.imu.getIMUData())
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(IMU_READ)
+        self.notify_listeners(newstate)
+        return newstate
+
+    def _read_batch(self, imu_data):
+        """
+        Reads all samples that are already waiting after imu_data and combines them into one state
+        :param imu_data: dictionary of data from RTIMULib, the first sample of the batch
+        :return: AttitudeState with the orientation of the newest sample and the averaged acceleration and rotation
+                 speeds, and the BatchStatistics in batch
+        """
+        batch = self._batch
+        first_timestamp = imu_data["timestamp"]
+        batch[0, :3] = imu_data["accel"]
+        batch[0, 3:] = imu_data["gyro"]
+
+        size = 1
+        while size < MAX_BATCH_SIZE and self.imu.IMURead():
+            imu_data = self.imu.getIMUData()
+            batch[size, :3] = imu_data["accel"]
+            batch[size, 3:] = imu_data["gyro"]
+            size += 1
+
+        if size == MAX_BATCH_SIZE:
+            self.log.warning("IMU batch is full, the remaining samples are read in the next update")
+
+        state = self._read_state(imu_data)
+        if size > 1:
+            samples = batch[:size]
+            mean = samples.mean(axis=0).tolist()
+            state.acceleration = tuple(mean[:3])
+            (state.rotation.x.speed, state.rotation.y.speed, state.rotation.z.speed) = mean[3:]
+            acceleration_std = tuple(samples[:, :3].std(axis=0).tolist())
+        else:
+            acceleration_std = (0.0, 0.0, 0.0)
+
+        # RTIMULib timestamps are microseconds
+        state.batch = BatchStatistics(size, (imu_data["timestamp"] - first_timestamp) / 1e6, acceleration_std)
+        self.statistics.batched += size - 1
+        return state
+
+    # polls the IMU until a sample is there, returns the number of polls
+    def _busy_poll(self):
+        polls = 1
+        while not self.imu.IMURead():
+            polls += 1
+        return polls
+
+    # sleeps until shortly before the next sample is expected and polls with short sleeps from then on
+    def _sleep_and_poll(self):
+        remaining = self._next_sample - WAKE_UP_MARGIN - self.clock()
+        if remaining > 0:
+            self.clock.sleep(remaining)
+
+        polls = 1
+        while not self.imu.IMURead():
+            polls += 1
+            self.clock.sleep(POLL_SLEEP)
+        return polls
 
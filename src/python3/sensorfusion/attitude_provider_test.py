@@ -1,6 +1,7 @@
 import unittest
 import numpy
-from sensorfusion.attitude_provider import AttitudeProvider
+from sensorfusion.attitude_provider import AttitudeProvider, AcquisitionStatistics
+from util.clock import SimulatedClock
 import time
 
 
@@ -38,6 +39,48 @@ class TestAttitudeProvider(unittest.TestCase):
         self.assertEqual(invalid_counter.compassInvalidCounter, 0)
         self.assertEqual(invalid_counter.fusionPoseInvalidCounter, 0)
 
+    def test_sleep_until_sample(self):
+        mock_listener = MockListener(self)
+
+        attitude_provider = AttitudeProvider(sleep_until_sample=True)
+        attitude_provider.registerListener(mock_listener)
+
+        for x in range(100):
+            attitude_provider.update()
+
+        self.assertEqual(mock_listener.numUpdates, 100)
+        self.assertEqual(attitude_provider.statistics.samples, 100)
+
+        # we should not need much more than one poll interval per sample and not spin on the CPU
+        self.assertLess(attitude_provider.statistics.mean_latency(), attitude_provider.pollInterval)
+        self.assertLess(attitude_provider.statistics.cpu_usage(), 0.5)
+
+    def test_batch_drain(self):
+        mock_listener = MockListener(self)
+
+        attitude_provider = AttitudeProvider(batch_drain=True)
+        attitude_provider.registerListener(mock_listener)
+
+        # fall behind by several samples
+        time.sleep(0.05)
+
+        state = attitude_provider.update()
+
+        self.assertEqual(mock_listener.numUpdates, 1)
+        self.assertGreater(state.batch.size, 1)
+        self.assertEqual(attitude_provider.statistics.batched, state.batch.size - 1)
+
+class TestAcquisitionStatistics(unittest.TestCase):
+    def test_cpu_usage_on_clock(self):
+        clock = SimulatedClock()
+        statistics = AcquisitionStatistics(clock)
+        self.assertEqual(statistics.cpu_usage(), 0.0)
+
+        # the thread hardly used any CPU time during 1000 seconds on the clock
+        clock.advance(1000.0)
+        self.assertLess(statistics.cpu_usage(), 0.01)
+
+
 class MockListener:
     def __init__(self, tester):
         self.numUpdates = 0
@@ -8,9 +8,14 @@ class SensorFusionMaster(LoggingStateProviderWithListeners):
     - AttitudeProvider (gyro, accelerometer, magnetometer) -> AttitudeState (orientation in air)
     - HeightProvider (gps, ultrasonic sensor, barometer, attitude) -> HeightState (height above ground, vertical speed)
     """
-    def __init__(self):
-        self.attitudeProvider = AttitudeProvider()
-        self.heightProvider = HeightProvider()
+    # attitude_provider, height_provider: providers to use instead of the default ones on the hardware sensors
+    # clock: clock of the default providers, see util.clock
+    # profiler: optional LoopProfiler of the default providers
+    def __init__(self, attitude_provider=None, height_provider=None, clock=None, profiler=None):
+        self.attitudeProvider = attitude_provider if attitude_provider is not None \
+            else AttitudeProvider(clock=clock, profiler=profiler)
+        self.heightProvider = height_provider if height_provider is not None \
+            else HeightProvider(clock=clock, profiler=profiler)
 
     def update(self):
         # this will trigger the heightProvider via the listener
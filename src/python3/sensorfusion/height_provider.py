@@ -1,18 +1,30 @@
 import logging
 from numpy import *
-from sensorfusion.kalman import KalmanFilter
+from sensorfusion.kalman import PreallocatedKalmanFilter, SteadyStateGainCache
+from sensorfusion.state_history import StateHistory
 from state.logging_state_provider import LoggingStateProviderWithListeners
 from state.height_state import HeightState
 from sensors.pressure_sensor import PressureTemperatureSensor
 from sensors.range_finder_srf02 import SRF02
 from sensors.gps_polling_thread import GpsPollingThread
 from util.timer import Timer
+from util.clock import default_clock
+from util.loop_profiler import BAROMETER_READ, ULTRASONIC_READ, GPS_READ, KALMAN_PREDICT, KALMAN_UPDATE
 from state.vehicle_state import VehicleState
 from util.definitions import *
-from pyquaternion import Quaternion
+from util.quaternion import rotate, inverse_rotate
 from sensors.range_finder_height_above_ground_adapter import RangeFinderHeightAboveGroundAdapter
 
 
+# rows of the measurement prediction matrix H
+BAROMETER_ROW = 0
+ULTRASONIC_ROW = 1
+GPS_ROW = 2
+
+# number of filter steps that are kept for delayed GPS measurements, a bit more than a second at IMU rate
+HISTORY_SIZE = 128
+
+
 # F: state transition matrix
 def F(delta_time):
     # diagonal = 1, so we copy the old state as a basis for the next
@@ -35,26 +47,53 @@ def B(delta_time):
         [0], [0]])
 
 
+# Writes the dt dependent entries of F in place (see F above).
+# Also works for stacked matrices of shape (N, 4, 4) with one delta_time per matrix.
+def fill_F(F, delta_time):
+    F[..., 0, 1] = delta_time
+
+
+# Writes the dt dependent entries of B in place (see B above).
+# Also works for stacked matrices of shape (N, 4, 1) with one delta_time per matrix.
+def fill_B(B, delta_time):
+    B[..., 0, 0] = 0.5 * delta_time * delta_time
+    B[..., 1, 0] = delta_time
+
+
 class HeightProvider(LoggingStateProviderWithListeners):
     """ Reads Barometer + ultrasonic sensor + GPS and fuses them with linear accelerations to gather good knowledge of
     the height above ground and the (world space) vertical speed.
     See https://timdelbruegger.wordpress.com/2016/01/05/altitude-sensor-fusion/
     """
 
-    def __init__(self, gps_enabled=False):
-        super().__init__("HeightProvider")
+    # use_gain_cache: reuse the converged Kalman Gain in steady flight, see SteadyStateGainCache
+    # multi_rate: predict on every update, but fuse each sensor only when it has a new sample, see update_multi_rate.
+    #             The gain cache is not used in this mode.
+    # delayed_gps: fuse the GPS altitude at the time of its fix instead of the time it arrives, see StateHistory.
+    #              The gain cache is not used in this mode.
+    # barometer, ultrasonic, gps: stand-ins for the sensors (like in a replay), the hardware sensors are used if None
+    # clock: see util.clock, the default clock if None
+    # profiler: optional LoopProfiler that gets the times of the sensor reads and the Kalman steps
+    def __init__(self, gps_enabled=False, use_gain_cache=False, multi_rate=False, delayed_gps=False,
+                 barometer=None, ultrasonic=None, gps=None, clock=None, profiler=None):
+        self.clock = clock if clock is not None else default_clock()
+        self.profiler = profiler
+        super().__init__("HeightProvider", self.clock)
 
         self.log.debug("setup sensors...")
-        self.barometer = PressureTemperatureSensor(RT_IMU_SETTINGS)
-        self.ultrasonic = RangeFinderHeightAboveGroundAdapter(SRF02())
-
-        self.gps = GpsPollingThread(gps_enabled)
-        if gps_enabled:
-            self.log.info("Start reading from GPS...")
-            self.gps.start()
-            self.log.info("Reading from GPS started.")
+        self.barometer = barometer if barometer is not None else PressureTemperatureSensor(RT_IMU_SETTINGS)
+        self.ultrasonic = ultrasonic if ultrasonic is not None else RangeFinderHeightAboveGroundAdapter(SRF02(self.clock))
+
+        if gps is not None:
+            self.gps = gps
         else:
-            self.log.info("GPS is not used.")
+            self.gps = GpsPollingThread(gps_enabled)
+            if gps_enabled:
+                self.log.info("Start reading from GPS...")
+                self.gps.start()
+                self.log.info("Reading from GPS started.")
+            else:
+                self.log.info("GPS is not used.")
 
         self.log.debug("Setting up Kalman Filter...")
 
@@ -81,9 +120,33 @@ class HeightProvider(LoggingStateProviderWithListeners):
                    [1, 0, 0, 1]])  # gps height measurement
         self.log.debug("H: %s", H)
 
-        self.kf = KalmanFilter(x=x, P=P, A=F, Q=Q, B=B, H=H)
+        gain_cache = SteadyStateGainCache() if use_gain_cache else None
+        self.kf = PreallocatedKalmanFilter(x=x, P=P, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B,
+                                           gain_cache=gain_cache)
+
+        # control input, measurement vector and measurement noise are refilled on every update
+        self._u = zeros(1)
+        # multi rate mode: the control input of the previous update, valid until the time of the current one
+        self._u_previous = zeros(1)
+        self._input_time = None
+        self._Y = zeros((3, 1))
+        self._R = zeros((3, 3))
+
+        self.timer = Timer(self.clock)
 
-        self.timer = Timer()
+        # multi rate mode: time of the filter state and the last samples of the slow sensors
+        self.multi_rate = multi_rate
+        self._filter_time = self.clock()
+        self._next_barometer_read = self._filter_time
+        self._baro_reading = None
+        self._gps_reading = None
+
+        # sequence number of the last GPS fix that was fused
+        self._gps_sequence = None
+        self._events = []
+
+        # recent filter steps, so that GPS fixes can be fused at their own time
+        self.history = StateHistory(self.kf, HISTORY_SIZE, SENSOR_ERROR_MAX) if delayed_gps else None
 
         self.log.debug("HeightProvider is ready.")
 
@@ -93,15 +156,28 @@ class HeightProvider(LoggingStateProviderWithListeners):
     # perform an update after the given amount of time
     # dt: seconds since last update
     def update(self, attitude_state):
+        if self.multi_rate:
+            return self.update_multi_rate(attitude_state)
 
         dt = self.timer.readAndReset()
 
         # read data from sensors
         # It does not matter if the sensors are not ready, because then the variance will be very big
         # and other sensors and the state transition will take over.
+        # Like in update_multi_rate, every stage is measured from its begin, the work in between goes into no stage.
+        if __debug__ and self.profiler is not None:
+            self.profiler.begin()
         baro_reading = self.barometer.read()
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(BAROMETER_READ)
         (dist_ultrasonic, ultrasonic_error) = self.ultrasonic.update(attitude_state.orientation)
-        gps_reading = self.gps.read()
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(ULTRASONIC_READ)
+        (gps_sequence, gps_reading) = self.gps.read_versioned()
+        new_gps_fix = gps_sequence != self._gps_sequence
+        self._gps_sequence = gps_sequence
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(GPS_READ)
 
         # maybe we don't need this as the ultrasonic wave has some width? For now,
         # we only adjust the accuracy based on the angle
@@ -111,33 +187,194 @@ class HeightProvider(LoggingStateProviderWithListeners):
         vertical_acceleration = calculate_up_acceleration(attitude_state.orientation, attitude_state.acceleration)
 
         # control input
-        u = array([vertical_acceleration])
+        u = self._u
+        u[0] = vertical_acceleration
         self.log.debug("U: %s", u)
 
-        # Kalman Step 1: Predict with input
-        self.log.debug("Predict with Input")
-        (x, P) = self.kf.predictWithInput(u, dt)
-        self.log.debug("x: %s", x)
-        self.log.debug("P: %s", P)
-
         # Y: measurement vector
         # TODO: we could also add the GPS climb speed measurement
-        Y = array([[baro_reading.height_above_sea], [height_ultrasonic], [gps_reading.altitude]])
-
-        # R: measurement noise covariance matrix
-        R = diag([baro_reading.height_above_sea_error, ultrasonic_error, gps_reading.altitude_error])
+        Y = self._Y
+        Y[0, 0] = baro_reading.height_above_sea
+        Y[1, 0] = height_ultrasonic
+        Y[2, 0] = gps_reading.altitude
+
+        # R: measurement noise covariance matrix (diagonal)
+        R = self._R
+        R[0, 0] = baro_reading.height_above_sea_error
+        R[1, 1] = ultrasonic_error
+        # a fix is only fused once, until the next one arrives the GPS row is skipped
+        R[2, 2] = gps_reading.altitude_error if new_gps_fix else SENSOR_ERROR_MAX
 
-        # Kalman Step 2: Update with measurements
         self.log.debug("Y: %s", Y)
         self.log.debug("R: %s", R)
-        (x, P) = self.kf.updateWithMeasurement(Y, R)
+
+        if __debug__ and self.profiler is not None:
+            self.profiler.begin()
+        if self.history is not None:
+            # Kalman Steps 1 and 2 through the history: barometer and ultrasonic now, GPS at the time of its fix
+            now = self.clock()
+            self.history.predictWithInput(now, u, dt)
+            if __debug__ and self.profiler is not None:
+                self.profiler.mark(KALMAN_PREDICT)
+            self.history.updateWithScalarMeasurement(BAROMETER_ROW, Y[0, 0], R[0, 0])
+            (x, P) = self.history.updateWithScalarMeasurement(ULTRASONIC_ROW, Y[1, 0], R[1, 1])
+            if new_gps_fix:
+                (x, P) = self._fuse_delayed_gps(gps_reading, now)
+        elif self.kf.gain_cache is not None:
+            # Kalman Steps 1 and 2 at once: in steady flight the cached gain is reused without covariance propagation
+            # the whole step is counted as update
+            (x, P) = self.kf.step(u, dt, Y, R, SENSOR_ERROR_MAX)
+        else:
+            # Kalman Step 1: Predict with input
+            self.log.debug("Predict with Input")
+            (x, P) = self.kf.predictWithInput(u, dt)
+            self.log.debug("x: %s", x)
+            self.log.debug("P: %s", P)
+            if __debug__ and self.profiler is not None:
+                self.profiler.mark(KALMAN_PREDICT)
+
+            # Kalman Step 2: Update with measurements
+            # R is diagonal, so every sensor can be fused on its own. Sensors without data report SENSOR_ERROR_MAX
+            # and are skipped completely.
+            (x, P) = self.kf.updateWithIndependentMeasurements(Y, R, SENSOR_ERROR_MAX)
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(KALMAN_UPDATE)
+
+        self.log.debug("X: %s", x)
+
+        newstate = VehicleState(attitude_state, self._height_state(x), gps_reading, baro_reading,
+                                (dist_ultrasonic, ultrasonic_error))
+        self.notify_listeners(newstate)
+        return newstate
+
+    # Event driven variant of update: the filter is predicted at IMU rate, but every sensor is only fused when it
+    # actually has a new sample (barometer every BAROMETER_SAMPLE_INTERVAL, SRF02 when an echo arrived, GPS on a new
+    # fix). The samples are applied in the order of their timestamps, each after a prediction to its own time.
+    def update_multi_rate(self, attitude_state):
+        now = self.clock()
+        orientation = attitude_state.orientation
+
+        # The acceleration of an IMU tick is the control input from the time of the tick up to the next one. Samples
+        # from before now are predicted to with the acceleration of the previous tick, see _predict_to.
+        (self._u_previous, self._u) = (self._u, self._u_previous)
+        self._u[0] = calculate_up_acceleration(orientation, attitude_state.acceleration)
+        self._input_time = now
+
+        # (timestamp, row of H, measured value, variance)
+        events = self._events
+        del events[:]
+
+        # Every stage is measured from its begin, the work in between goes into no stage. A stage that does not run
+        # in an update is not marked.
+
+        # reading the barometer blocks on the I2C bus, so it is only read when a new sample is due
+        if now >= self._next_barometer_read:
+            if __debug__ and self.profiler is not None:
+                self.profiler.begin()
+            self._baro_reading = self.barometer.read()
+            if __debug__ and self.profiler is not None:
+                self.profiler.mark(BAROMETER_READ)
+            self._next_barometer_read = now + BAROMETER_SAMPLE_INTERVAL
+            events.append((self.clock(), BAROMETER_ROW, self._baro_reading.height_above_sea,
+                           self._baro_reading.height_above_sea_error))
+
+        # the SRF02 does its own timing and reports SENSOR_ERROR_MAX as long as there is no new echo
+        if __debug__ and self.profiler is not None:
+            self.profiler.begin()
+        (dist_ultrasonic, ultrasonic_error) = self.ultrasonic.update(orientation)
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(ULTRASONIC_READ)
+        if ultrasonic_error < SENSOR_ERROR_MAX:
+            events.append((self.clock(), ULTRASONIC_ROW, dist_ultrasonic, ultrasonic_error))
+
+        # GPS fixes are collected by the polling thread, a fix is only fused once
+        if __debug__ and self.profiler is not None:
+            self.profiler.begin()
+        (gps_sequence, gps_reading) = self.gps.read_versioned()
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(GPS_READ)
+        new_gps_fix = gps_sequence != self._gps_sequence
+        if new_gps_fix:
+            self._gps_sequence = gps_sequence
+            self._gps_reading = gps_reading
+            if self.history is None:
+                events.append((self._gps_time(self._gps_reading, now), GPS_ROW, self._gps_reading.altitude,
+                               self._gps_reading.altitude_error))
+
+        events.sort()
+        for (timestamp, row, y, r) in events:
+            if r < SENSOR_ERROR_MAX:
+                if __debug__ and self.profiler is not None:
+                    self.profiler.begin()
+                self._predict_to(timestamp)
+                if __debug__ and self.profiler is not None:
+                    self.profiler.mark(KALMAN_PREDICT)
+                if self.history is not None:
+                    self.history.updateWithScalarMeasurement(row, y, r)
+                else:
+                    self.kf.updateWithScalarMeasurement(row, y, r)
+                if __debug__ and self.profiler is not None:
+                    self.profiler.mark(KALMAN_UPDATE)
+        if __debug__ and self.profiler is not None:
+            self.profiler.begin()
+        (x, P) = self._predict_to(now)
+        if __debug__ and self.profiler is not None:
+            self.profiler.mark(KALMAN_PREDICT)
+
+        if new_gps_fix and self.history is not None:
+            if __debug__ and self.profiler is not None:
+                self.profiler.begin()
+            (x, P) = self._fuse_delayed_gps(self._gps_reading, now)
+            if __debug__ and self.profiler is not None:
+                self.profiler.mark(KALMAN_UPDATE)
 
         self.log.debug("X: %s", x)
 
-        newstate = VehicleState(attitude_state, HeightState.fromVector(x), gps_reading, baro_reading)
+        newstate = VehicleState(attitude_state, self._height_state(x), self._gps_reading,
+                                self._baro_reading, (dist_ultrasonic, ultrasonic_error))
         self.notify_listeners(newstate)
         return newstate
 
+    # The HeightState of the filter state x. A single vectorized check per step instead of one per value of every
+    # HeightState, and not an assert: a diverged filter must also be noticed when running with python -O.
+    def _height_state(self, x):
+        if not isfinite(x).all():
+            raise ValueError("height filter diverged, state: %s" % x.ravel())
+        return HeightState.fromVector(x)
+
+    # predicts the filter state forward to the given time, samples from the past do not move it backwards.
+    # Up to the time of the current update, the control input of the previous one is used.
+    def _predict_to(self, timestamp):
+        if self._filter_time < self._input_time < timestamp:
+            self._predict(self._input_time, self._u_previous)
+        return self._predict(timestamp, self._u if self._input_time < timestamp else self._u_previous)
+
+    def _predict(self, timestamp, u):
+        dt = timestamp - self._filter_time
+        if dt > 0:
+            self._filter_time = timestamp
+            if self.history is not None:
+                return self.history.predictWithInput(timestamp, u, dt)
+            return self.kf.predictWithInput(u, dt)
+        return self.kf.x, self.kf.P
+
+    # The time of a GPS fix on the clock, or now if the fix has no time. The fix time is in seconds since the epoch,
+    # a fix can not be newer than now.
+    def _gps_time(self, gps_reading, now):
+        if isfinite(gps_reading.timestamp):
+            timestamp = self.clock.from_wall_time(gps_reading.timestamp)
+            if timestamp < now:
+                return timestamp
+        return now
+
+    # fuses the altitude of a GPS fix at the time of the fix, or now if the fix has no time
+    def _fuse_delayed_gps(self, gps_reading, now):
+        timestamp = self._gps_time(gps_reading, now)
+        if not self.history.updateWithDelayedMeasurement(timestamp, GPS_ROW, gps_reading.altitude,
+                                                         gps_reading.altitude_error):
+            self.log.debug("GPS fix at %f could not be fused", timestamp)
+        return self.kf.x, self.kf.P
+
 
 # Calculates the distance above ground from a ray measurement facing down.
 # The ground is assumed to be planar with normal (0,1,0).
@@ -145,12 +382,11 @@ class HeightProvider(LoggingStateProviderWithListeners):
 # distance is assumed to be meters
 # TODO: Check how narrow the sensor beam really is
 def correct_ultrasonic_angle(orientation, distance):
-    assert (isinstance(orientation, Quaternion))
     assert (isinstance(distance, float))
 
     # The quaternions in RTIMULib are thought to start at (0,0,1)
     # turn Z by orientation quaternion
-    direction = orientation.rotate(FORWARD_AXIS)
+    direction = rotate(orientation, FORWARD_AXIS)
 
     # this is the angle between the ultrasonic beam and the real direction to ground
     # Now we have a right triangle, distance = length of hypothenuse
@@ -170,6 +406,7 @@ def calculate_up_acceleration(orientation, acceleration_body_frame):
 
 
 # Transforms a body frame direction vector to world centric coordinates based on a given orientation quaternion
+# [w, x, y, z]
 def body_to_world_frame(orientation, vector):
     # revert the body orientation to get the world coordinates
-    return orientation.inverse().rotate(vector)
+    return inverse_rotate(orientation, vector)
@@ -7,7 +7,10 @@ from state.attitude_state import AttitudeState
 from util.definitions import *
 from state.attitude_state_test import imu_reading
 from state.vehicle_state import VehicleState
-from math import isnan
+from state.gps_state import GPSState
+from state.pressure_temp_state import PressureTemperatureState
+from util.clock import SimulatedClock
+from math import isnan, nan
 import logging
 
 
@@ -59,6 +62,81 @@ class TestStateProvider(unittest.TestCase):
 
         height_provider.stop()
 
+    def test_multi_rate(self):
+        mock_listener = MockListener(self)
+        invalid_counter = InvalidCounterListener()
+
+        height_provider = HeightProvider(multi_rate=True)
+        height_provider.registerListener(mock_listener)
+        height_provider.registerListener(invalid_counter)
+
+        attitude_state = AttitudeState(imu_reading)
+
+        # IMU rate updates for longer than the SRF02 and barometer intervals
+        for x in range(50):
+            time.sleep(0.005)
+            height_provider.update(attitude_state)
+
+        self.assertEqual(mock_listener.numUpdates, 50)
+        self.assertEqual(invalid_counter.invalidElevationCounter, 0)
+        self.assertEqual(invalid_counter.invalidElevationSpeedCounter, 0)
+
+        height_provider.stop()
+
+    def test_multi_rate_input_until_next_update(self):
+        clock = SimulatedClock()
+        height_provider = HeightProvider(multi_rate=True, barometer=NoBarometer(), ultrasonic=NoEcho(), gps=NoGps(),
+                                         clock=clock)
+        level = dict(imu_reading, fusionQPose=(1.0, 0.0, 0.0, 0.0), accel=(0.0, 0.0, 0.0))
+        climbing = dict(level, accel=(0.0, 2.0, 0.0))
+
+        height_provider.update(AttitudeState(level))
+
+        # the acceleration of an update does not act before its time
+        clock.advance(0.1)
+        state = height_provider.update(AttitudeState(climbing))
+        self.assertEqual(state.height.vertical_speed, 0.0)
+
+        # but up to the next update
+        clock.advance(0.1)
+        state = height_provider.update(AttitudeState(level))
+        self.assertAlmostEqual(state.height.vertical_speed, 0.2)
+
+    def test_diverged(self):
+        clock = SimulatedClock()
+        height_provider = HeightProvider(multi_rate=True, barometer=NoBarometer(), ultrasonic=NoEcho(), gps=NoGps(),
+                                         clock=clock)
+        height_provider.update(AttitudeState(dict(imu_reading, accel=(0.0, 0.0, nan))))
+
+        # the acceleration acts up to the next update
+        clock.advance(0.1)
+        with self.assertRaises(ValueError):
+            height_provider.update(AttitudeState(imu_reading))
+
+
+# Stand-ins for sensors without any data
+class NoBarometer:
+    def read(self):
+        return PressureTemperatureState(False, 0.0, False, 0.0)
+
+
+class NoEcho:
+    def update(self, orientation):
+        return nan, SENSOR_ERROR_MAX
+
+
+class NoGps:
+    def __init__(self):
+        fix = type("Fix", (), dict(time=nan, latitude=nan, longitude=nan, altitude=nan, speed=nan, climb=nan,
+                                   track=nan, mode=1))
+        self.state = GPSState(type("GpsData", (), dict(fix=fix, utc=None, satellites=()))())
+
+    def read_versioned(self):
+        return 1, self.state
+
+    def stop(self):
+        pass
+
 
 class MockListener:
     def __init__(self, tester):
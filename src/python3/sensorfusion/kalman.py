@@ -1,10 +1,47 @@
-from numpy import dot, sum, tile, exp, log, pi, shape, reshape
-from numpy.linalg import inv, pinv, LinAlgError, det
+from numpy import dot, sum, tile, exp, log, pi, shape, reshape, array, zeros, add, subtract, multiply, inf, isfinite, \
+    copyto, abs, sqrt, outer
+from numpy.linalg import inv, pinv, solve, LinAlgError, det
 import logging
 
 logger = logging.getLogger("KalmanFilter")
 
 
+# Counts how often the Kalman gain could not be computed with a linear solve and the pseudo inverse was used instead.
+class GainStatistics:
+    def __init__(self):
+        self.pinv_fallbacks = 0
+
+    def reset(self):
+        self.pinv_fallbacks = 0
+
+
+gain_statistics = GainStatistics()
+
+
+# Kalman Gain K = P H^T IS^-1
+# IS is symmetric positive definite, so we solve IS K^T = (P H^T)^T (LU factorization and triangular substitution
+# in one LAPACK call) instead of computing a full pseudo inverse. Only if the factorization fails, pinv is used.
+# PHt: P H^T
+# IS: covariance of the predictive distribution of Y
+def kalman_gain(PHt, IS):
+    try:
+        K = solve(IS, PHt.T).T
+        if isfinite(K).all():
+            return K
+    except LinAlgError:
+        pass
+
+    gain_statistics.pinv_fallbacks += 1
+    logger.warning("IS could not be factorized, falling back to pinv (Kalman Gain)")
+
+    try:
+        return dot(PHt, pinv(IS))
+    except LinAlgError:
+        logger.error("LinAlgError on IS inversion (Kalman Gain)")
+        logger.error(IS)
+        raise
+
+
 # X: state vector at k-1
 # P: covariance matrix at k-1
 # A: state transition matrix
@@ -60,15 +97,11 @@ def kf_update(X, P, Y, H, R):
     IM = dot(H, X)
 
     # Covariance or predictive mean of Y
-    IS = R + dot(H, dot(P, H.T))
+    PHt = dot(P, H.T)
+    IS = R + dot(H, PHt)
 
     # Kalman Gain
-    try:
-        K = dot(P, dot(H.T, pinv(IS)))
-    except LinAlgError:
-        logger.error("LinAlgError on IS inversion (Kalman Gain)")
-        logger.error(IS)
-        raise
+    K = kalman_gain(PHt, IS)
 
     #logger.debug("Kalman Gain G")
     #logger.debug(K)
@@ -85,6 +118,38 @@ def kf_update(X, P, Y, H, R):
     return X, P, K, IM, IS #, LH
 
 
+# Processes every row of H as an independent scalar measurement. This is equivalent to kf_update if R is diagonal,
+# but no matrix inversion is needed. Measurements with a variance of at least max_variance carry no information
+# (for example sensors that report SENSOR_ERROR_MAX) and are skipped.
+# X: state vector at k-1
+# P: covariance matrix at k-1
+# Y: measurement vector
+# H: measurement prediction matrix
+# R: measurement noise covariance matrix, must be diagonal
+# max_variance: measurements with at least this variance are ignored
+def kf_update_sequential(X, P, Y, H, R, max_variance=inf):
+
+    for i in range(H.shape[0]):
+        r = R[i, i]
+        if r >= max_variance:
+            continue
+
+        h = H[i:i+1, :]
+
+        # covariance of the predictive distribution of this measurement
+        PHt = dot(P, h.T)
+        S = dot(h, PHt)[0, 0] + r
+
+        # Kalman Gain
+        K = PHt / S
+
+        # update X, P
+        X = X + K * (Y[i, 0] - dot(h, X)[0, 0])
+        P = P - dot(K, PHt.T)
+
+    return X, P
+
+
 def gauss_pdf(X, M, S):
     if M.shape()[1] == 1:
         DX = X - tile(M, X.shape()[1])
@@ -130,3 +195,306 @@ class KalmanFilter:
     def updateWithMeasurement(self, Y, R):
         (self.x, self.P, K, IM, IS) = kf_update(self.x, self.P, Y, self.H, R)
         return self.x, self.P
+
+
+class PreallocatedKalmanFilter(KalmanFilter):
+    """ Fixed-shape variant of KalmanFilter that allocates all of its work buffers once at construction.
+    The dt dependent entries of the state transition and control influence matrices are written in place by
+    fill_A / fill_B, and predict / update run with out= operations in the same order as kf_predict / kf_update,
+    so the results are identical. x and P are updated in place: the returned arrays are the same objects every step.
+    The only remaining allocation per step is the solve for the Kalman gain in updateWithMeasurement.
+    """
+
+    # X: state vector at k-1
+    # P: covariance matrix at k-1
+    # A: state transition matrix (function for dt), only used to create the initial matrix
+    # Q: process noise covariance matrix
+    # B: control influence (function for dt), only used to create the initial matrix
+    # H: measurement prediction matrix
+    # fill_A: writes the dt dependent entries of the state transition matrix in place, fill_A(A, dt)
+    # fill_B: writes the dt dependent entries of the control influence matrix in place, fill_B(B, dt)
+    # gain_cache: optional SteadyStateGainCache, used by step()
+    def __init__(self, x, P, A, Q, B, H, fill_A, fill_B, gain_cache=None):
+        super().__init__(array(x, dtype=float), array(P, dtype=float), array(A(0), dtype=float),
+                         array(Q, dtype=float), array(B(0), dtype=float), array(H, dtype=float))
+        self.fill_A = fill_A
+        self.fill_B = fill_B
+        self.gain_cache = gain_cache
+
+        n = self.x.shape[0]
+        k = self.H.shape[0]
+
+        # transposed views stay valid because A and H are only modified in place
+        self._At = self.A.T
+        self._Ht = self.H.T
+
+        # predict buffers
+        self._Ax = zeros(self.x.shape)
+        self._Bu = zeros(self.x.shape)
+        self._Bu_flat = self._Bu.reshape(n)
+        self._Qdt = zeros((n, n))
+        self._PAt = zeros((n, n))
+
+        # update buffers
+        self._IM = zeros((k, 1))
+        self._PHt = zeros((n, k))
+        self._IS = zeros((k, k))
+        self._K = zeros((n, k))
+        self._innovation = zeros((k, 1))
+        self._Kinnovation = zeros(self.x.shape)
+        self._Kt = self._K.T
+        self._ISKt = zeros((k, n))
+        self._KISKt = zeros((n, n))
+
+        # buffers and views for the independent scalar updates
+        self._x_flat = self.x.reshape(n)
+        self._H_rows = [self.H[i] for i in range(k)]
+        self._PHt_scalar = zeros(n)
+        self._K_scalar = zeros(n)
+        self._PHt_scalar_row = self._PHt_scalar.reshape(1, n)
+        self._K_scalar_column = self._K_scalar.reshape(n, 1)
+        self._K_innovation_scalar = zeros(n)
+
+    # U: control input vector
+    def predictWithInput(self, U, dt):
+        self._predict_state(U, dt)
+
+        dot(self.P, self._At, out=self._PAt)
+        dot(self.A, self._PAt, out=self.P)
+        multiply(dt, self.Q, out=self._Qdt)
+        add(self.P, self._Qdt, out=self.P)
+
+        return self.x, self.P
+
+    # x = A x + B u, without touching P
+    def _predict_state(self, U, dt):
+        self.fill_A(self.A, dt)
+        self.fill_B(self.B, dt)
+
+        dot(self.A, self.x, out=self._Ax)
+        if U.ndim == 1:
+            dot(self.B, U, out=self._Bu_flat)
+        else:
+            dot(self.B, U, out=self._Bu)
+        add(self._Ax, self._Bu, out=self.x)
+
+    # Predict with input and update with independent measurements in one step.
+    # If a gain_cache is set and the filter is at steady state for this dt and set of sensors, the converged
+    # Kalman Gain and covariance are reused and the covariance propagation is skipped.
+    # U: control input vector
+    # Y: measurement vector
+    # R: measurement noise covariance matrix, must be diagonal
+    # max_variance: measurements with at least this variance are ignored
+    def step(self, U, dt, Y, R, max_variance=inf):
+        if self.gain_cache is None:
+            self.predictWithInput(U, dt)
+            return self.updateWithIndependentMeasurements(Y, R, max_variance)
+
+        entry = self.gain_cache.lookup(dt, R, max_variance)
+        if entry.converged:
+            self._predict_state(U, dt)
+
+            dot(self.H, self.x, out=self._IM)
+            subtract(Y, self._IM, out=self._innovation)
+            # measurements that are not used must not contribute, even if they are not finite
+            multiply(self._innovation, entry.active, out=self._innovation)
+            dot(entry.K, self._innovation, out=self._Kinnovation)
+            add(self.x, self._Kinnovation, out=self.x)
+
+            copyto(self.P, entry.P)
+        else:
+            self.predictWithInput(U, dt)
+            self.updateWithIndependentMeasurements(Y, R, max_variance)
+            entry.observe(self.P, self.H, R)
+
+        return self.x, self.P
+
+    # Y: measurement vector
+    # R: measurement noise covariance matrix
+    def updateWithMeasurement(self, Y, R):
+        # mean and covariance of the predictive distribution of Y
+        dot(self.H, self.x, out=self._IM)
+        dot(self.P, self._Ht, out=self._PHt)
+        dot(self.H, self._PHt, out=self._IS)
+        add(R, self._IS, out=self._IS)
+
+        # Kalman Gain
+        copyto(self._K, kalman_gain(self._PHt, self._IS))
+
+        # update X, P
+        subtract(Y, self._IM, out=self._innovation)
+        dot(self._K, self._innovation, out=self._Kinnovation)
+        add(self.x, self._Kinnovation, out=self.x)
+
+        dot(self._IS, self._Kt, out=self._ISKt)
+        dot(self._K, self._ISKt, out=self._KISKt)
+        subtract(self.P, self._KISKt, out=self.P)
+
+        return self.x, self.P
+
+    # Same as kf_update_sequential, but in place.
+    # Y: measurement vector
+    # R: measurement noise covariance matrix, must be diagonal
+    # max_variance: measurements with at least this variance are ignored
+    def updateWithIndependentMeasurements(self, Y, R, max_variance=inf):
+        for i in range(len(self._H_rows)):
+            r = R[i, i]
+            if r < max_variance:
+                self._update_scalar(self._H_rows[i], Y[i, 0], r)
+
+        return self.x, self.P
+
+    # Update with the single measurement of row i of H, for sensors that deliver their samples at their own rate.
+    # y: measured value
+    # r: variance of the measurement
+    def updateWithScalarMeasurement(self, i, y, r):
+        self._update_scalar(self._H_rows[i], y, r)
+        return self.x, self.P
+
+    # h: row of the measurement prediction matrix
+    # y: measured value
+    # r: variance of the measurement
+    def _update_scalar(self, h, y, r):
+        PHt = self._PHt_scalar
+        K = self._K_scalar
+
+        dot(self.P, h, out=PHt)
+        S = dot(h, PHt) + r
+        multiply(PHt, 1.0 / S, out=K)
+
+        multiply(K, y - dot(h, self._x_flat), out=self._K_innovation_scalar)
+        add(self._x_flat, self._K_innovation_scalar, out=self._x_flat)
+
+        multiply(self._K_scalar_column, self._PHt_scalar_row, out=self._KISKt)
+        subtract(self.P, self._KISKt, out=self.P)
+
+
+class SteadyStateGainCache:
+    """ Gain scheduling for PreallocatedKalmanFilter.step: in steady flight the covariance and Kalman Gain of the
+    filter converge. For every quantized dt and set of sensors that report valid errors, the cache keeps an entry that
+    watches the posterior covariance of the steps with this dt and these sensors. Once the covariances stay within
+    tolerance (relative to the standard deviations of their two states) for settle_steps of these steps, the converged
+    covariance and the matching gain are stored and reused, so the filter only has to propagate the state.
+    Sensors that only report now and then, like the SRF02 between its echoes, make the covariance depend on how many
+    steps ago they last reported, so these gaps are part of the entry as well. The entries stay valid while the loop
+    alternates between them; an entry is only invalidated when the noise of one of its active sensors changes by more
+    than noise_tolerance (relative), because the filter then has to converge again.
+    """
+
+    # dt_bucket: width of the dt quantization in seconds
+    # tolerance: maximum deviation of every covariance from the start of the converged steps, relative to the
+    #            standard deviations of its two states. Must cover the jitter of dt within a bucket.
+    # settle_steps: number of consecutive converged steps before the gain is reused
+    # noise_tolerance: maximum relative change of a measurement variance that keeps an entry valid
+    # max_gap: gaps of a sensor of more steps count as this many
+    def __init__(self, dt_bucket=0.001, tolerance=0.01, settle_steps=100, noise_tolerance=0.01, max_gap=8):
+        self.dt_bucket = dt_bucket
+        self.tolerance = tolerance
+        self.settle_steps = settle_steps
+        self.noise_tolerance = noise_tolerance
+        self.max_gap = max_gap
+
+        self.entries = {}
+        # for every sensor the number of steps since it last reported, up to max_gap
+        self._gaps = None
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # Returns the entry for this dt and these measurement variances. Counts a hit if the entry has a converged gain.
+    def lookup(self, dt, R, max_variance):
+        variances = R.diagonal()
+        active = tuple(bool(variance < max_variance) for variance in variances)
+        if self._gaps is None:
+            self._gaps = (self.max_gap,) * len(active)
+        key = (int(round(dt / self.dt_bucket)), active, self._gaps)
+        self._gaps = tuple(0 if is_active else min(gap + 1, self.max_gap)
+                           for (is_active, gap) in zip(active, self._gaps))
+
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = _GainCacheEntry(self, active)
+            self.entries[key] = entry
+
+        # after a change of the noise levels the filter has to converge again
+        if not entry.same_noise(variances):
+            if entry.invalidate():
+                self.invalidations += 1
+
+        if entry.converged:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return entry
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def __str__(self):
+        return "SteadyStateGainCache(hits=%d, misses=%d, invalidations=%d, entries=%d)" % (
+            self.hits, self.misses, self.invalidations, len(self.entries))
+
+
+# Covariance history and converged gain for one dt bucket, set of active sensors and their gaps
+class _GainCacheEntry:
+
+    def __init__(self, cache, active):
+        self.cache = cache
+        # column vector with 1 for every used measurement and 0 for every ignored one
+        self.active = array(active, dtype=float).reshape(len(active), 1)
+        self.variances = None
+        self.P = None
+        self.K = None
+        self.stable_steps = 0
+        self.converged = False
+
+    # True if the variances of all active measurements are close to the ones this entry was built with
+    def same_noise(self, variances):
+        if self.variances is None:
+            return True
+        for i in range(len(variances)):
+            if self.active[i, 0] and abs(variances[i] - self.variances[i]) > self.cache.noise_tolerance * self.variances[i]:
+                return False
+        return True
+
+    # forgets the covariance history, returns True if there was something to forget
+    def invalidate(self):
+        had_data = self.P is not None
+        self.variances = None
+        self.P = None
+        self.K = None
+        self.stable_steps = 0
+        self.converged = False
+        return had_data
+
+    # P: posterior covariance after a full predict and update step
+    # H: measurement prediction matrix
+    # R: measurement noise covariance matrix that was used in the update (diagonal)
+    def observe(self, P, H, R):
+        if self.P is None:
+            self.P = P.copy()
+            self.variances = R.diagonal().copy()
+            return
+
+        # self.P is the covariance at the start of the converged steps, so that a slow drift does not count as
+        # converged. Covariances close to 0 are compared on the scale of their states, or they would never converge.
+        deviations = sqrt(abs(P.diagonal()))
+        if (abs(P - self.P) <= self.cache.tolerance * outer(deviations, deviations)).all():
+            self.stable_steps += 1
+        else:
+            self.stable_steps = 0
+            copyto(self.P, P)
+
+        if self.stable_steps >= self.cache.settle_steps:
+            copyto(self.P, P)
+            # Kalman Gain of the converged filter in information form: K = P H^T R^-1 (R diagonal).
+            # This is also the combined gain of the independent scalar updates.
+            self.K = zeros((P.shape[0], H.shape[0]))
+            for i in range(H.shape[0]):
+                if self.active[i, 0]:
+                    self.K[:, i] = dot(P, H[i]) / self.variances[i]
+            self.converged = True
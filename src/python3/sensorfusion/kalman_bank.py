@@ -0,0 +1,139 @@
+from numpy import array, zeros, tile, matmul, swapaxes, multiply, add, subtract, inf, asarray
+import logging
+
+logger = logging.getLogger("KalmanFilterBank")
+
+
+# Batched version of kf_predict: advances N filters with one vectorized computation.
+# x: state vectors at k-1, shape (N, n, 1)
+# P: covariance matrices at k-1, shape (N, n, n)
+# A: state transition matrices, shape (N, n, n)
+# Q: process noise covariance matrices, shape (N, n, n)
+# B: input effect matrices, shape (N, n, m)
+# u: control input vectors, shape (N, m)
+def kf_predict_batch(x, P, A, Q, B, u):
+    N = x.shape[0]
+
+    x = matmul(A, x) + matmul(B, u.reshape(N, -1, 1))
+    P = matmul(A, matmul(P, swapaxes(A, 1, 2))) + Q
+
+    return x, P
+
+
+# Batched version of kf_update_sequential: every row of H is processed as an independent scalar measurement for all
+# N filters at once, so R must be diagonal and no matrix inversion is needed.
+# x: state vectors at k-1, shape (N, n, 1)
+# P: covariance matrices at k-1, shape (N, n, n)
+# Y: measurement vectors, shape (N, k)
+# H: measurement prediction matrix, shape (k, n), shared by all filters
+# R: measurement variances (the diagonal of the measurement noise covariance matrix), shape (N, k)
+# mask: which measurements are available, shape (N, k). None means all of them.
+# max_variance: measurements with at least this variance are ignored
+def kf_update_batch(x, P, Y, H, R, mask=None, max_variance=inf):
+    x = x.copy()
+    P = P.copy()
+    KPHt = zeros(P.shape)
+
+    for i in range(H.shape[0]):
+        _update_scalar_batch(x[:, :, 0], P, H[i], Y[:, i], R[:, i], _active(R[:, i], mask, i, max_variance), KPHt)
+
+    return x, P
+
+
+# the measurements of row i that are used in the update
+def _active(r, mask, i, max_variance):
+    active = r < max_variance
+    if mask is not None:
+        active &= mask[:, i]
+    return active
+
+
+# in place scalar update of all filters with the measurement row h
+# x: (N, n), P: (N, n, n), h: (n,), y, r, active: (N,), KPHt: work buffer of shape (N, n, n)
+def _update_scalar_batch(x, P, h, y, r, active, KPHt):
+    PHt = matmul(P, h)
+    S = matmul(PHt, h) + r
+
+    # inactive measurements get a Kalman gain of zero, so they change neither x nor P
+    K = PHt * (active / S)[:, None]
+
+    x += K * (y - matmul(x, h))[:, None]
+
+    multiply(K[:, :, None], PHt[:, None, :], out=KPHt)
+    subtract(P, KPHt, out=P)
+
+
+class KalmanFilterBank:
+    """ Holds N independent Kalman filters with the same structure (for example copies of the HeightProvider filter
+    with different Q and R for tuning or Monte Carlo runs) in stacked arrays and advances them all with one vectorized
+    computation per step. Every filter can have its own time delta and its own set of available measurements.
+    """
+
+    # N: number of filters
+    # x: initial state vector, shape (n, 1), or one per filter, shape (N, n, 1)
+    # P: initial covariance matrix, shape (n, n), or one per filter, shape (N, n, n)
+    # A: state transition matrix (function for dt), only used to create the initial matrices
+    # Q: process noise covariance matrix, shape (n, n), or one per filter, shape (N, n, n)
+    # B: control influence (function for dt), only used to create the initial matrices
+    # H: measurement prediction matrix, shape (k, n)
+    # fill_A: writes the dt dependent entries of the stacked state transition matrices in place, fill_A(A, dt)
+    # fill_B: writes the dt dependent entries of the stacked control influence matrices in place, fill_B(B, dt)
+    def __init__(self, N, x, P, A, Q, B, H, fill_A, fill_B):
+        self.N = N
+        self.x = _stack(N, x)
+        self.P = _stack(N, P)
+        self.A = _stack(N, A(0))
+        self.Q = _stack(N, Q)
+        self.B = _stack(N, B(0))
+        self.H = array(H, dtype=float)
+        self.fill_A = fill_A
+        self.fill_B = fill_B
+
+        n = self.x.shape[1]
+
+        # work buffers
+        self._At = swapaxes(self.A, 1, 2)
+        self._x_flat = self.x[:, :, 0]
+        self._Ax = zeros(self.x.shape)
+        self._Bu = zeros(self.x.shape)
+        self._PAt = zeros((N, n, n))
+        self._Qdt = zeros((N, n, n))
+        self._KPHt = zeros((N, n, n))
+
+    # U: control inputs, shape (N, m)
+    # dt: time since the last prediction, a scalar or one per filter, shape (N,)
+    def predictWithInput(self, U, dt):
+        dt = asarray(dt, dtype=float)
+        self.fill_A(self.A, dt)
+        self.fill_B(self.B, dt)
+
+        matmul(self.A, self.x, out=self._Ax)
+        matmul(self.B, U.reshape(self.N, -1, 1), out=self._Bu)
+        add(self._Ax, self._Bu, out=self.x)
+
+        matmul(self.P, self._At, out=self._PAt)
+        matmul(self.A, self._PAt, out=self.P)
+        multiply(self.Q, dt.reshape(-1, 1, 1), out=self._Qdt)
+        add(self.P, self._Qdt, out=self.P)
+
+        return self.x, self.P
+
+    # Y: measurements, shape (N, k)
+    # R: measurement variances, shape (N, k)
+    # mask: which measurements are available, shape (N, k). None means all of them.
+    # max_variance: measurements with at least this variance are ignored
+    def updateWithIndependentMeasurements(self, Y, R, mask=None, max_variance=inf):
+        for i in range(self.H.shape[0]):
+            _update_scalar_batch(self._x_flat, self.P, self.H[i], Y[:, i], R[:, i],
+                                 _active(R[:, i], mask, i, max_variance), self._KPHt)
+
+        return self.x, self.P
+
+
+# repeats a single matrix N times or copies an already stacked one
+def _stack(N, matrix):
+    matrix = array(matrix, dtype=float)
+    if matrix.ndim == 3:
+        assert matrix.shape[0] == N
+        return matrix
+    return tile(matrix, (N, 1, 1))
@@ -0,0 +1,78 @@
+import unittest
+from numpy import array, diag, allclose, zeros, ones, stack
+from numpy.random import RandomState
+from sensorfusion.kalman import PreallocatedKalmanFilter, kf_predict, kf_update_sequential
+from sensorfusion.kalman_bank import KalmanFilterBank, kf_predict_batch, kf_update_batch
+from sensorfusion.kalman_test import F, B, fill_F, fill_B, x0, P0, Q, H
+
+SENSOR_ERROR_MAX = 10000000
+N = 5
+
+
+class TestKalmanFilterBank(unittest.TestCase):
+
+    def setUp(self):
+        random = RandomState(3)
+        # every filter gets its own process noise
+        self.Qs = stack([Q * (1 + i) for i in range(N)])
+        self.dts = 0.005 + 0.01 * random.rand(20, N)
+        self.us = random.randn(20, N, 1)
+        self.Ys = array([100, 0.5, 100]) + random.randn(20, N, 3)
+        self.Rs = array([40, 0.01, 7]) * (1 + random.rand(20, N, 3))
+        # GPS and ultrasonic sometimes fail
+        self.masks = random.rand(20, N, 3) > 0.3
+        self.masks[:, :, 0] = True
+
+    def test_same_results_as_single_filters(self):
+        bank = KalmanFilterBank(N, x=x0, P=P0, A=F, Q=self.Qs, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        singles = [PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=self.Qs[i], B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+                   for i in range(N)]
+
+        for step in range(20):
+            bank.predictWithInput(self.us[step], self.dts[step])
+            bank.updateWithIndependentMeasurements(self.Ys[step], self.Rs[step], self.masks[step], SENSOR_ERROR_MAX)
+
+            for i in range(N):
+                # a masked measurement is the same as a dead sensor
+                R = diag(self.Rs[step, i])
+                R[~self.masks[step, i], ~self.masks[step, i]] = SENSOR_ERROR_MAX
+                singles[i].predictWithInput(self.us[step, i], self.dts[step, i])
+                singles[i].updateWithIndependentMeasurements(self.Ys[step, i].reshape(3, 1), R, SENSOR_ERROR_MAX)
+
+        for i in range(N):
+            self.assertTrue(allclose(bank.x[i], singles[i].x))
+            self.assertTrue(allclose(bank.P[i], singles[i].P))
+
+    def test_functions(self):
+        xs = stack([x0] * N)
+        Ps = stack([P0] * N)
+        As = zeros((N, 4, 4))
+        Bs = zeros((N, 4, 1))
+        for i in range(N):
+            As[i] = F(self.dts[0, i])
+            Bs[i] = B(self.dts[0, i])
+
+        (x, P) = kf_predict_batch(xs, Ps, As, self.Qs * self.dts[0].reshape(N, 1, 1), Bs, self.us[0])
+        (x, P) = kf_update_batch(x, P, self.Ys[0], H, self.Rs[0])
+
+        for i in range(N):
+            (x_single, P_single) = kf_predict(x0, P0, As[i], self.Qs[i] * self.dts[0, i], Bs[i], self.us[0, i])
+            (x_single, P_single) = kf_update_sequential(x_single, P_single, self.Ys[0, i].reshape(3, 1), H,
+                                                        diag(self.Rs[0, i]))
+            self.assertTrue(allclose(x[i], x_single))
+            self.assertTrue(allclose(P[i], P_single))
+
+    def test_fully_masked_measurements_change_nothing(self):
+        bank = KalmanFilterBank(N, x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        bank.predictWithInput(zeros((N, 1)), 0.01)
+        x_before = bank.x.copy()
+        P_before = bank.P.copy()
+
+        bank.updateWithIndependentMeasurements(self.Ys[0], self.Rs[0], zeros((N, 3), dtype=bool))
+
+        self.assertTrue((bank.x == x_before).all())
+        self.assertTrue((bank.P == P_before).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
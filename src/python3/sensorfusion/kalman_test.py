@@ -0,0 +1,258 @@
+import unittest
+from numpy import array, diag, square, allclose, dot, zeros
+from numpy.linalg import pinv
+from numpy.random import RandomState
+from sensorfusion.kalman import KalmanFilter, PreallocatedKalmanFilter, kf_predict, kf_update, kf_update_sequential, \
+    kalman_gain, gain_statistics, SteadyStateGainCache
+
+
+# same model as in the HeightProvider, copied here so that the test does not need the sensor hardware
+def F(delta_time):
+    return array([
+        [1, delta_time, 0, 0],
+        [0, 1, 0, 0],
+        [0, 0, 1, 0],
+        [0, 0, 0, 1]])
+
+
+def B(delta_time):
+    return array([[0.5 * square(delta_time)], [delta_time], [0], [0]])
+
+
+def fill_F(F, delta_time):
+    F[..., 0, 1] = delta_time
+
+
+def fill_B(B, delta_time):
+    B[..., 0, 0] = 0.5 * delta_time * delta_time
+    B[..., 1, 0] = delta_time
+
+
+x0 = array([[0.0], [0.0], [100.0], [100.0]])
+P0 = diag([0.1, 0.1, 10000, 10000])
+Q = diag([0.3, 0.5, 0, 0])
+H = array([[1, 0, 1, 0],
+           [1, 0, 0, 0],
+           [1, 0, 0, 1]])
+
+
+# feeds the same random inputs and measurements into both filters
+def run_filters(filter_a, filter_b, steps, seed=42):
+    random = RandomState(seed)
+    for step in range(steps):
+        dt = 0.005 + 0.01 * random.rand()
+        u = array([random.randn()])
+        Y = array([[120 + random.randn()], [1 + 0.1 * random.randn()], [130 + 5 * random.randn()]])
+        R = diag([40, 0.01 if step % 7 else 10000000, 10000000])
+
+        filter_a.predictWithInput(u, dt)
+        filter_b.predictWithInput(u, dt)
+        filter_a.updateWithMeasurement(Y, R)
+        filter_b.updateWithMeasurement(Y, R)
+
+
+class TestPreallocatedKalmanFilter(unittest.TestCase):
+
+    def test_same_results_as_kalman_filter(self):
+        reference = KalmanFilter(x=x0.copy(), P=P0.copy(), A=F, Q=Q, B=B, H=H)
+        preallocated = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+
+        run_filters(reference, preallocated, 200)
+
+        self.assertTrue(allclose(reference.x, preallocated.x, rtol=1e-12, atol=1e-12))
+        self.assertTrue(allclose(reference.P, preallocated.P, rtol=1e-12, atol=1e-12))
+
+    def test_buffers_are_reused(self):
+        kf = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        x_before = kf.x
+        P_before = kf.P
+
+        (x, P) = kf.predictWithInput(array([1.0]), 0.01)
+        self.assertIs(x, x_before)
+        self.assertIs(P, P_before)
+
+        (x, P) = kf.updateWithMeasurement(array([[100.0], [0.0], [100.0]]), diag([40, 0.01, 10000000]))
+        self.assertIs(x, x_before)
+        self.assertIs(P, P_before)
+
+    def test_does_not_modify_initial_values(self):
+        x = x0.copy()
+        kf = PreallocatedKalmanFilter(x=x, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        kf.predictWithInput(array([1.0]), 0.01)
+
+        self.assertTrue((x == x0).all())
+
+    def test_dt_entries(self):
+        kf = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        kf.predictWithInput(array([0.0]), 0.25)
+
+        self.assertTrue((kf.A == F(0.25)).all())
+        self.assertTrue((kf.B == B(0.25)).all())
+
+
+class TestSequentialUpdate(unittest.TestCase):
+
+    def setUp(self):
+        # a covariance with some correlations after a few prediction steps
+        (self.x, self.P) = kf_predict(x0, P0, F(0.1), 0.1 * Q, B(0.1), array([0.5]))
+        self.Y = array([[102.0], [0.2], [95.0]])
+
+    def test_same_as_batch_update_for_diagonal_R(self):
+        R = diag([40, 0.01, 7])
+        (x_batch, P_batch, K, IM, IS) = kf_update(self.x, self.P, self.Y, H, R)
+        (x_seq, P_seq) = kf_update_sequential(self.x, self.P, self.Y, H, R)
+
+        self.assertTrue(allclose(x_batch, x_seq))
+        self.assertTrue(allclose(P_batch, P_seq))
+
+    def test_skips_dead_sensors(self):
+        R = diag([40, 10000000, 10000000])
+        (x_batch, P_batch, K, IM, IS) = kf_update(self.x, self.P, self.Y[:1], H[:1], R[:1, :1])
+        (x_seq, P_seq) = kf_update_sequential(self.x, self.P, self.Y, H, R, max_variance=10000000)
+
+        self.assertTrue(allclose(x_batch, x_seq))
+        self.assertTrue(allclose(P_batch, P_seq))
+
+    def test_no_information_no_change(self):
+        R = diag([10000000, 10000000, 10000000])
+        (x_seq, P_seq) = kf_update_sequential(self.x, self.P, self.Y, H, R, max_variance=10000000)
+
+        self.assertTrue((x_seq == self.x).all())
+        self.assertTrue((P_seq == self.P).all())
+
+    def test_preallocated_filter(self):
+        R = diag([40, 0.01, 10000000])
+        kf = PreallocatedKalmanFilter(x=self.x, P=self.P, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        (x_seq, P_seq) = kf_update_sequential(self.x, self.P, self.Y, H, R, max_variance=10000000)
+        (x, P) = kf.updateWithIndependentMeasurements(self.Y, R, max_variance=10000000)
+
+        self.assertTrue(allclose(x_seq, x, rtol=1e-12))
+        self.assertTrue(allclose(P_seq, P, rtol=1e-12))
+
+    def test_single_scalar_measurement(self):
+        R = diag([10000000, 0.01, 10000000])
+        kf = PreallocatedKalmanFilter(x=self.x, P=self.P, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        (x_seq, P_seq) = kf_update_sequential(self.x, self.P, self.Y, H, R, max_variance=10000000)
+        (x, P) = kf.updateWithScalarMeasurement(1, self.Y[1, 0], 0.01)
+
+        self.assertTrue(allclose(x_seq, x, rtol=1e-12))
+        self.assertTrue(allclose(P_seq, P, rtol=1e-12))
+
+
+class TestKalmanGain(unittest.TestCase):
+
+    def setUp(self):
+        gain_statistics.reset()
+
+    def test_same_as_pinv(self):
+        (x, P) = kf_predict(x0, P0, F(0.1), 0.1 * Q, B(0.1), array([0.5]))
+        PHt = dot(P, H.T)
+        IS = diag([40, 0.01, 7]) + dot(H, PHt)
+
+        self.assertTrue(allclose(kalman_gain(PHt, IS), dot(P, dot(H.T, pinv(IS)))))
+        self.assertEqual(gain_statistics.pinv_fallbacks, 0)
+
+    def test_fallback_on_singular_covariance(self):
+        PHt = array([[1.0, 1.0], [0.0, 0.0]])
+        IS = zeros((2, 2))
+
+        K = kalman_gain(PHt, IS)
+
+        self.assertTrue((K == zeros((2, 2))).all())
+        self.assertEqual(gain_statistics.pinv_fallbacks, 1)
+
+
+class TestSteadyStateGainCache(unittest.TestCase):
+
+    def setUp(self):
+        # Without process noise on the barometer ground offset, its variance keeps shrinking and there is no
+        # steady state. The GPS ground offset is not observed without GPS, so it must not drift either.
+        self.Q = diag([0.3, 0.5, 0.01, 0])
+        self.cache = SteadyStateGainCache(tolerance=1e-4, settle_steps=20)
+        self.cached = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=self.Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B,
+                                               gain_cache=self.cache)
+        self.reference = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=self.Q, B=B, H=H, fill_A=fill_F,
+                                                  fill_B=fill_B)
+        self.random = RandomState(7)
+
+    # barometer + ultrasonic, no GPS
+    def run_steps(self, steps, R=diag([40, 0.01, 10000000])):
+        for i in range(steps):
+            u = array([0.1 * self.random.randn()])
+            Y = array([[100 + self.random.randn()], [1 + 0.01 * self.random.randn()], [50.0]])
+            self.cached.step(u, 0.01, Y, R, 10000000)
+            self.reference.step(u, 0.01, Y, R, 10000000)
+
+    def test_hits_after_convergence(self):
+        self.run_steps(3000)
+
+        self.assertGreater(self.cache.hits, 0)
+        self.assertTrue(allclose(self.cached.x, self.reference.x, rtol=1e-4, atol=1e-4))
+        self.assertTrue(allclose(self.cached.P, self.reference.P, rtol=1e-3, atol=1e-4))
+
+    def test_keep_entry_on_sensor_change(self):
+        self.run_steps(3000)
+        hits = self.cache.hits
+
+        # ultrasonic fails: new set of active sensors without a converged entry
+        self.run_steps(1, R=diag([40, 10000000, 10000000]))
+        self.assertEqual(self.cache.hits, hits)
+
+        # ultrasonic is back after a gap, then the old entry is still valid
+        self.run_steps(1)
+        self.assertEqual(self.cache.hits, hits)
+        self.run_steps(1)
+        self.assertEqual(self.cache.hits, hits + 1)
+        self.assertEqual(self.cache.invalidations, 0)
+        self.assertTrue(allclose(self.cached.x, self.reference.x, rtol=1e-3, atol=1e-3))
+
+    def test_hits_with_jitter_and_intermittent_ultrasonic(self):
+        self.cache = SteadyStateGainCache(settle_steps=20)
+        self.cached.gain_cache = self.cache
+        R_echo = diag([40, 0.01, 10000000])
+        R_no_echo = diag([40, 10000000, 10000000])
+        time = 0.0
+        next_echo = 0.0
+        for i in range(3000):
+            # 50 Hz loop with a wake-up jitter across the neighbouring dt buckets
+            dt = 0.02 + 0.002 * (self.random.rand() - 0.5)
+            time += dt
+            # the SRF02 has a new echo every 65 ms
+            R = R_echo if time >= next_echo else R_no_echo
+            if time >= next_echo:
+                next_echo += 0.065
+
+            u = array([0.1 * self.random.randn()])
+            Y = array([[100 + self.random.randn()], [1 + 0.01 * self.random.randn()], [50.0]])
+            self.cached.step(u, dt, Y, R, 10000000)
+            self.reference.step(u, dt, Y, R, 10000000)
+
+        self.assertGreater(self.cache.hits, 0)
+        self.assertEqual(self.cache.invalidations, 0)
+        self.assertTrue(allclose(self.cached.x, self.reference.x, rtol=1e-3, atol=1e-3))
+
+    def test_invalidate_on_noise_change(self):
+        self.run_steps(3000)
+        hits = self.cache.hits
+        invalidations = self.cache.invalidations
+
+        self.run_steps(1, R=diag([80, 0.01, 10000000]))
+
+        self.assertEqual(self.cache.hits, hits)
+        self.assertEqual(self.cache.invalidations, invalidations + 1)
+
+    def test_without_cache_step_is_predict_and_update(self):
+        kf = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=self.Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        R = diag([40, 0.01, 10000000])
+        Y = array([[101.0], [1.0], [50.0]])
+
+        self.reference.predictWithInput(array([0.5]), 0.01)
+        self.reference.updateWithIndependentMeasurements(Y, R, 10000000)
+        kf.step(array([0.5]), 0.01, Y, R, 10000000)
+
+        self.assertTrue((kf.x == self.reference.x).all())
+        self.assertTrue((kf.P == self.reference.P).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
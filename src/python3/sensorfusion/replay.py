@@ -0,0 +1,248 @@
+# Replays a flight that was recorded with the FlightRecorder through the sensor fusion.
+# Run from src/python3 with: python3 -m sensorfusion.replay <recorded flight> [output file]
+# The output file is a new flight recording with the replayed states, so it can be compared with the original one.
+import logging
+import sys
+import time
+from numpy import empty, isnan, zeros
+
+from controlLoop import ControlLoop
+from sensorfusion.attitude_provider import AttitudeProvider
+from sensorfusion.height_provider import HeightProvider
+from sensorfusion.fusion_master import SensorFusionMaster
+from state.gps_state import GPSState
+from state.pressure_temp_state import PressureTemperatureState
+from util.flight_recorder import FlightRecorder, load_flight
+from util.clock import SimulatedClock
+
+
+class FlightReplay:
+    """ Feeds a recorded flight through the unchanged SensorFusionMaster, AttitudeProvider and HeightProvider.
+    The hardware sensors are replaced by stand-ins that return the recorded readings, and all components follow a
+    SimulatedClock that jumps to the time of each record. Nothing waits for real time, so the replay runs as fast as
+    the CPU allows, and the same recording and options always give bit-identical results.
+
+    Given the PIDs, the fused states are also fed through a ControlLoop, whose motors are replaced by ReplayMotors
+    that keep the motor signals of every record.
+    """
+
+    # flight: recorded flight, see load_flight
+    # pids: PIDs of the ControlLoop (see ControlLoop), None to only replay the sensor fusion
+    # target_state: target of the ControlLoop, see ControlLoop.set_target_state. The ControlLoop holds the level
+    #               attitude at height 0 if None.
+    # options: options of the HeightProvider, like multi_rate or delayed_gps
+    def __init__(self, flight, pids=None, target_state=None, **options):
+        self.flight = flight
+        self.position = 0
+        self._times = flight["time"].tolist()
+
+        # the recorded times are seconds since the epoch, like the GPS fix times
+        self.clock = SimulatedClock(self._times[0] if len(flight) > 0 else 0.0)
+
+        self.imu = ReplayIMU(self)
+        attitude_provider = AttitudeProvider(imu=self.imu, clock=self.clock)
+        height_provider = HeightProvider(barometer=ReplayBarometer(self), ultrasonic=ReplayUltrasonic(self),
+                                         gps=ReplayGps(self), clock=self.clock, **options)
+        self.fusion = SensorFusionMaster(attitude_provider, height_provider)
+
+        self.motors = None
+        self.control_loop = None
+        if pids is not None:
+            self.motors = ReplayMotors(self)
+            self.control_loop = ControlLoop(self.motors, pids)
+            if target_state is not None:
+                self.control_loop.set_target_state(target_state)
+
+    # Replays all records. Listeners of the fusion.heightProvider get every replayed VehicleState. With a ControlLoop,
+    # it is stepped with every state from the second record on (the first one has no time delta), and the motor
+    # signals are in motors.signals.
+    # returns the fused height states (height above ground, vertical speed, ground height barometer,
+    # ground height gps) of all records, shape (number of records, 4)
+    def run(self):
+        heights = empty((len(self.flight), 4))
+        for position in range(len(self.flight)):
+            self.position = position
+            self.clock.set(self._times[position])
+            state = self.fusion.update()
+            heights[position] = state.height.as_vector()[:, 0]
+            if self.control_loop is not None and position > 0:
+                self.control_loop.step(self._times[position] - self._times[position - 1], state)
+        return heights
+
+
+class ReplayIMU:
+    """ Stand-in for the RTIMULib IMU: delivers one recorded sample per replay step. """
+
+    def __init__(self, replay):
+        self.replay = replay
+        flight = replay.flight
+        self._timestamps = flight["imu_timestamp"].astype(int).tolist()
+        self._fusion_pose = [tuple(v) for v in flight["fusion_pose"].tolist()]
+        self._fusion_q_pose = [tuple(v) for v in flight["fusion_q_pose"].tolist()]
+        self._gyro = [tuple(v) for v in flight["gyro"].tolist()]
+        self._accel = [tuple(v) for v in flight["accel"].tolist()]
+        self._compass = [tuple(v) for v in flight["compass"].tolist()]
+        self._delivered = -1
+
+    def IMUName(self):
+        return "replay"
+
+    def IMUInit(self):
+        return True
+
+    def setSlerpPower(self, power):
+        pass
+
+    def setGyroEnable(self, enable):
+        pass
+
+    def setAccelEnable(self, enable):
+        pass
+
+    def setCompassEnable(self, enable):
+        pass
+
+    # milliseconds between the recorded samples
+    def IMUGetPollInterval(self):
+        if len(self._timestamps) < 2:
+            return 4
+        return max(1, (self._timestamps[-1] - self._timestamps[0]) // (len(self._timestamps) - 1) // 1000)
+
+    # there is exactly one sample per replay step
+    def IMURead(self):
+        if self._delivered == self.replay.position:
+            return False
+        self._delivered = self.replay.position
+        return True
+
+    def getIMUData(self):
+        i = self.replay.position
+        return {"timestamp": self._timestamps[i],
+                "fusionPose": self._fusion_pose[i], "fusionPoseValid": True,
+                "fusionQPose": self._fusion_q_pose[i], "fusionQPoseValid": True,
+                "gyro": self._gyro[i], "gyroValid": True,
+                "accel": self._accel[i], "accelValid": True,
+                "compass": self._compass[i], "compassValid": True,
+                "pressure": 0.0, "pressureValid": False,
+                "temperature": 0.0, "temperatureValid": False,
+                "humidity": 0.0, "humidityValid": False}
+
+
+class ReplayBarometer:
+    """ Stand-in for the PressureTemperatureSensor """
+
+    def __init__(self, replay):
+        self.replay = replay
+        self._pressure = replay.flight["air_pressure"].tolist()
+        self._temperature = replay.flight["temperature"].tolist()
+
+    def read(self):
+        pressure = self._pressure[self.replay.position]
+        temperature = self._temperature[self.replay.position]
+        return PressureTemperatureState(pressure == pressure, pressure, temperature == temperature, temperature)
+
+
+class ReplayUltrasonic:
+    """ Stand-in for the RangeFinderHeightAboveGroundAdapter: returns the recorded distance and corrected variance """
+
+    def __init__(self, replay):
+        self.replay = replay
+        self._distance = replay.flight["ultrasonic_distance"].tolist()
+        self._error = replay.flight["ultrasonic_error"].tolist()
+
+    def update(self, attitude):
+        return self._distance[self.replay.position], self._error[self.replay.position]
+
+
+class ReplayGps:
+    """ Stand-in for the GpsPollingThread. The recording has no sequence numbers, a new fix starts whenever the
+    recorded fix differs from the one of the record before.
+    """
+
+    FIELDS = ("gps_timestamp", "gps_latitude", "gps_longitude", "gps_altitude", "gps_altitude_error", "gps_mode")
+
+    def __init__(self, replay):
+        self.replay = replay
+        flight = replay.flight
+        self._fixes = list(zip(*(flight[field].tolist() for field in ReplayGps.FIELDS)))
+
+        # sequence number of the fix of every record
+        changed = empty(len(flight), dtype=bool)
+        changed[:1] = True
+        changed[1:] = False
+        for field in ReplayGps.FIELDS:
+            values = flight[field]
+            changed[1:] |= (values[1:] != values[:-1]) & ~(isnan(values[1:]) & isnan(values[:-1]))
+        self._sequences = changed.cumsum().tolist()
+
+        self._snapshot = (0, None)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def read(self):
+        return self.read_versioned()[1]
+
+    def read_versioned(self):
+        sequence = self._sequences[self.replay.position]
+        if sequence != self._snapshot[0]:
+            self._snapshot = (sequence, GPSState(RecordedGpsData(*self._fixes[self.replay.position])))
+        return self._snapshot
+
+
+class ReplayMotors:
+    """ Stand-in for the motors of the ControlLoop: keeps the motor signals of every record, 0 where the ControlLoop
+    did not run.
+    """
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.signals = zeros((len(replay.flight), 4))
+
+    def setSpeed(self, motor_speeds):
+        self.signals[self.replay.position] = motor_speeds
+
+
+class RecordedGpsData:
+    """ The parts of the gpsd data that were recorded, in the form that GPSState reads. """
+
+    def __init__(self, timestamp, latitude, longitude, altitude, altitude_error, mode):
+        self.fix = RecordedGpsFix(timestamp, latitude, longitude, altitude, altitude_error, mode)
+        self.utc = timestamp
+        self.satellites = ()
+
+
+class RecordedGpsFix:
+    def __init__(self, timestamp, latitude, longitude, altitude, altitude_error, mode):
+        self.time = timestamp
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.epv = altitude_error
+        self.mode = int(mode) if mode == mode else 0
+        self.speed = float("nan")
+        self.climb = float("nan")
+        self.track = float("nan")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    flight = load_flight(sys.argv[1])
+    replay = FlightReplay(flight)
+    recorder = None
+    if len(sys.argv) > 2:
+        recorder = FlightRecorder(sys.argv[2], capacity=max(1, len(flight)), clock=replay.clock)
+        replay.fusion.heightProvider.registerListener(recorder)
+
+    start = time.perf_counter()
+    replay.run()
+    duration = time.perf_counter() - start
+    if recorder is not None:
+        recorder.close()
+
+    if len(flight) > 0:
+        print("replayed %d records (%.1f s of flight) in %.2f s" % (len(flight), flight["time"][-1] - flight["time"][0],
+                                                                  duration))
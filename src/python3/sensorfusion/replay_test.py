@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from numpy import isfinite
+from numpy.testing import assert_array_equal
+
+from pid import PIDControllerBank
+from sensorfusion.replay import FlightReplay
+from state_change_planning import State
+from state_change_planning_3d import State3d
+from util.flight_recorder import FlightRecorder, load_flight
+from util.flight_recorder_test import vehicle_state
+from util.clock import SimulatedClock
+
+
+class TestFlightReplay(unittest.TestCase):
+
+    def setUp(self):
+        (handle, self.path) = tempfile.mkstemp(suffix=".rec")
+        os.close(handle)
+
+        # 10 seconds at 100 Hz with a GPS fix every second
+        clock = SimulatedClock()
+        recorder = FlightRecorder(self.path, capacity=1000, clock=clock)
+        for i in range(1000):
+            clock.set(1452000000.0 + i * 0.01)
+            state = vehicle_state(i)
+            state.gps.timestamp = 1452000000.0 + i // 100
+            state.air_pressure = 1000.0
+            recorder.append(state)
+        recorder.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_bit_identical(self):
+        flight = load_flight(self.path)
+        for options in [{}, {"multi_rate": True}, {"delayed_gps": True}]:
+            heights = FlightReplay(flight, **options).run()
+            self.assertTrue(isfinite(heights).all())
+            assert_array_equal(FlightReplay(flight, **options).run(), heights)
+
+            # the recorded SRF02 distance is 1.5m with a small variance
+            self.assertAlmostEqual(heights[-1, 0], 1.5, places=1)
+
+    def test_control_bit_identical(self):
+        flight = load_flight(self.path)
+        target = SimpleNamespace(rotation=State3d(), elevation=State(2.0, 0.0))
+
+        signals = []
+        for i in range(2):
+            replay = FlightReplay(flight, pids=PIDControllerBank(1, 0.1, 0.01, [0, 0, 0, 0], -10, 10),
+                                  target_state=target)
+            replay.run()
+            signals.append(replay.motors.signals)
+
+        assert_array_equal(signals[1], signals[0])
+        self.assertTrue(isfinite(signals[0]).all())
+        # 1.5m above ground, below the target height of 2m: the vehicle has to climb
+        self.assertGreater(signals[0][-1].mean(), 0)
+
+    def test_record_replay(self):
+        flight = load_flight(self.path)
+        replay = FlightReplay(flight)
+        (handle, output) = tempfile.mkstemp(suffix=".rec")
+        os.close(handle)
+        try:
+            recorder = FlightRecorder(output, capacity=len(flight), clock=replay.clock)
+            replay.fusion.heightProvider.registerListener(recorder)
+            heights = replay.run()
+            recorder.close()
+
+            replayed = load_flight(output)
+            assert_array_equal(replayed["time"], flight["time"])
+            assert_array_equal(replayed["gyro"], flight["gyro"])
+            assert_array_equal(replayed["height"], heights)
+        finally:
+            os.remove(output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+from numpy import array, zeros, empty, empty_like, tile, matmul, swapaxes, identity, where, inf, asarray, concatenate
+from numpy.linalg import solve, inv
+import logging
+
+logger = logging.getLogger("RauchTungStriebelSmoother")
+
+
+class RauchTungStriebelSmoother:
+    """ Offline smoother for recorded runs of a linear Kalman filter model like the one in the HeightProvider.
+    The forward filter and the backward Rauch-Tung-Striebel pass are both written as associative scans
+    (Saerkkae and Garcia-Fernandez, "Temporal Parallelization of Bayesian Smoothers"), so every step of the recursion
+    is a batched array operation over all samples instead of a Python loop per sample. The results are the same as
+    those of running a PreallocatedKalmanFilter with updateWithIndependentMeasurements over the log followed by the
+    classic RTS recursion.
+
+    The log is processed in chunks of chunk_size samples to bound the memory of the intermediate matrices.
+    """
+
+    # A: state transition matrix (function for dt), only used to create the initial matrices
+    # Q: process noise covariance matrix, it is scaled with dt like in the PreallocatedKalmanFilter
+    # B: control influence (function for dt), only used to create the initial matrices
+    # H: measurement prediction matrix, shape (k, n)
+    # fill_A: writes the dt dependent entries of the stacked state transition matrices in place, fill_A(A, dt)
+    # fill_B: writes the dt dependent entries of the stacked control influence matrices in place, fill_B(B, dt)
+    # chunk_size: number of samples that are processed with one scan
+    def __init__(self, A, Q, B, H, fill_A, fill_B, chunk_size=65536):
+        self.A = array(A(0), dtype=float)
+        self.Q = array(Q, dtype=float)
+        self.B = array(B(0), dtype=float)
+        self.H = array(H, dtype=float)
+        self.fill_A = fill_A
+        self.fill_B = fill_B
+        self.chunk_size = chunk_size
+
+    # Runs the forward filter over a recorded log. Every sample is a prediction followed by an update, like one
+    # HeightProvider.update call.
+    # x: initial state vector, shape (n, 1)
+    # P: initial covariance matrix, shape (n, n)
+    # dt: time deltas of the predictions, shape (T,)
+    # U: control inputs, shape (T, m)
+    # Y: measurements, shape (T, k)
+    # R: measurement variances (the diagonal of the measurement noise covariance matrix), shape (T, k)
+    # max_variance: measurements with at least this variance are ignored
+    # returns the filtered state vectors, shape (T, n), and covariance matrices, shape (T, n, n)
+    def filter(self, x, P, dt, U, Y, R, max_variance=inf):
+        T = len(dt)
+        n = self.A.shape[0]
+        xs = empty((T, n))
+        Ps = empty((T, n, n))
+
+        x = array(x, dtype=float).reshape(n, 1)
+        P = array(P, dtype=float)
+        for start in range(0, T, self.chunk_size):
+            end = min(start + self.chunk_size, T)
+            chunk_x, chunk_P = self._filter_chunk(x, P, dt[start:end], U[start:end], Y[start:end], R[start:end],
+                                                  max_variance)
+            xs[start:end] = chunk_x
+            Ps[start:end] = chunk_P
+            x = chunk_x[-1].reshape(n, 1)
+            P = chunk_P[-1]
+
+        return xs, Ps
+
+    # Runs the forward filter and the backward RTS pass over a recorded log, see filter for the parameters.
+    # returns the smoothed state vectors, shape (T, n), and covariance matrices, shape (T, n, n)
+    def smooth(self, x, P, dt, U, Y, R, max_variance=inf):
+        xf, Pf = self.filter(x, P, dt, U, Y, R, max_variance)
+        return self.smooth_filtered(xf, Pf, dt, U)
+
+    # The backward RTS pass over the results of filter.
+    # xf: filtered state vectors, shape (T, n)
+    # Pf: filtered covariance matrices, shape (T, n, n)
+    # dt, U: the time deltas and control inputs that were used by the filter
+    def smooth_filtered(self, xf, Pf, dt, U):
+        T = len(dt)
+        xs = empty_like(xf)
+        Ps = empty_like(Pf)
+
+        for start in reversed(range(0, T, self.chunk_size)):
+            end = min(start + self.chunk_size, T)
+            if end == T:
+                tail = None
+            else:
+                tail = (xs[end], Ps[end])
+            xs[start:end], Ps[start:end] = self._smooth_chunk(xf[start:end], Pf[start:end], dt[start + 1:end + 1],
+                                                              U[start + 1:end + 1], tail)
+
+        return xs, Ps
+
+    # F: (T, n, n), u: (T, n, 1) and Q: (T, n, n) of the predictions with the given time deltas and inputs
+    def _transitions(self, dt, U):
+        dt = asarray(dt, dtype=float)
+        F = tile(self.A, (len(dt), 1, 1))
+        B = tile(self.B, (len(dt), 1, 1))
+        self.fill_A(F, dt)
+        self.fill_B(B, dt)
+        u = matmul(B, asarray(U, dtype=float).reshape(len(dt), self.B.shape[1], 1))
+        return F, u, self.Q * dt.reshape(-1, 1, 1)
+
+    def _filter_chunk(self, x, P, dt, U, Y, R, max_variance):
+        F, u, Q = self._transitions(dt, U)
+
+        # the first element starts from the given prior, so its prediction is a constant
+        u[0] = matmul(F[0], x) + u[0]
+        Q[0] = matmul(F[0], matmul(P, F[0].T)) + Q[0]
+        F[0] = 0
+
+        # unavailable measurements get a zero row in H, so they do not contribute
+        active = R < max_variance
+        H = self.H * active[:, :, None]
+        y = where(active, Y, 0)[:, :, None]
+        S = matmul(H, matmul(Q, _transpose(H)))
+        S[:, range(H.shape[1]), range(H.shape[1])] += where(active, R, 1)
+
+        # one batched inversion is cheaper than several batched solves with the small matrices
+        S_inv = inv(S)
+        HQ = matmul(H, Q)
+        K = matmul(_transpose(HQ), S_inv)
+        HF = matmul(H, F)
+        innovation = y - matmul(H, u)
+        HFtS_inv = matmul(_transpose(HF), S_inv)
+        elements = (
+            F - matmul(K, HF),
+            u + matmul(K, innovation),
+            Q - matmul(K, HQ),
+            matmul(HFtS_inv, innovation),
+            matmul(HFtS_inv, HF))
+
+        A, b, C, eta, J = _associative_scan(_filter_combine, elements)
+        return b[:, :, 0], C
+
+    # xf, Pf: filtered estimates of the chunk
+    # dt, U: time deltas and inputs of the prediction to the sample after each sample of the chunk
+    # tail: smoothed estimate of the sample after the chunk, None for the last chunk
+    def _smooth_chunk(self, xf, Pf, dt, U, tail):
+        size = len(xf)
+        n = xf.shape[1]
+        E = zeros((size + 1, n, n))
+        g = empty((size + 1, n, 1))
+        L = empty((size + 1, n, n))
+
+        # the elements are stored in reverse order, starting with the smoothed estimate after the chunk
+        if tail is None:
+            g[0] = xf[-1].reshape(n, 1)
+            L[0] = Pf[-1]
+            predicted = slice(0, size - 1)
+        else:
+            g[0] = tail[0].reshape(n, 1)
+            L[0] = tail[1]
+            predicted = slice(0, size)
+
+        xf = xf[predicted, :, None]
+        Pf = Pf[predicted]
+        F, u, Q = self._transitions(dt[:len(xf)], U[:len(xf)])
+        FP = matmul(F, Pf)
+        gain = _transpose(solve(matmul(FP, _transpose(F)) + Q, FP))
+
+        count = len(xf)
+        E[count:0:-1] = gain
+        g[count:0:-1] = xf - matmul(gain, matmul(F, xf) + u)
+        L[count:0:-1] = Pf - matmul(gain, FP)
+
+        E, g, L = _associative_scan(_smoother_combine, (E[:count + 1], g[:count + 1], L[:count + 1]))
+        if tail is None:
+            return concatenate((g[:0:-1, :, 0], g[:1, :, 0])), concatenate((L[:0:-1], L[:1]))
+        return g[:0:-1, :, 0], L[:0:-1]
+
+
+# Combines the filtering elements i and j (j after i) of the associative filter.
+# Every element is the tuple (A, b, C, eta, J) of stacked arrays.
+def _filter_combine(i, j):
+    Ai, bi, Ci, etai, Ji = i
+    Aj, bj, Cj, etaj, Jj = j
+
+    # (I + J_j C_i)^-1 is the transpose of (I + C_i J_j)^-1 because C and J are symmetric
+    M = inv(identity(Ai.shape[1]) + matmul(Ci, Jj))
+    AjM = matmul(Aj, M)
+    AiN = matmul(_transpose(Ai), _transpose(M))
+
+    return (matmul(AjM, Ai),
+            matmul(AjM, bi + matmul(Ci, etaj)) + bj,
+            matmul(AjM, matmul(Ci, _transpose(Aj))) + Cj,
+            matmul(AiN, etaj - matmul(Jj, bi)) + etai,
+            matmul(AiN, matmul(Jj, Ai)) + Ji)
+
+
+# Combines the smoothing elements i and j of the backward pass, where j is the later sample.
+# The backward scan runs in reverse order, so the accumulated later part is the first argument.
+def _smoother_combine(later, earlier):
+    Ej, gj, Lj = later
+    Ei, gi, Li = earlier
+    return (matmul(Ei, Ej),
+            matmul(Ei, gj) + gi,
+            matmul(Ei, matmul(Lj, _transpose(Ei))) + Li)
+
+
+# Inclusive prefix scan of the associative operation combine over stacked elements.
+# Neighbouring pairs are combined, the half sized sequence is scanned recursively, and the remaining prefixes are
+# filled in with one more combination, so every level is one batched operation.
+def _associative_scan(combine, elements):
+    T = len(elements[0])
+    if T < 2:
+        return elements
+
+    pairs = T // 2
+    reduced = _associative_scan(combine, combine(tuple(e[0:2 * pairs:2] for e in elements),
+                                                 tuple(e[1:2 * pairs:2] for e in elements)))
+    rest = combine(tuple(r[:(T - 1) // 2] for r in reduced), tuple(e[2::2] for e in elements))
+
+    result = tuple(empty_like(e) for e in elements)
+    for res, e, red, r in zip(result, elements, reduced, rest):
+        res[0] = e[0]
+        res[1::2] = red
+        res[2::2] = r
+    return result
+
+
+def _transpose(matrices):
+    return swapaxes(matrices, -1, -2)
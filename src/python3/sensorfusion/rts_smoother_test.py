@@ -0,0 +1,86 @@
+import unittest
+from numpy import array, diag, tile, allclose, zeros
+from numpy.linalg import inv
+from numpy.random import RandomState
+from sensorfusion.kalman import PreallocatedKalmanFilter
+from sensorfusion.kalman_test import F, B, fill_F, fill_B, x0, P0, H
+from sensorfusion.rts_smoother import RauchTungStriebelSmoother
+
+SENSOR_ERROR_MAX = 10000000
+Q = diag([0.3, 0.5, 0.01, 0])
+
+
+def recorded_run(T, seed=3):
+    random = RandomState(seed)
+    dt = 0.005 + 0.01 * random.rand(T)
+    U = random.randn(T, 1)
+    Y = array([120, 1, 130]) + random.randn(T, 3)
+    R = tile([40, 0.01, 7.0], (T, 1))
+    R[random.rand(T, 3) < 0.3] = SENSOR_ERROR_MAX
+    return dt, U, Y, R
+
+
+# the sequential filter and RTS recursion that the smoother has to reproduce
+def reference_smoother(dt, U, Y, R):
+    T = len(dt)
+    kf = PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+    xf = zeros((T, 4))
+    Pf = zeros((T, 4, 4))
+    for t in range(T):
+        kf.predictWithInput(U[t], dt[t])
+        kf.updateWithIndependentMeasurements(Y[t].reshape(3, 1), diag(R[t]), SENSOR_ERROR_MAX)
+        xf[t] = kf.x.ravel()
+        Pf[t] = kf.P
+
+    xs = xf.copy()
+    Ps = Pf.copy()
+    for t in reversed(range(T - 1)):
+        A = F(dt[t + 1])
+        P_predicted = A.dot(Pf[t]).dot(A.T) + Q * dt[t + 1]
+        gain = Pf[t].dot(A.T).dot(inv(P_predicted))
+        xs[t] = xf[t] + gain.dot(xs[t + 1] - A.dot(xf[t]) - B(dt[t + 1]).dot(U[t + 1]))
+        Ps[t] = Pf[t] + gain.dot(Ps[t + 1] - P_predicted).dot(gain.T)
+
+    return xf, Pf, xs, Ps
+
+
+class TestRauchTungStriebelSmoother(unittest.TestCase):
+
+    def setUp(self):
+        self.run = recorded_run(300)
+        self.xf, self.Pf, self.xs, self.Ps = reference_smoother(*self.run)
+
+    def test_filter_matches_sequential_filter(self):
+        smoother = RauchTungStriebelSmoother(A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        xf, Pf = smoother.filter(x0, P0, *self.run, max_variance=SENSOR_ERROR_MAX)
+
+        self.assertTrue(allclose(xf, self.xf))
+        self.assertTrue(allclose(Pf, self.Pf))
+
+    def test_smooth_matches_sequential_rts(self):
+        smoother = RauchTungStriebelSmoother(A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        xs, Ps = smoother.smooth(x0, P0, *self.run, max_variance=SENSOR_ERROR_MAX)
+
+        self.assertTrue(allclose(xs, self.xs))
+        self.assertTrue(allclose(Ps, self.Ps))
+
+    def test_chunks_give_the_same_result(self):
+        for chunk_size in [1, 7, 64]:
+            smoother = RauchTungStriebelSmoother(A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B,
+                                                 chunk_size=chunk_size)
+            xs, Ps = smoother.smooth(x0, P0, *self.run, max_variance=SENSOR_ERROR_MAX)
+
+            self.assertTrue(allclose(xs, self.xs), chunk_size)
+            self.assertTrue(allclose(Ps, self.Ps), chunk_size)
+
+    def test_smoothed_covariance_is_not_larger(self):
+        smoother = RauchTungStriebelSmoother(A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+        xf, Pf = smoother.filter(x0, P0, *self.run, max_variance=SENSOR_ERROR_MAX)
+        xs, Ps = smoother.smooth_filtered(xf, Pf, self.run[0], self.run[1])
+
+        self.assertTrue((Ps[:, 0, 0] <= Pf[:, 0, 0] + 1e-12).all())
+        self.assertTrue(allclose(Ps[-1], Pf[-1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
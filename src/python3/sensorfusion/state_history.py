@@ -0,0 +1,202 @@
+from numpy import zeros, tile, matmul, where, inf, arange, searchsorted, cumsum, copyto, dot, outer, concatenate
+from numpy.linalg import inv
+import logging
+
+logger = logging.getLogger("StateHistory")
+
+
+class StateHistory:
+    """ Fixed-size ring buffer of the recent steps of a PreallocatedKalmanFilter, so that measurements which arrive
+    late (like the GPS altitude from the GpsPollingThread) can be fused at the time they were taken.
+
+    Every prediction starts a new entry with its time, dt and the predicted state and covariance, followed by the
+    measurements that were fused after it and finally the posterior state and covariance.
+    A delayed measurement is added to the last entry at or before its timestamp. Instead of running the filter again
+    over all later entries, the stored entries are conditioned on the new measurement with the cross covariances
+    between the states at the later entries and the state at the measurement time. For a linear Gaussian filter this
+    gives the same result as the re-propagation, but needs only a few array operations over the whole buffer.
+    All entries, including the current filter state, are corrected, so later delayed measurements see the earlier
+    ones.
+    """
+
+    # kf: the PreallocatedKalmanFilter that is stepped through this history
+    # size: number of predictions that are kept
+    # max_variance: measurements with at least this variance are ignored
+    def __init__(self, kf, size=64, max_variance=inf):
+        self.kf = kf
+        self.size = size
+        self.max_variance = max_variance
+
+        n = kf.x.shape[0]
+        k = kf.H.shape[0]
+
+        # ring buffer, entry number i is stored at i % size
+        self.time = zeros(size)
+        self.dt = zeros(size)
+        self.x_predicted = zeros((size, n))
+        self.P_predicted = zeros((size, n, n))
+        self.x = zeros((size, n))
+        self.P = zeros((size, n, n))
+        self.y = zeros((size, k))
+        self.r = zeros((size, k))
+
+        # number of entries recorded so far, the current one is count - 1
+        self.count = 0
+
+        # statistics
+        self.delayed_applied = 0
+        self.too_old = 0
+        self.slot_taken = 0
+
+        # work buffer for the stacked state transition matrices
+        self._F = tile(kf.A, (size, 1, 1))
+
+    # Kalman Step 1 of the filter, recorded as a new entry.
+    # timestamp: time that the filter state refers to after the prediction
+    # U: control input vector
+    def predictWithInput(self, timestamp, U, dt):
+        if self.count > 0:
+            self._store_posterior(self.count - 1)
+
+        (x, P) = self.kf.predictWithInput(U, dt)
+
+        slot = self.count % self.size
+        self.time[slot] = timestamp
+        self.dt[slot] = dt
+        self.x_predicted[slot] = x[:, 0]
+        copyto(self.P_predicted[slot], P)
+        self.y[slot] = 0
+        self.r[slot] = self.max_variance
+        self.count += 1
+
+        return x, P
+
+    # Kalman Step 2 of the filter with the measurement of row i of H, recorded in the current entry.
+    # y: measured value
+    # r: variance of the measurement
+    def updateWithScalarMeasurement(self, i, y, r):
+        if r >= self.max_variance:
+            return self.kf.x, self.kf.P
+
+        slot = (self.count - 1) % self.size
+        if self.r[slot, i] < self.max_variance:
+            # every entry holds one measurement per sensor, a second one gets its own entry with dt = 0
+            self.predictWithInput(self.time[slot], zeros(self.kf.B.shape[1]), 0)
+            slot = (self.count - 1) % self.size
+
+        self.y[slot, i] = y
+        self.r[slot, i] = r
+        return self.kf.updateWithScalarMeasurement(i, y, r)
+
+    # Same as PreallocatedKalmanFilter.updateWithIndependentMeasurements, recorded in the current entry.
+    # Y: measurement vector
+    # R: measurement noise covariance matrix, must be diagonal
+    def updateWithIndependentMeasurements(self, Y, R):
+        for i in range(self.kf.H.shape[0]):
+            self.updateWithScalarMeasurement(i, Y[i, 0], R[i, i])
+
+        return self.kf.x, self.kf.P
+
+    # Fuses a measurement of row i of H that was taken at the given timestamp, which is usually in the past.
+    # Returns False if the measurement is older than the buffer or its entry already has a measurement of this row.
+    def updateWithDelayedMeasurement(self, timestamp, i, y, r):
+        if r >= self.max_variance or self.count == 0:
+            return False
+
+        # entry numbers from the oldest one that is still in the buffer to the current one
+        first = max(0, self.count - self.size)
+        numbers = arange(first, self.count)
+        slots = numbers % self.size
+
+        position = searchsorted(self.time[slots], timestamp, side='right') - 1
+        if position < 0:
+            self.too_old += 1
+            logger.debug("delayed measurement at %f is older than the history", timestamp)
+            return False
+
+        slot_k = slots[position]
+        if self.r[slot_k, i] < self.max_variance:
+            self.slot_taken += 1
+            return False
+
+        self._store_posterior(self.count - 1)
+        self._condition(slots[position + 1:], slot_k, self.kf.H[i], y, r)
+
+        self.y[slot_k, i] = y
+        self.r[slot_k, i] = r
+        copyto(self.kf.x[:, 0], self.x[slots[-1]])
+        copyto(self.kf.P, self.P[slots[-1]])
+
+        self.delayed_applied += 1
+        return True
+
+    # Conditions entry k and all later entries on the measurement y = h x_k + v with variance r.
+    # Only the projections of the cross covariances on h are needed, so the correction is carried by vectors.
+    # later: ring buffer slots of the entries after k, oldest first
+    def _condition(self, later, k, h, y, r):
+        x_k = self.x[k]
+        P_k = self.P[k]
+        P_k_h = dot(P_k, h)
+        m = len(later)
+
+        if m > 0:
+            F = self._F[:m]
+            self.kf.fill_A(F, self.dt[later])
+
+            # the measurement updates of the later entries as vector updates with only the active rows of H
+            active = self.r[later] < self.max_variance
+            H = self.kf.H * active[:, :, None]
+            PHt = matmul(self.P_predicted[later], self.kf.H.T * active[:, None, :])
+            S = matmul(H, PHt)
+            S[:, range(H.shape[1]), range(H.shape[1])] += where(active, self.r[later], 1)
+            S_inv = inv(S)
+            transition = F - matmul(matmul(PHt, S_inv), matmul(H, F))
+            innovation = where(active, self.y[later] - dot(self.x_predicted[later], self.kf.H.T), 0)
+
+            # cross covariances of the predicted and updated states with x_k, times h
+            c_posterior = matmul(_prefix_products(transition), P_k_h)
+            c_predicted = matmul(F, concatenate((P_k_h[None], c_posterior[:-1]))[:, :, None])
+
+            # h x_k and h P_k h^T given the measurements up to each later entry
+            g = matmul(H, c_predicted)
+            w = matmul(S_inv, g)[:, :, 0]
+            g = g[:, :, 0]
+            hx_k = dot(x_k, h) + cumsum((w * innovation).sum(axis=1))
+            hPh_k = dot(h, P_k_h) - cumsum((w * g).sum(axis=1))
+            hx_k_before = concatenate(([dot(x_k, h)], hx_k[:-1]))
+            hPh_k_before = concatenate(([dot(h, P_k_h)], hPh_k[:-1]))
+
+            self.x_predicted[later], self.P_predicted[later] = _condition_on(
+                self.x_predicted[later], self.P_predicted[later], c_predicted[:, :, 0], hx_k_before, hPh_k_before,
+                y, r)
+            self.x[later], self.P[later] = _condition_on(self.x[later], self.P[later], c_posterior, hx_k, hPh_k, y, r)
+
+        # the entry of the measurement itself
+        S = dot(h, P_k_h) + r
+        self.x[k] = x_k + P_k_h * ((y - dot(h, x_k)) / S)
+        self.P[k] = P_k - outer(P_k_h, P_k_h) / S
+
+    def _store_posterior(self, number):
+        slot = number % self.size
+        self.x[slot] = self.kf.x[:, 0]
+        copyto(self.P[slot], self.kf.P)
+
+
+# Conditions the stacked states x (m, n) with covariances P (m, n, n) on the measurement y = h x_k + v.
+# c: covariances of x with x_k, times h
+# hx_k, hPh_k: h x_k and h P_k h^T, estimated with the same information as x
+def _condition_on(x, P, c, hx_k, hPh_k, y, r):
+    S = hPh_k + r
+    x = x + c * ((y - hx_k) / S)[:, None]
+    P = P - c[:, :, None] * (c / S[:, None])[:, None, :]
+    return x, P
+
+
+# Inclusive prefix products M[j] = A[j] A[j-1] ... A[0] of stacked matrices in log2(len(A)) batched steps.
+def _prefix_products(A):
+    M = A.copy()
+    shift = 1
+    while shift < len(M):
+        M[shift:] = matmul(M[shift:], M[:-shift])
+        shift *= 2
+    return M
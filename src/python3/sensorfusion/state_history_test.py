@@ -0,0 +1,112 @@
+import unittest
+from numpy import array, diag, allclose
+from numpy.random import RandomState
+from sensorfusion.kalman import PreallocatedKalmanFilter
+from sensorfusion.kalman_test import F, B, fill_F, fill_B, x0, P0, H
+from sensorfusion.state_history import StateHistory
+
+SENSOR_ERROR_MAX = 10000000
+Q = diag([0.3, 0.5, 0.01, 0])
+
+
+def new_filter():
+    return PreallocatedKalmanFilter(x=x0, P=P0, A=F, Q=Q, B=B, H=H, fill_A=fill_F, fill_B=fill_B)
+
+
+# random steps with barometer and ultrasonic measurements, the GPS row is left for the delayed measurements
+def recorded_steps(count, seed=5):
+    random = RandomState(seed)
+    steps = []
+    time = 0
+    for step in range(count):
+        dt = 0.005 + 0.01 * random.rand()
+        time += dt
+        u = array([random.randn()])
+        Y = array([[120 + random.randn()], [1 + 0.1 * random.randn()], [0]])
+        R = diag([40, 0.01 if step % 7 else SENSOR_ERROR_MAX, SENSOR_ERROR_MAX])
+        steps.append((time, dt, u, Y, R))
+    return steps
+
+
+# runs the filter from the start with the delayed measurements fused right after the step they belong to
+def rerun(steps, delayed):
+    kf = new_filter()
+    for (number, (time, dt, u, Y, R)) in enumerate(steps):
+        kf.predictWithInput(u, dt)
+        kf.updateWithIndependentMeasurements(Y, R, SENSOR_ERROR_MAX)
+        for (step, i, y, r) in delayed:
+            if step == number:
+                kf.updateWithScalarMeasurement(i, y, r)
+    return kf.x, kf.P
+
+
+class TestStateHistory(unittest.TestCase):
+
+    def test_without_delayed_measurements_same_as_filter(self):
+        steps = recorded_steps(100)
+        history = StateHistory(new_filter(), size=64, max_variance=SENSOR_ERROR_MAX)
+        for (time, dt, u, Y, R) in steps:
+            history.predictWithInput(time, u, dt)
+            (x, P) = history.updateWithIndependentMeasurements(Y, R)
+
+        (x_reference, P_reference) = rerun(steps, [])
+        self.assertTrue(allclose(x, x_reference, rtol=1e-12))
+        self.assertTrue(allclose(P, P_reference, rtol=1e-12))
+
+    def test_delayed_measurements_same_as_rerun(self):
+        steps = recorded_steps(200)
+        history = StateHistory(new_filter(), size=64, max_variance=SENSOR_ERROR_MAX)
+        delayed = []
+        for (number, (time, dt, u, Y, R)) in enumerate(steps):
+            history.predictWithInput(time, u, dt)
+            history.updateWithIndependentMeasurements(Y, R)
+
+            # a GPS altitude every 10 steps that was taken 30 steps ago
+            if number % 10 == 0 and number >= 30:
+                step = number - 30
+                measurement = (step, 2, 130 + step * 0.01, 7)
+                self.assertTrue(history.updateWithDelayedMeasurement(steps[step][0] + 0.001, *measurement[1:]))
+                delayed.append(measurement)
+
+        (x_reference, P_reference) = rerun(steps, delayed)
+        self.assertEqual(history.delayed_applied, len(delayed))
+        self.assertTrue(allclose(history.kf.x, x_reference, rtol=1e-9))
+        self.assertTrue(allclose(history.kf.P, P_reference, rtol=1e-9, atol=1e-12))
+
+    def test_delayed_measurements_out_of_order(self):
+        steps = recorded_steps(60)
+        history = StateHistory(new_filter(), size=64, max_variance=SENSOR_ERROR_MAX)
+        for (time, dt, u, Y, R) in steps:
+            history.predictWithInput(time, u, dt)
+            history.updateWithIndependentMeasurements(Y, R)
+
+        delayed = [(40, 2, 131.0, 7), (10, 2, 129.0, 7), (59, 2, 130.0, 7), (28, 1, 1.2, 0.01)]
+        for (step, i, y, r) in delayed:
+            self.assertTrue(history.updateWithDelayedMeasurement(steps[step][0], i, y, r))
+
+        (x_reference, P_reference) = rerun(steps, delayed)
+        self.assertTrue(allclose(history.kf.x, x_reference, rtol=1e-9))
+        self.assertTrue(allclose(history.kf.P, P_reference, rtol=1e-9, atol=1e-12))
+
+    def test_rejects_measurements_it_cannot_place(self):
+        steps = recorded_steps(100)
+        history = StateHistory(new_filter(), size=32, max_variance=SENSOR_ERROR_MAX)
+        for (time, dt, u, Y, R) in steps:
+            history.predictWithInput(time, u, dt)
+            history.updateWithIndependentMeasurements(Y, R)
+        x = history.kf.x.copy()
+
+        # older than the buffer
+        self.assertFalse(history.updateWithDelayedMeasurement(steps[10][0], 2, 130, 7))
+        # the barometer row of this step is already used
+        self.assertFalse(history.updateWithDelayedMeasurement(steps[90][0], 0, 120, 40))
+        # no information
+        self.assertFalse(history.updateWithDelayedMeasurement(steps[90][0], 2, 130, SENSOR_ERROR_MAX))
+
+        self.assertEqual(history.too_old, 1)
+        self.assertEqual(history.slot_taken, 1)
+        self.assertTrue((history.kf.x == x).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
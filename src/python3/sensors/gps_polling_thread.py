@@ -20,6 +20,10 @@ class GpsPollingThread(threading.Thread):
         else:
             self.gps = gps.GPSData()
 
+        # The latest GPSState with its sequence number. The GPSState is only built when gpsd reports a new fix and
+        # is never modified afterwards. The tuple is replaced as a whole, so readers always get a matching pair.
+        self._snapshot = (0, GPSState(self.gps))
+
         self.running = False
 
     # Starts the GPS polling thread
@@ -29,13 +33,27 @@ class GpsPollingThread(threading.Thread):
 
         while self.running:
             # grap each package to clear the buffer
-            self.gps.next()
+            report = self.gps.next()
+
+            # only TPV reports carry a new fix
+            if report.get('class') == 'TPV':
+                self._publish()
 
     def stop(self):
         self.running = False
 
+    # The GPSState of the latest fix. It is the same object until the next fix arrives.
     def read(self):
-        return GPSState(self.gps)
+        return self._snapshot[1]
+
+    # (sequence number, GPSState) of the latest fix. The sequence number increases with every fix, so readers can
+    # compare it with the last one they have seen to find out if there is anything new.
+    def read_versioned(self):
+        return self._snapshot
+
+    def _publish(self):
+        (sequence, _) = self._snapshot
+        self._snapshot = (sequence + 1, GPSState(self.gps))
 
     def update(self):
         try:
@@ -0,0 +1,39 @@
+from sensors.gps_polling_thread import GpsPollingThread
+
+import unittest
+
+
+# Replaces the gpsd stream: returns the given reports and stops the thread after the last one
+class ReportStream:
+    def __init__(self, thread, reports):
+        self.thread = thread
+        self.reports = list(reports)
+        self.fix = thread.gps.fix
+        self.utc = thread.gps.utc
+        self.satellites = thread.gps.satellites
+
+    def next(self):
+        report = self.reports.pop(0)
+        if not self.reports:
+            self.thread.stop()
+        return report
+
+
+class TestGpsPollingThread(unittest.TestCase):
+
+    def test_publishes_only_on_fix(self):
+        thread = GpsPollingThread(enabled=False)
+        (sequence, state) = thread.read_versioned()
+        self.assertIs(thread.read(), state)
+
+        thread.gps = ReportStream(thread, [{'class': 'SKY'}, {'class': 'TPV'}, {'class': 'SKY'}, {'class': 'TPV'}])
+        thread.run()
+
+        (new_sequence, new_state) = thread.read_versioned()
+        self.assertEqual(new_sequence, sequence + 2)
+        self.assertIsNot(new_state, state)
+        self.assertIs(thread.read(), new_state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@
 import time
 import RPi.GPIO as GPIO
 from state_change_planning import State
+from util.clock import default_clock
 import logging
 
 # When calculating the new distance, we use a weighted average between the last value and the new measurement (low pass filtering).
@@ -13,13 +14,15 @@ VALUE_FILTER_STRENGTH = 0.6
 # See http://www.modmypi.com/blog/hc-sr04-ultrasonic-range-sensor-on-the-raspberry-pi
 class UltrasonicRangeFinder:
 
-    def __init__(self, gpio_trigger, gpio_echo):
+    # clock: see util.clock, the default clock if None
+    def __init__(self, gpio_trigger, gpio_echo, clock=None):
 
         # define GPIO pins
         self.gpio_trigger = gpio_trigger
         self.gpio_echo = gpio_echo
         self.distance = None
         self.speed = None
+        self.clock = clock if clock is not None else default_clock()
         self.log = logging.getLogger("UltrasonicRangeFinder")
 
         # use GPIO pin numbering convention
@@ -37,29 +40,29 @@ class UltrasonicRangeFinder:
         # set trigger to high
         GPIO.output(self.gpio_trigger, True)
 
-        # set trigger after 10µs to low
+        # set trigger after 10µs to low (this is a real pulse, so it does not use the clock)
         time.sleep(0.00001)
         GPIO.output(self.gpio_trigger, False)
 
         # store initial start time
-        time_start = time.time()
+        time_start = self.clock()
 
         # store start time
         #if GPIO.input(self.gpio_echo) == 0:
         #print("Waiting for rising Echo edge")
         #    GPIO.wait_for_edge(self.gpio_echo, GPIO.RISING)
         while GPIO.input(self.gpio_echo) == 0:
-            time_start = time.time()
+            time_start = self.clock()
 
         # store stop time
         # this time span is proportionate to the distance of an obstacle
         # if there is no echo (= no obstacle), we this will take 38 ms here.
-        time_stop = time.time()
+        time_stop = self.clock()
         #if GPIO.input(self.gpio_echo) == 1:
         #print("Waiting for falling Echo edge")
         # GPIO.wait_for_edge(self.gpio_echo, GPIO.FALLING)
         while GPIO.input(self.gpio_echo) == 1:
-            time_stop = time.time()
+            time_stop = self.clock()
 
         # calculate distance
         time_elapsed = time_stop - time_start
@@ -74,11 +77,11 @@ class UltrasonicRangeFinder:
 
         self.log.debug("starting ultrasonic measurement")
         try:
-            time_last_update = time.time()
+            time_last_update = self.clock()
             while not stop_flag.value:
 
                 distance_now = self._measure_distance()
-                time_now = time.time()
+                time_now = self.clock()
                 duration_measurement = time_now-time_last_update
                 time_last_update = time_now
 
@@ -97,7 +100,7 @@ class UltrasonicRangeFinder:
 
                 queue.put(State.by_value_and_speed(self.distance, self.speed))
 
-                time.sleep(time_between_measurements)
+                self.clock.sleep(time_between_measurements)
         finally:
             # after we stop measuring, we should clean up
             # TODO: is this really right? Maybe someone else is still active on GPIO?
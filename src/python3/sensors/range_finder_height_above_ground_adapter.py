@@ -1,7 +1,6 @@
 from util.definitions import *
+from util.quaternion import angle_to_axis
 import math
-import numpy
-from pyquaternion import Quaternion
 
 
 class RangeFinderHeightAboveGroundAdapter:
@@ -16,11 +15,8 @@ class RangeFinderHeightAboveGroundAdapter:
     def __init__(self, range_finder):
         self.range_finder = range_finder
 
+    # attitude: orientation quaternion [w, x, y, z]
     def update(self, attitude):
-        # print(type(attitude).__name__)
-        # print(attitude)
-        assert(isinstance(attitude, Quaternion))
-
         # update range finder
         distance, error_plain = self.range_finder.update()
 
@@ -60,16 +56,9 @@ def calc_error_multiplier(attitude):
 def _calc_angle_to_up_axis(orientation_quaternion):
     # The quaternions in RTIMULib are thought to start at (FORWARD_AXIS)
     # turn Z by orientation quaternion
-    # forward_direction = orientation_quaternion.rotate(FORWARD_AXIS)
-    # right_direction = orientation_quaternion.rotate(RIGHT_AXIS)
-    up_direction = orientation_quaternion.rotate(UP_AXIS)
-
-    # print("forward_direction = {}".format(forward_direction))
-    # print("right_direction = {}".format(right_direction))
-    # print("up_direction = {}".format(up_direction))
 
     # this is the angle between the ultrasonic beam and the real direction to ground
     # Now we have a right triangle, distance = length of hypothenuse
     # angle = arccos(dot(ultrasonic_beam, UP))
     # cos(angle) = height / distance
-    return math.acos(numpy.dot(up_direction, UP_AXIS))
+    return angle_to_axis(orientation_quaternion, UP_AXIS, UP_AXIS)
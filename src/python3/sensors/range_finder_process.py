@@ -1,12 +1,11 @@
 from multiprocessing import Process, Queue, Value
 from sensors.range_finder import UltrasonicRangeFinder
 from util.definitions import SENSOR_ERROR_MAX, ULTRASONIC_SENSOR_ERROR
-from quaternion import Quaternion
 from state_change_planning import State
 from util.definitions import FORWARD_AXIS, UP_AXIS
+from util.quaternion import angle_to_axis
 
 import math
-import numpy
 
 time_between_measurements = 0.001
 
@@ -54,8 +53,6 @@ class UltrasonicRangeFinderProcess:
 
 
 def _estimated_error_above_ground(orientation_quaternion):
-    assert(isinstance(orientation_quaternion, Quaternion))
-
     angle_to_up = _calc_angle_to_up_axis(orientation_quaternion)
 
     # from 0 degree to 45 degrees we interpolate
@@ -69,9 +66,8 @@ def _estimated_error_above_ground(orientation_quaternion):
 def _calc_angle_to_up_axis(orientation_quaternion):
     # The quaternions in RTIMULib are thought to start at (0,0,1)
     # turn Z by orientation quaternion
-    direction = orientation_quaternion.rotate(FORWARD_AXIS)
     # this is the angle between the ultrasonic beam and the real direction to ground
     # Now we have a right triangle, distance = length of hypothenuse
     # angle = arccos(dot(ultrasonic_beam, UP))
     # cos(angle) = height / distance
-    return math.acos(numpy.dot(direction, UP_AXIS))
+    return angle_to_axis(orientation_quaternion, FORWARD_AXIS, UP_AXIS)
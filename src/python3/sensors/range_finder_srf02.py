@@ -1,6 +1,6 @@
 from smbus import SMBus
-from datetime import datetime, timedelta
 from util.definitions import *
+from util.clock import default_clock
 import logging
 
 log = logging.getLogger("SRF02")
@@ -16,13 +16,15 @@ log = logging.getLogger("SRF02")
 #
 # See the datasheet: http://www.robot-electronics.co.uk/htm/srf02techI2C.htm
 class SRF02:
-    def __init__(self):
+    # clock: see util.clock, the default clock if None
+    def __init__(self, clock=None):
 
         self._i2c = SMBus(1)
         self._i2c_address = SRF02_I2C_ADDRESS
         self._waiting_for_echo = False
 
-        yesterday = datetime.now() - timedelta(1)
+        self.clock = clock if clock is not None else default_clock()
+        yesterday = self.clock() - 24 * 3600
         self._time_last_burst = yesterday
 
         # The last distance measurement
@@ -48,8 +50,7 @@ class SRF02:
 
         distance = None
 
-        now = datetime.now()
-        time_since_last_burst = (now - self._time_last_burst).total_seconds()
+        time_since_last_burst = self.clock() - self._time_last_burst
 
         #        log.debug("time since last burst: {}".format(time_since_last_burst))
 
@@ -76,7 +77,7 @@ class SRF02:
     def _send_burst(self):
         self._i2c.write_byte_data(self._i2c_address, 0, 0x51)
         self._waiting_for_echo = True
-        self._time_last_burst = datetime.now()
+        self._time_last_burst = self.clock()
         self.num_bursts_sent += 1
         log.debug("Burst sent.")
 
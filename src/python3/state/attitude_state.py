@@ -1,11 +1,14 @@
 from state_change_planning_3d import State3d
+from state_change_planning import State
 
-from pyquaternion import Quaternion
+from numpy import array
 
 
 # Represents the orientation of the vehicle at one point in time.
 # Some additional information like the acceleration is also present because the sensors also give this information.
+# It is created for every IMU reading, so the attributes are fixed with __slots__ to keep it small.
 class AttitudeState:
+    __slots__ = ("raw", "rotation", "orientation", "acceleration", "batch")
 
     # construct an AttitudeState from an RTIMULib data reading
     def __init__(self, imu_data):
@@ -14,15 +17,18 @@ class AttitudeState:
         self.raw = imu_data
 
         # here we have roll, pitch, yaw and the according speeds of change
-        self.rotation = State3d()
-        (self.rotation.x.value, self.rotation.y.value, self.rotation.z.value) = imu_data["fusionPose"]
-        (self.rotation.x.speed, self.rotation.y.speed, self.rotation.z.speed) = imu_data["gyro"]
+        (roll, pitch, yaw) = imu_data["fusionPose"]
+        (roll_speed, pitch_speed, yaw_speed) = imu_data["gyro"]
+        self.rotation = State3d(State(roll, roll_speed), State(pitch, pitch_speed), State(yaw, yaw_speed))
 
         # Orientation quaternion
-        # order is [w, x, y, z]
-        self.orientation = Quaternion(array=imu_data["fusionQPose"])
+        # order is [w, x, y, z], see util.quaternion for the operations on it
+        self.orientation = array(imu_data["fusionQPose"])
 
         # TODO: where is the magnetometer?
 
         # acceleration in body frame
-        self.acceleration = self.raw["accel"]
\ No newline at end of file
+        self.acceleration = self.raw["accel"]
+
+        # statistics of the IMU samples that were averaged into this state, None for a single sample
+        self.batch = None
\ No newline at end of file
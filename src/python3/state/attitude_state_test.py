@@ -39,7 +39,7 @@ class TestAttitudeState(unittest.TestCase):
         self.assertEqual(state.rotation.y.speed, imu_reading["gyro"][1])
         self.assertEqual(state.rotation.z.speed, imu_reading["gyro"][2])
 
-        self.assertEqual(state.orientation, imu_reading["fusionQPose"])
+        self.assertEqual(tuple(state.orientation), imu_reading["fusionQPose"])
 
         self.assertEqual(state.acceleration, imu_reading["accel"])
 
@@ -1,10 +1,15 @@
 from util.definitions import SENSOR_ERROR_MAX
-from math import isnan, isfinite
+from math import isnan, isfinite, nan
+from datetime import datetime, timezone
 
 
 # Represents one reading from a GPS device
 # See GPSd description: http://www.catb.org/gpsd/gpsd_json.html
 class GPSState:
+    __slots__ = ("rawfix", "utc", "time", "timestamp", "num_satellites", "latitude", "longitude", "longitude_error",
+                 "latitude_error", "altitude", "altitude_error", "speed", "speed_error", "climb", "climb_error",
+                 "track", "track_error", "rawmode", "has_no_fix", "has_2d_fix", "has_3d_fix")
+
     def __init__(self, data):
 
         # for debugging purposes
@@ -13,6 +18,9 @@ class GPSState:
         self.utc = data.utc
         self.time = data.fix.time
 
+        # time of the fix in seconds since the epoch, NaN if unknown
+        self.timestamp = read_timestamp(self.time)
+
         self.num_satellites = len(data.satellites)
 
         self.latitude = data.fix.latitude
@@ -76,3 +84,16 @@ def read_error(data, attribute_name):
             return attr
 
     return SENSOR_ERROR_MAX
+
+
+# gpsd reports the fix time either as seconds since the epoch or as ISO 8601 string like "2016-01-05T10:34:48.283Z".
+def read_timestamp(time):
+    if isinstance(time, str):
+        try:
+            return datetime.strptime(time, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return nan
+    try:
+        return float(time)
+    except (TypeError, ValueError):
+        return nan
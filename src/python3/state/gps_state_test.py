@@ -1,7 +1,8 @@
 import unittest
 from state.attitude_state import AttitudeState
 import gpspy3.gps as gps
-from state.gps_state import GPSState
+from state.gps_state import GPSState, read_timestamp
+from math import isnan
 
 gps_reading = gps.GPSData()
 gps_reading.fix.altitude = 1.0
@@ -39,11 +40,18 @@ class TestGpsState(unittest.TestCase):
         self.assertEqual(gps_state.latitude_error, gps_reading.fix.epy)
         self.assertEqual(gps_state.altitude_error, gps_reading.fix.epv)
         self.assertEqual(gps_state.climb_error, gps_reading.fix.epc)
+        self.assertEqual(gps_state.timestamp, 123.0)
 
 
 
         # TODO: tests for readError, also if we have no fix!
 
+    def test_read_timestamp(self):
+        self.assertEqual(read_timestamp("1970-01-01T00:01:03.500Z"), 63.5)
+        self.assertEqual(read_timestamp(63.5), 63.5)
+        self.assertTrue(isnan(read_timestamp("")))
+        self.assertTrue(isnan(read_timestamp(None)))
+
 
 if __name__ == '__main__':
     unittest.main()
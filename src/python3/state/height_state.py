@@ -1,19 +1,14 @@
 from numpy import array, ndarray
 import json
-from math import isnan
 
 
 # This is the state of the Altitude Sensor Fusion (based on a Kalman Filter)
 # See https://timdelbruegger.wordpress.com/2016/01/05/altitude-sensor-fusion/
+# The values are not checked for NaN here, the HeightProvider checks the whole state vector once per step.
 class HeightState:
+    __slots__ = ("height_above_ground", "vertical_speed", "ground_height_barometer", "ground_height_gps")
 
     def __init__(self, height_above_ground, vertical_speed, ground_height_barometer, ground_height_gps):
-
-        assert(not isnan(height_above_ground))
-        assert(not isnan(vertical_speed))
-        assert(not isnan(ground_height_barometer))
-        assert(not isnan(ground_height_gps))
-
         self.height_above_ground = height_above_ground
         self.vertical_speed = vertical_speed
         self.ground_height_barometer = ground_height_barometer
@@ -31,5 +26,7 @@ class HeightState:
 
         if isinstance(vec, ndarray):
             assert vec.shape == (4,) or vec.shape == (4, 1)
+            # copy the scalars: the Kalman filter keeps updating its state vector in place
+            vec = vec.ravel().tolist()
 
         return HeightState(vec[0], vec[1], vec[2], vec[3])
\ No newline at end of file
@@ -65,6 +65,16 @@ class TestHegState(unittest.TestCase):
         self.assertEqual(state.ground_height_barometer, ground_height_barometer)
         self.assertEqual(state.ground_height_gps, ground_height_gps)
 
+    def test_from_vector_copies(self):
+        vector = array([[height_above_ground], [vertical_speed], [ground_height_barometer], [ground_height_gps]],
+                       dtype=float)
+        state = HeightState.fromVector(vector)
+
+        # the filter updates its vector in place
+        vector[0, 0] = 50
+        self.assertEqual(state.height_above_ground, height_above_ground)
+        self.assertEqual(state.as_vector()[0, 0], height_above_ground)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -4,10 +4,11 @@ from util.timer import Timer
 
 class LoggingStateProviderWithListeners:
 
-    def __init__(self, name):
+    # clock: see util.clock, used for the time between updates. The default clock if None.
+    def __init__(self, name, clock=None):
         self.log = logging.getLogger(name)
         self.__listeners = []
-        self.__timer = Timer()
+        self.__timer = Timer(clock)
 
     def registerListener(self, listener):
         self.log.debug("Appending listener: " + listener.name)
@@ -5,6 +5,8 @@ from util.definitions import SENSOR_ERROR_MAX, PRESSURE_SENSOR_HEIGHT_ERROR, STA
 # Represents a reading of a pressure sensor with integrated temperature sensor.
 # The individual values might be None, if the corresponding sensor does not have a valid reading at the moment.
 class PressureTemperatureState:
+    __slots__ = ("pressure", "height_above_sea", "height_above_sea_error", "temperature")
+
     def __init__(self, pressureValid, pressure, temperatureValid, temperature):
 
         self.pressure = None
@@ -2,11 +2,15 @@ from state.pressure_temp_state import PressureTemperatureState
 from state.attitude_state import AttitudeState
 from state.height_state import HeightState
 from state.gps_state import GPSState
+from math import nan
 
 
 # Represents all the knowledge about our quadrocopter that we have at one point in time
 class VehicleState:
-    def __init__(self, attitude, height, gps, pressure_temp):
+    __slots__ = ("attitude", "height", "gps", "air_pressure", "temperature", "ultrasonic_distance", "ultrasonic_error")
+
+    # ultrasonic: (distance, variance) of the SRF02 reading, None if it is not known
+    def __init__(self, attitude, height, gps, pressure_temp, ultrasonic=None):
 
         assert(isinstance(attitude, AttitudeState))
         assert(isinstance(height, HeightState))
@@ -23,6 +27,8 @@ class VehicleState:
         self.air_pressure = pressure_temp.pressure
         self.temperature = pressure_temp.temperature
 
+        (self.ultrasonic_distance, self.ultrasonic_error) = ultrasonic if ultrasonic is not None else (nan, nan)
+
     def fields(self):
         return {
             "height_above_ground": self.height.height_above_ground,
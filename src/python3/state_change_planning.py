@@ -27,17 +27,17 @@ class StateChangeSelectTimeToReachTarget:
         return plan
 
 
+# A new State is created for every axis in every sensor reading, so it has no __dict__.
 class State:
-    def __init__(self):
-        self.value = 0.0 # the current value
-        self.speed = 0.0 # the speed with which the value changes over time
+    __slots__ = ("value", "speed")
+
+    def __init__(self, value=0.0, speed=0.0):
+        self.value = value # the current value
+        self.speed = speed # the speed with which the value changes over time
 
     @staticmethod
     def by_value_and_speed(value, speed):
-        state = State()
-        state.value = value
-        state.speed = speed
-        return state
+        return State(value, speed)
 
     def plan_change_to(self, target):
         return StateChangeSelectTimeToReachTarget(self, target)
@@ -68,3 +68,64 @@ class StateChangePlan:
     def calculate_target_speed_for_time_period(self, tbegin, tend):
 
         return (self.valueAt(tend) - self.valueAt(tbegin)) / self._timeunit
+
+
+# The plans of several axes at once, for example the x, y, z rotations and the elevation of the quadrocopter.
+# Every axis gets the same polynomial as in StateChangePlan, but the coefficients of all axes are calculated with one
+# multiplication with HERMITE_BASIS and kept in a preallocated array. No Polynomial objects are created, so replanning
+# and sampling the plans does not allocate arrays.
+class StateChangePlanVector:
+
+    # Coefficients (a, b, c, d) of ax^3+bx^2+cx+d from (current value, current speed, target value, target speed),
+    # the same formulas as in StateChangeSelectTimeToReachTarget
+    HERMITE_BASIS = numpy.array([
+        [ 2,  1, -2,  1],
+        [-3, -2,  3, -1],
+        [ 0,  1,  0,  0],
+        [ 1,  0,  0,  0]], dtype=float)
+
+    # size: number of axes
+    def __init__(self, size):
+        self.size = size
+        # rows: current values, current speeds, target values, target speeds
+        self._boundary = numpy.zeros((4, size))
+        # rows: a, b, c, d
+        self._coefficients = numpy.zeros((4, size))
+        self._timeunit = 1.0
+        self._powers = numpy.zeros(4)
+        self._result = numpy.zeros(size)
+
+    # Plans the change from the current to the target states of all axes, each argument has one value per axis.
+    # timeToReachTargetState = 1.3 would mean the target states are reached after 1.3 seconds.
+    def replan(self, current_values, current_speeds, target_values, target_speeds, time_to_reach_target_state):
+        boundary = self._boundary
+        boundary[0] = current_values
+        boundary[1] = current_speeds
+        boundary[2] = target_values
+        boundary[3] = target_speeds
+        numpy.dot(StateChangePlanVector.HERMITE_BASIS, boundary, out=self._coefficients)
+        self._timeunit = time_to_reach_target_state
+
+    # calculates the values of all axes at some given time in the future
+    # returns an array that is reused by the next call
+    def values_at(self, t):
+        x = t / self._timeunit
+        powers = self._powers
+        powers[0] = x * x * x
+        powers[1] = x * x
+        powers[2] = x
+        powers[3] = 1.0
+        return numpy.dot(powers, self._coefficients, out=self._result)
+
+    # In the time period (t_begin, t_end), we want to achieve these target speeds, see StateChangePlan.
+    # returns an array that is reused by the next call
+    def calculate_target_speeds_for_time_period(self, tbegin, tend):
+        unit = self._timeunit
+        xbegin = tbegin / unit
+        xend = tend / unit
+        powers = self._powers
+        powers[0] = (xend * xend * xend - xbegin * xbegin * xbegin) / unit
+        powers[1] = (xend * xend - xbegin * xbegin) / unit
+        powers[2] = (xend - xbegin) / unit
+        powers[3] = 0.0
+        return numpy.dot(powers, self._coefficients, out=self._result)
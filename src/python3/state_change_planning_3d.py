@@ -12,10 +12,11 @@ class State3dChangeSelectTimeToReachTarget:
         def plan_change_in_seconds (state_target_time):
             state, target, time = state_target_time
             return state.plan_change_to(target).in_seconds(time)
-        plans = map(
+        # a list and not a map, the plans are sampled again and again until the next replanning
+        plans = list(map(
             plan_change_in_seconds,
             zip(self.currentStates, self.targetStates, [time_to_reach_target_state] * len(self.currentStates))
-        )
+        ))
 
         return StateChangePlanMultiDim(plans)
 
@@ -35,11 +36,13 @@ class StateChangePlanMultiDim:
 # A 3-dimensional state includes a value and a speed for every axis (x, y, z).
 # It serves as an entry point for StateChangePlanning in 3d.
 class State3d:
+    __slots__ = ("x", "y", "z")
 
-    def __init__(self):
-        self.x = State.by_value_and_speed(0, 0)
-        self.y = State.by_value_and_speed(0, 0)
-        self.z = State.by_value_and_speed(0, 0)
+    # x, y, z: the State of every axis, all zero if not given
+    def __init__(self, x=None, y=None, z=None):
+        self.x = x if x is not None else State.by_value_and_speed(0, 0)
+        self.y = y if y is not None else State.by_value_and_speed(0, 0)
+        self.z = z if z is not None else State.by_value_and_speed(0, 0)
 
     def plan_change_to(self, target):
         xyz_states = [self.x, self.y, self.z]
@@ -1,6 +1,6 @@
 import unittest
 import numpy
-from state_change_planning import State
+from state_change_planning import State, StateChangePlanVector
 
 
 class TestStateChangePlanning(unittest.TestCase):
@@ -50,5 +50,35 @@ class TestStateChangePlanning(unittest.TestCase):
         self.assertEqual(plan.valueAt(1.5), 0)
         self.assertEqual(plan.calculate_target_speed_for_time_period(0, 1.5), -10 / 1.5)
 
+
+class TestStateChangePlanVector(unittest.TestCase):
+
+    def test_same_as_single_plans(self):
+        random = numpy.random.RandomState(3)
+        plans = StateChangePlanVector(4)
+        for i in range(20):
+            (current_values, current_speeds, target_values, target_speeds) = random.uniform(-2, 2, (4, 4))
+            time = random.uniform(0.1, 2)
+            plans.replan(current_values, current_speeds, target_values, target_speeds, time)
+
+            single_plans = [State(current_values[axis], current_speeds[axis]).plan_change_to(
+                State(target_values[axis], target_speeds[axis])).in_seconds(time) for axis in range(4)]
+
+            (tbegin, tend) = sorted(random.uniform(0, time, 2))
+            numpy.testing.assert_allclose(plans.values_at(tend), [plan.valueAt(tend) for plan in single_plans])
+            numpy.testing.assert_allclose(plans.calculate_target_speeds_for_time_period(tbegin, tend),
+                                          [plan.calculate_target_speed_for_time_period(tbegin, tend)
+                                           for plan in single_plans], atol=1e-12)
+
+    def test_quadratic(self):
+        plans = StateChangePlanVector(2)
+        plans.replan([0, 5], [2, 1], [0, 6], [-2, 1], 0.25)
+
+        self.assertEqual(plans.values_at(0).tolist(), [0, 5])
+        self.assertEqual(plans.values_at(0.25).tolist(), [0, 6])
+        self.assertEqual(plans.calculate_target_speeds_for_time_period(0, 0.125).tolist(), [2, 2])
+        self.assertEqual(plans.calculate_target_speeds_for_time_period(0.125, 0.25).tolist(), [-2, 2])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+import time
+
+
+# All timing in the sensor loop goes through a clock object, so that a simulation or replay can replace the real time.
+# A clock is called without arguments and returns the current time in seconds as float. The time has an arbitrary
+# origin, only differences are meaningful. Use wall_time / from_wall_time to convert to and from seconds since the
+# epoch (for example for GPS fix times).
+
+
+class MonotonicClock:
+    """ The real clock, based on time.perf_counter_ns. It has the highest available resolution and never jumps, even
+    if the system time is corrected by NTP or GPS. The conversions to and from the system time follow such
+    corrections: a Raspberry Pi without a real-time clock may only get the right system time long after the start.
+    """
+
+    def __call__(self):
+        return time.perf_counter_ns() / 1e9
+
+    # current time in integer nanoseconds
+    def now_ns(self):
+        return time.perf_counter_ns()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    # seconds since the epoch of the given time of this clock
+    def wall_time(self, t):
+        return t + self._wall_offset()
+
+    # time of this clock of the given seconds since the epoch
+    def from_wall_time(self, timestamp):
+        return timestamp - self._wall_offset()
+
+    # current offset between the system time and this clock, taken anew for every conversion
+    def _wall_offset(self):
+        return (time.time_ns() - time.perf_counter_ns()) / 1e9
+
+
+class SimulatedClock:
+    """ A clock that only moves when it is told to. Sleeping advances it immediately, so simulations and replays run
+    as fast as the CPU allows. The simulated time is used as seconds since the epoch.
+    """
+
+    # start: initial time in seconds
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def __call__(self):
+        return self.time
+
+    def now_ns(self):
+        return round(self.time * 1e9)
+
+    def set(self, t):
+        self.time = t
+
+    def advance(self, seconds):
+        self.time += seconds
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.time += seconds
+
+    def wall_time(self, t):
+        return t
+
+    def from_wall_time(self, timestamp):
+        return timestamp
+
+
+_default_clock = MonotonicClock()
+
+
+# The clock that is used by all components that do not get their own
+def default_clock():
+    return _default_clock
+
+
+# Replaces the default clock, for example with a SimulatedClock. Only components that are created afterwards use it.
+def set_default_clock(clock):
+    global _default_clock
+    _default_clock = clock
@@ -0,0 +1,56 @@
+import time
+import unittest
+from unittest import mock
+from util.clock import MonotonicClock, SimulatedClock, default_clock, set_default_clock
+from util.timer import Timer
+
+
+class TestClock(unittest.TestCase):
+
+    def test_monotonic_clock(self):
+        clock = MonotonicClock()
+        first = clock()
+        clock.sleep(0.002)
+        self.assertGreater(clock() - first, 0.001)
+        self.assertLessEqual(abs(clock.wall_time(clock()) - time.time()), 0.01)
+        # seconds since the epoch as float have a resolution of about 0.2 microseconds, and every conversion reads
+        # both clocks at slightly different times
+        self.assertAlmostEqual(clock.from_wall_time(clock.wall_time(first)), first, delta=1e-5)
+
+    def test_monotonic_clock_wall_time_step(self):
+        clock = MonotonicClock()
+        fix_time = time.time()
+        first = clock()
+
+        # the system time is set one hour ahead after the start, like by NTP on a Raspberry Pi without RTC
+        system_time_ns = time.time_ns
+        with mock.patch("time.time_ns", lambda: system_time_ns() + 3600 * 10 ** 9):
+            self.assertLessEqual(abs(clock.wall_time(clock()) - (time.time() + 3600)), 0.01)
+            # a GPS fix with the corrected time is mapped to the time of this clock when it was taken
+            self.assertAlmostEqual(clock.from_wall_time(fix_time + 3600), first, delta=0.01)
+
+    def test_simulated_clock(self):
+        clock = SimulatedClock(100.0)
+        timer = Timer(clock)
+        clock.advance(0.5)
+        clock.sleep(0.25)
+        self.assertEqual(clock(), 100.75)
+        self.assertEqual(clock.now_ns(), 100750000000)
+        self.assertEqual(timer.readAndReset(), 0.75)
+        self.assertEqual(timer.readAndReset(), 0.0)
+        self.assertEqual(clock.wall_time(clock()), 100.75)
+
+    def test_default_clock(self):
+        original = default_clock()
+        clock = SimulatedClock(5.0)
+        try:
+            set_default_clock(clock)
+            timer = Timer()
+            clock.set(7.0)
+            self.assertEqual(timer.readAndReset(), 2.0)
+        finally:
+            set_default_clock(original)
+
+
+if __name__ == '__main__':
+    unittest.main()
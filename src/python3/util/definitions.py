@@ -29,6 +29,10 @@ SENSOR_ERROR_MAX = 10000000
 # TODO: make sure that this is really the expected error for this kind of sensor
 PRESSURE_SENSOR_HEIGHT_ERROR = 40
 
+# seconds between two barometer reads in the multi rate height fusion.
+# Reading the pressure sensor blocks on the I2C bus, so it is not done on every IMU tick.
+BAROMETER_SAMPLE_INTERVAL = 0.04
+
 # expected error in meters
 # TODO: Make sure the expected error is correct for the used range finder
 ULTRASONIC_SENSOR_ERROR = 0.03
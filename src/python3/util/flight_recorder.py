@@ -0,0 +1,153 @@
+import logging
+from math import nan
+from numpy import dtype, memmap, float64, ndarray
+from util.clock import default_clock
+
+logger = logging.getLogger("FlightRecorder")
+
+FILE_MAGIC = b"FREECREC"
+FILE_VERSION = 1
+
+# The file starts with a header, followed by the preallocated records.
+# count is the number of valid records. It is written after each record, so the file is consistent at any time.
+HEADER_DTYPE = dtype([("magic", "S8"), ("version", "<u4"), ("width", "<u4"), ("capacity", "<u8"), ("count", "<u8")])
+HEADER_SIZE = 64
+
+# (name, number of values) of the record fields, in the order in which they are stored. All values are float64, so a
+# record can be written as one row of floats. Missing values are NaN.
+RECORD_FIELDS = [
+    ("time", 1),                   # seconds since the epoch when the record was appended
+    # raw RTIMULib reading
+    ("imu_timestamp", 1),          # microseconds
+    ("fusion_pose", 3),            # roll, pitch, yaw
+    ("fusion_q_pose", 4),          # w, x, y, z
+    ("gyro", 3),
+    ("accel", 3),
+    ("compass", 3),
+    # barometer
+    ("air_pressure", 1),
+    ("temperature", 1),
+    # SRF02
+    ("ultrasonic_distance", 1),
+    ("ultrasonic_error", 1),
+    # GPS
+    ("gps_timestamp", 1),
+    ("gps_latitude", 1),
+    ("gps_longitude", 1),
+    ("gps_altitude", 1),
+    ("gps_altitude_error", 1),
+    ("gps_mode", 1),
+    # HeightState
+    ("height", 4),                 # height above ground, vertical speed, ground height barometer, ground height gps
+    # control loop, written with record_control after the record was appended
+    ("pid_outputs", 4),            # x, y, z rotation speeds and vertical speed
+    ("motor_signals", 4)]
+
+RECORD_DTYPE = dtype([(name, "<f8", (size,)) if size > 1 else (name, "<f8") for (name, size) in RECORD_FIELDS])
+RECORD_WIDTH = sum(size for (_, size) in RECORD_FIELDS)
+CONTROL_COLUMN = RECORD_DTYPE.fields["pid_outputs"][1] // 8
+
+
+class FlightRecorder:
+    """ Appends one fixed-size binary record per VehicleState to a preallocated memory-mapped file.
+    Appending only copies the values into the mapped pages, writing them to disk is left to the operating system, so
+    the sensor loop never waits for the disk. Use load_flight to read a recorded flight as NumPy arrays.
+
+    The recorder is a listener of the HeightProvider. The outputs of the control loop are added to the last record
+    with record_control.
+    """
+
+    # path: file to record to, it is overwritten
+    # capacity: maximum number of records, the file is created with this size. The default is one hour at 100 Hz.
+    # clock: see util.clock, the default clock if None
+    def __init__(self, path, capacity=360000, clock=None):
+        self.name = "FlightRecorder"
+        self.path = path
+        self.capacity = capacity
+        self.clock = clock if clock is not None else default_clock()
+
+        # records that did not fit into the file
+        self.dropped = 0
+
+        self._header = memmap(path, dtype=HEADER_DTYPE, mode="w+", shape=(1,))
+        self._header[0] = (FILE_MAGIC, FILE_VERSION, RECORD_WIDTH, capacity, 0)
+        self._header.flush()
+
+        # the records as rows of floats, a new record is written with a single row assignment
+        self._map = memmap(path, dtype=float64, mode="r+", offset=HEADER_SIZE, shape=(capacity, RECORD_WIDTH))
+
+        # plain ndarray views on the mapped memory, indexing a memmap creates a new memmap object every time
+        self._count = self._header["count"].view(ndarray)
+        self._rows = self._map.view(ndarray)
+        self.count = 0
+
+    # listener interface of LoggingStateProviderWithListeners
+    def new_state(self, time_since_last_update, vehicle_state):
+        self.append(vehicle_state)
+
+    # Appends a record with the sensor readings and the fused height of the given VehicleState.
+    def append(self, vehicle_state):
+        if self.count == self.capacity:
+            if self.dropped == 0:
+                logger.warning("flight recorder %s is full after %d records", self.path, self.capacity)
+            self.dropped += 1
+            return
+
+        raw = vehicle_state.attitude.raw
+        gps = vehicle_state.gps
+        height = vehicle_state.height
+
+        values = [self.clock.wall_time(self.clock()), raw["timestamp"]]
+        values += raw["fusionPose"]
+        values += raw["fusionQPose"]
+        values += raw["gyro"]
+        values += raw["accel"]
+        values += raw["compass"]
+        values += (_value(vehicle_state.air_pressure), _value(vehicle_state.temperature),
+                   vehicle_state.ultrasonic_distance, vehicle_state.ultrasonic_error,
+                   gps.timestamp, gps.latitude, gps.longitude, gps.altitude, gps.altitude_error, gps.rawmode,
+                   height.height_above_ground, height.vertical_speed, height.ground_height_barometer,
+                   height.ground_height_gps,
+                   nan, nan, nan, nan, nan, nan, nan, nan)
+
+        self._rows[self.count] = values
+        self.count += 1
+        self._count[0] = self.count
+
+    # Adds the outputs of the control loop to the last record.
+    # pid_outputs: the 4 PID outputs (x, y, z rotation speeds and vertical speed)
+    # motor_signals: the 4 motor signals
+    def record_control(self, pid_outputs, motor_signals):
+        if self.count == 0 or self.dropped > 0:
+            return
+        row = self._rows[self.count - 1]
+        row[CONTROL_COLUMN:CONTROL_COLUMN + 4] = pid_outputs
+        row[CONTROL_COLUMN + 4:] = motor_signals
+
+    # Writes the mapped pages to disk. This blocks, so it should only be called after the flight.
+    def flush(self):
+        self._map.flush()
+        self._header.flush()
+
+    def close(self):
+        self.flush()
+        del self._rows, self._map, self._count, self._header
+
+
+# Maps a recorded flight into memory without parsing it.
+# Returns a read-only structured array with one element per record and the fields of RECORD_DTYPE, for example
+# flight["gyro"] has the shape (number of records, 3).
+def load_flight(path):
+    header = memmap(path, dtype=HEADER_DTYPE, mode="r", shape=(1,))[0]
+    if header["magic"] != FILE_MAGIC or header["version"] != FILE_VERSION or header["width"] != RECORD_WIDTH:
+        raise ValueError("%s is not a flight recording of version %d" % (path, FILE_VERSION))
+
+    count = int(header["count"])
+    if count == 0:
+        return memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(1,))[:0]
+    return memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+# None stands for a missing reading
+def _value(value):
+    return nan if value is None else value
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from numpy import isnan
+from numpy.testing import assert_array_equal
+from util.flight_recorder import FlightRecorder, load_flight
+
+imu_reading = {'timestamp': 1456588586361310,
+               'compass': (1.751953363418579, -5.758125305175781, 11.735391616821289),
+               'accel': (0.049072265625, 0.008544921875, 1.035888671875),
+               'gyro': (-0.05853237956762314, 0.005321125499904156, -0.011706476099789143),
+               'fusionQPose': (0.7744086980819702, 0.018158545717597008, -0.01572602242231369, 0.6322295069694519),
+               'fusionPose': (0.008248693309724331, -0.04733514413237572, 1.3691307306289673)}
+
+
+# only the attributes that the recorder reads
+def vehicle_state(i):
+    height = SimpleNamespace(height_above_ground=i, vertical_speed=0.5, ground_height_barometer=100.0,
+                             ground_height_gps=101.0)
+    gps = SimpleNamespace(timestamp=1452000000.0 + i, latitude=48.1, longitude=11.5, altitude=520.0,
+                          altitude_error=10.0, rawmode=3)
+    return SimpleNamespace(attitude=SimpleNamespace(raw=imu_reading), height=height, gps=gps,
+                           air_pressure=1000.0 + i, temperature=None, ultrasonic_distance=1.5, ultrasonic_error=0.01)
+
+
+class TestFlightRecorder(unittest.TestCase):
+
+    def setUp(self):
+        (handle, self.path) = tempfile.mkstemp(suffix=".rec")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_record_and_load(self):
+        recorder = FlightRecorder(self.path, capacity=10)
+        for i in range(3):
+            recorder.new_state(0.01, vehicle_state(i))
+            recorder.record_control([i, 0, 0, 1], [0.1, 0.2, 0.3, 0.4])
+        recorder.close()
+
+        flight = load_flight(self.path)
+        self.assertEqual(len(flight), 3)
+        assert_array_equal(flight["height"][:, 0], [0, 1, 2])
+        assert_array_equal(flight["air_pressure"], [1000, 1001, 1002])
+        self.assertTrue(isnan(flight["temperature"]).all())
+        assert_array_equal(flight["gyro"][2], imu_reading["gyro"])
+        assert_array_equal(flight["fusion_q_pose"][0], imu_reading["fusionQPose"])
+        self.assertEqual(flight["imu_timestamp"][1], imu_reading["timestamp"])
+        self.assertEqual(flight["gps_mode"][0], 3)
+        assert_array_equal(flight["pid_outputs"][:, 0], [0, 1, 2])
+        assert_array_equal(flight["motor_signals"][1], [0.1, 0.2, 0.3, 0.4])
+
+    def test_full(self):
+        recorder = FlightRecorder(self.path, capacity=2)
+        for i in range(5):
+            recorder.append(vehicle_state(i))
+        recorder.close()
+
+        self.assertEqual(recorder.dropped, 3)
+        flight = load_flight(self.path)
+        assert_array_equal(flight["height"][:, 0], [0, 1])
+        self.assertTrue(isnan(flight["motor_signals"]).all())
+
+    def test_empty_and_invalid(self):
+        FlightRecorder(self.path, capacity=2).close()
+        self.assertEqual(len(load_flight(self.path)), 0)
+
+        with open(self.path, "r+b") as f:
+            f.write(b"NOTAFLIGHT")
+        with self.assertRaises(ValueError):
+            load_flight(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
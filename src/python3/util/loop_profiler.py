@@ -0,0 +1,135 @@
+import logging
+import signal
+from util.clock import default_clock
+
+logger = logging.getLogger("LoopProfiler")
+
+# Stages of one loop iteration, in the order in which they run
+IMU_READ = 0
+BAROMETER_READ = 1
+ULTRASONIC_READ = 2
+GPS_READ = 3
+KALMAN_PREDICT = 4
+KALMAN_UPDATE = 5
+PLANNING = 6
+PID = 7
+MIXER = 8
+MOTOR_WRITE = 9
+
+STAGE_NAMES = ("IMU read", "barometer read", "SRF02 read", "GPS read", "Kalman predict", "Kalman update", "planning",
+               "PID", "mixer", "motor write")
+
+# histogram resolution and range, longer times go into the last bucket (the maximum is kept exactly)
+BUCKET_WIDTH = 0.00001
+BUCKET_COUNT = 10000
+
+
+class LatencyHistogram:
+    """ Counts durations in fixed buckets of BUCKET_WIDTH seconds, so that adding a duration is only an index
+    computation and an increment. Percentiles are computed from the buckets and are accurate to one bucket.
+    """
+
+    # deadline: durations longer than this many seconds are counted as misses, None for no deadline
+    def __init__(self, name, deadline=None):
+        self.name = name
+        self.deadline = deadline if deadline is not None else float("inf")
+        self.reset()
+
+    def reset(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.misses = 0
+
+    # duration: seconds
+    def add(self, duration):
+        index = int(duration / BUCKET_WIDTH)
+        if index >= BUCKET_COUNT:
+            index = BUCKET_COUNT - 1
+        elif index < 0:
+            index = 0
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if duration > self.deadline:
+            self.misses += 1
+
+    # upper edge of the bucket that contains the given fraction of the durations, like 0.99 for p99
+    def percentile(self, fraction):
+        if self.count == 0:
+            return 0.0
+        needed = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= needed:
+                break
+        if index == BUCKET_COUNT - 1:
+            return self.max
+        return min((index + 1) * BUCKET_WIDTH, self.max)
+
+    def mean(self):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def __str__(self):
+        return "%-15s n: %7d  mean: %7.3fms  p50: %7.3fms  p99: %7.3fms  max: %7.3fms  misses: %d" % (
+            self.name, self.count, self.mean() * 1000, self.percentile(0.5) * 1000, self.percentile(0.99) * 1000,
+            self.max * 1000, self.misses)
+
+
+class LoopProfiler:
+    """ Measures where the time of the loop iterations goes. start_iteration is called at the beginning of an
+    iteration, mark(stage) at the end of every stage, and end_iteration at the end of the iteration. The time since
+    the previous call goes into the histogram of the stage, the time of the whole iteration into the loop histogram,
+    which counts an iteration that takes longer than the deadline as a miss. Where other work runs between the stages,
+    or a stage runs several times in one iteration, begin is called at the start of the stage, and each run is one
+    duration of the stage.
+
+    The components call mark inside "if __debug__ and self.profiler is not None" blocks. Without a profiler this costs
+    only the check, and with "python3 -O" the blocks are removed entirely when the code is compiled.
+    """
+
+    # deadline: seconds that one loop iteration may take
+    # budgets: optional dictionary stage -> seconds, durations of a stage above its budget are counted as misses
+    # clock: see util.clock, the default clock if None
+    def __init__(self, deadline, budgets=None, clock=None):
+        self.clock = clock if clock is not None else default_clock()
+        budgets = budgets if budgets is not None else {}
+        self.stages = [LatencyHistogram(name, budgets.get(stage)) for (stage, name) in enumerate(STAGE_NAMES)]
+        self.loop = LatencyHistogram("loop", deadline)
+        self._iteration_start = self.clock()
+        self._last_mark = self._iteration_start
+
+    def start_iteration(self):
+        self._iteration_start = self._last_mark = self.clock()
+
+    # starts a stage: the time since the last mark does not go into any stage
+    def begin(self):
+        self._last_mark = self.clock()
+
+    # stage: one of the stage constants above, the time since the last mark is added to it
+    def mark(self, stage):
+        now = self.clock()
+        self.stages[stage].add(now - self._last_mark)
+        self._last_mark = now
+
+    def end_iteration(self):
+        self.loop.add(self.clock() - self._iteration_start)
+
+    def reset(self):
+        for histogram in self.stages:
+            histogram.reset()
+        self.loop.reset()
+
+    # one line per stage that was measured and one for the whole loop
+    def report(self):
+        lines = [str(histogram) for histogram in self.stages if histogram.count > 0]
+        lines.append(str(self.loop))
+        return "\n".join(lines)
+
+    # Logs the report whenever the process receives the given signal, for example with "kill -USR1 <pid>".
+    def dump_on_signal(self, signum=signal.SIGUSR1):
+        signal.signal(signum, lambda received, frame: logger.info("loop latencies:\n%s", self.report()))
@@ -0,0 +1,82 @@
+import unittest
+from util.clock import SimulatedClock
+from util.loop_profiler import LatencyHistogram, LoopProfiler, IMU_READ, KALMAN_UPDATE, PID, BUCKET_WIDTH
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram("test", deadline=0.0095)
+        for i in range(1, 101):
+            histogram.add(i * 0.0001)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean(), 0.00505)
+        self.assertAlmostEqual(histogram.percentile(0.5), 0.005, delta=BUCKET_WIDTH)
+        self.assertAlmostEqual(histogram.percentile(0.99), 0.0099, delta=BUCKET_WIDTH)
+        self.assertEqual(histogram.percentile(1.0), 0.01)
+        self.assertEqual(histogram.misses, 5)
+
+        histogram.reset()
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(histogram.percentile(0.5), 0.0)
+
+    def test_overflow(self):
+        histogram = LatencyHistogram("test")
+        histogram.add(5.0)
+        self.assertEqual(histogram.max, 5.0)
+        self.assertEqual(histogram.percentile(0.99), 5.0)
+        self.assertEqual(histogram.misses, 0)
+
+
+class TestLoopProfiler(unittest.TestCase):
+
+    def test_stages(self):
+        clock = SimulatedClock()
+        profiler = LoopProfiler(0.02, budgets={KALMAN_UPDATE: 0.002}, clock=clock)
+        for i in range(10):
+            profiler.start_iteration()
+            clock.advance(0.004)
+            profiler.mark(IMU_READ)
+            clock.advance(0.001 if i < 8 else 0.003)
+            profiler.mark(KALMAN_UPDATE)
+            clock.advance(0.0005 if i < 9 else 0.02)
+            profiler.mark(PID)
+            profiler.end_iteration()
+
+        self.assertEqual(profiler.stages[IMU_READ].count, 10)
+        self.assertAlmostEqual(profiler.stages[IMU_READ].mean(), 0.004)
+        self.assertEqual(profiler.stages[KALMAN_UPDATE].misses, 2)
+        self.assertEqual(profiler.stages[PID].misses, 0)
+        self.assertEqual(profiler.loop.misses, 1)
+        self.assertAlmostEqual(profiler.loop.max, 0.027)
+
+        report = profiler.report().splitlines()
+        self.assertEqual(len(report), 4)
+        self.assertTrue(report[0].startswith("IMU read"))
+        self.assertTrue(report[-1].startswith("loop"))
+
+        profiler.reset()
+        self.assertEqual(profiler.report().splitlines()[0].split()[0], "loop")
+
+    def test_begin(self):
+        clock = SimulatedClock()
+        profiler = LoopProfiler(0.02, clock=clock)
+        profiler.start_iteration()
+        clock.advance(0.003)
+        profiler.begin()
+        clock.advance(0.001)
+        profiler.mark(KALMAN_UPDATE)
+        clock.advance(0.005)
+        profiler.begin()
+        clock.advance(0.002)
+        profiler.mark(KALMAN_UPDATE)
+        profiler.end_iteration()
+
+        self.assertEqual(profiler.stages[KALMAN_UPDATE].count, 2)
+        self.assertAlmostEqual(profiler.stages[KALMAN_UPDATE].total, 0.003)
+        self.assertAlmostEqual(profiler.loop.max, 0.011)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import logging
+import os
+from util.clock import default_clock
+from util.loop_profiler import LatencyHistogram
+
+logger = logging.getLogger("LoopScheduler")
+
+# What happens when an iteration takes longer than the period:
+# SKIP: the next iteration starts at once, the deadlines that were missed completely are dropped
+SKIP = "skip"
+# CATCH_UP: the missed iterations are run back to back without waiting until the loop is on time again
+CATCH_UP = "catch-up"
+# DEGRADE: like SKIP, but the loop also runs at half the rate (down to 1 / MAX_RATE_DIVIDER). After RECOVERY_ITERATIONS
+# iterations in a row that were on time, the rate is doubled again.
+DEGRADE = "degrade"
+
+OVERRUN_POLICIES = (SKIP, CATCH_UP, DEGRADE)
+
+# CATCH_UP never runs more than this many late iterations, older deadlines are skipped
+MAX_CATCH_UP = 10
+
+MAX_RATE_DIVIDER = 8
+RECOVERY_ITERATIONS = 50
+
+
+class FixedRateScheduler:
+    """ Runs a loop at a fixed rate. The deadlines are absolute: the n-th iteration is due at start + n * period, so
+    neither the duration of the iterations nor the wake-up latency of the sleeps add up to a drift. In contrast,
+    sleeping for a period after every iteration makes the loop slower by the duration of the iteration and the
+    latency of every sleep.
+
+    The scheduler sleeps until shortly before the deadline (spin seconds) and busily waits for the rest, because the
+    wake-up of a sleep is late by up to a few hundred microseconds.
+
+    Optionally, the thread that runs the loop gets a SCHED_FIFO real-time priority (the loop is then only interrupted
+    by threads and interrupts of higher priority) and is bound to some CPUs. Both need the rights to do so, without
+    them a warning is logged and the loop runs with the normal priority.
+    """
+
+    # period: seconds between the starts of two iterations
+    # overrun_policy: one of OVERRUN_POLICIES
+    # priority: SCHED_FIFO priority from 1 to 99, None to keep the normal scheduling
+    # cpus: set of CPU numbers to run on, None for all
+    # spin: seconds before the deadline at which the sleep ends and the busy waiting starts.
+    #       Must be 0 with a SimulatedClock, as it does not advance while waiting.
+    # clock: see util.clock, the default clock if None
+    def __init__(self, period, overrun_policy=SKIP, priority=None, cpus=None, spin=0.0, clock=None):
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError("unknown overrun policy %s, must be one of %s" % (overrun_policy, OVERRUN_POLICIES))
+
+        self.period = period
+        self.overrun_policy = overrun_policy
+        self.priority = priority
+        self.cpus = cpus
+        self.spin = spin
+        self.clock = clock if clock is not None else default_clock()
+
+        # seconds between the deadline and the start of the iteration, deadline misses are overruns
+        self.latency = LatencyHistogram("wake-up latency", period)
+        # iterations that ended after the deadline of the next one
+        self.overruns = 0
+        # deadlines that were dropped
+        self.skipped = 0
+        # the loop runs at 1 / rate_divider of the configured rate
+        self.rate_divider = 1
+
+        self.running = False
+        self._start = None
+        self._tick = 0
+        self._last_start = None
+        self._on_time = 0
+
+    # Applies the priority and CPU affinity to the calling thread and starts counting the deadlines from now.
+    def start(self):
+        set_realtime(self.priority, self.cpus)
+        self._start = self._last_start = self.clock()
+        self._tick = 0
+        self._on_time = 0
+        self.rate_divider = 1
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    # Waits for the deadline of the next iteration, or handles the overrun if it already passed.
+    # returns the seconds since the start of the previous iteration
+    def wait(self):
+        if self._start is None:
+            self.start()
+
+        self._tick += self.rate_divider
+        deadline = self._start + self._tick * self.period
+        now = self.clock()
+
+        if now > deadline:
+            self._on_time = 0
+            self.overruns += 1
+            self._handle_overrun(now)
+        else:
+            self._on_time += 1
+            if self.rate_divider > 1 and self._on_time >= RECOVERY_ITERATIONS:
+                self.rate_divider //= 2
+                self._on_time = 0
+                logger.info("back to 1/%d of the loop rate", self.rate_divider)
+            self._sleep_until(deadline)
+            now = self.clock()
+
+        self.latency.add(now - self._start - self._tick * self.period)
+        time_delta = now - self._last_start
+        self._last_start = now
+        return time_delta
+
+    def _handle_overrun(self, now):
+        if self.overrun_policy == DEGRADE and self.rate_divider < MAX_RATE_DIVIDER:
+            self.rate_divider *= 2
+            logger.warning("loop overrun, degrading to 1/%d of the loop rate", self.rate_divider)
+
+        # deadlines after the current one that passed as well
+        missed = int((now - self._start) / self.period) - self._tick
+        if missed <= 0:
+            return
+
+        if self.overrun_policy == CATCH_UP:
+            # the late iterations run back to back, each following wait finds its deadline passed as well
+            if missed > MAX_CATCH_UP:
+                self._skip(missed - MAX_CATCH_UP)
+        else:
+            self._skip(missed)
+
+    def _skip(self, deadlines):
+        self._tick += deadlines
+        self.skipped += deadlines
+
+    def _sleep_until(self, deadline):
+        remaining = deadline - self.clock()
+        if remaining > self.spin:
+            self.clock.sleep(remaining - self.spin)
+        if self.spin > 0:
+            while self.clock() < deadline:
+                pass
+
+    # Runs step(time_delta) at the fixed rate until stop is called or the given number of iterations ran.
+    # time_delta is the seconds since the start of the previous iteration.
+    def run(self, step, iterations=None):
+        self.start()
+        count = 0
+        while self.running and (iterations is None or count < iterations):
+            step(self.wait())
+            count += 1
+        self.running = False
+
+    def __str__(self):
+        return "%s  overruns: %d  skipped: %d  rate: 1/%d" % (self.latency, self.overruns, self.skipped,
+                                                              self.rate_divider)
+
+
+# Gives the calling thread a SCHED_FIFO priority and binds it to the given CPUs, where given and possible.
+def set_realtime(priority=None, cpus=None):
+    if cpus is not None:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except (AttributeError, OSError) as e:
+            logger.warning("could not bind the loop to the CPUs %s: %s", cpus, e)
+
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except (AttributeError, OSError) as e:
+            logger.warning("could not set the real-time priority %d: %s", priority, e)
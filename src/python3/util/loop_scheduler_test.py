@@ -0,0 +1,67 @@
+import unittest
+from util.clock import SimulatedClock
+from util.loop_scheduler import FixedRateScheduler, SKIP, CATCH_UP, DEGRADE, RECOVERY_ITERATIONS
+
+
+class TestFixedRateScheduler(unittest.TestCase):
+
+    # runs the scheduler with iterations that take the given seconds
+    # returns the start times of the iterations
+    def run_loop(self, scheduler, clock, durations):
+        starts = []
+
+        def step(time_delta):
+            starts.append(clock())
+            clock.advance(durations[len(starts) - 1])
+
+        scheduler.run(step, len(durations))
+        return starts
+
+    def test_no_drift(self):
+        clock = SimulatedClock(10.0)
+        scheduler = FixedRateScheduler(0.01, clock=clock)
+        starts = self.run_loop(scheduler, clock, [0.001, 0.009, 0.005] * 100)
+
+        self.assertAlmostEqual(starts[-1], 10.0 + 300 * 0.01)
+        self.assertEqual(scheduler.overruns, 0)
+        self.assertLess(scheduler.latency.max, 1e-9)
+
+    def test_skip(self):
+        clock = SimulatedClock()
+        scheduler = FixedRateScheduler(0.01, SKIP, clock=clock)
+        starts = self.run_loop(scheduler, clock, [0.001, 0.025, 0.001, 0.001])
+
+        # the second iteration ends at 0.045: the deadlines 0.03 and 0.04 passed, 0.03 is dropped
+        self.assertEqual(scheduler.overruns, 1)
+        self.assertEqual(scheduler.skipped, 1)
+        self.assertAlmostEqual(starts[2], 0.045)
+        self.assertAlmostEqual(starts[3], 0.05)
+
+    def test_catch_up(self):
+        clock = SimulatedClock()
+        scheduler = FixedRateScheduler(0.01, CATCH_UP, clock=clock)
+        starts = self.run_loop(scheduler, clock, [0.001, 0.025, 0.001, 0.001, 0.001])
+
+        # the iterations of 0.03 and 0.04 run back to back, the one of 0.05 is on time again
+        self.assertEqual(scheduler.skipped, 0)
+        self.assertAlmostEqual(starts[2], 0.045)
+        self.assertAlmostEqual(starts[3], 0.046)
+        self.assertAlmostEqual(starts[4], 0.05)
+
+    def test_degrade(self):
+        clock = SimulatedClock()
+        scheduler = FixedRateScheduler(0.01, DEGRADE, clock=clock)
+        starts = self.run_loop(scheduler, clock, [0.001, 0.015] + [0.001] * (RECOVERY_ITERATIONS + 2))
+
+        self.assertEqual(scheduler.rate_divider, 1)
+        self.assertAlmostEqual(starts[2], 0.035)
+        self.assertAlmostEqual(starts[3] - starts[2], 0.015)
+        self.assertAlmostEqual(starts[4] - starts[3], 0.02)
+        self.assertAlmostEqual(starts[-1] - starts[-2], 0.01)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, FixedRateScheduler, 0.01, "never")
+
+
+if __name__ == '__main__':
+    unittest.main()
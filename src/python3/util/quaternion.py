@@ -0,0 +1,71 @@
+from numpy import array, asarray, cross, arccos, clip, ndarray
+import math
+
+
+# Quaternion operations on plain [w, x, y, z] arrays, as delivered by RTIMULib in "fusionQPose".
+# They replace pyquaternion objects in the sensor loop: no objects are created and nothing is normalized again,
+# so the quaternions must already be unit quaternions (RTIMULib takes care of that).
+#
+# The single sample functions take one quaternion (4 values) and one vector (3 values) as any sequence and work on
+# plain floats, which is much faster than numpy for so few values.
+# The batch functions take quaternions of shape (N, 4) and vectors of shape (N, 3) or (3,).
+
+
+# Rotates the vector v by the quaternion q (body frame -> world frame for an orientation quaternion).
+def rotate(q, v):
+    (w, x, y, z) = _floats(q)
+    return array(_rotate(w, x, y, z, v))
+
+
+# Rotates the vector v by the inverse of the quaternion q (world frame -> body frame for an orientation quaternion).
+def inverse_rotate(q, v):
+    (w, x, y, z) = _floats(q)
+    return array(_rotate(w, -x, -y, -z, v))
+
+
+# Angle in radians between the vector v rotated by q and the given axis. Both vectors must be unit vectors.
+def angle_to_axis(q, v, axis):
+    (w, x, y, z) = _floats(q)
+    (rx, ry, rz) = _rotate(w, x, y, z, v)
+    (ax, ay, az) = _floats(axis)
+    return math.acos(max(-1.0, min(1.0, rx * ax + ry * ay + rz * az)))
+
+
+# v + 2w (u x v) + 2 u x (u x v) with u = (x, y, z), written out so that no temporary vectors are created
+def _rotate(w, x, y, z, v):
+    (vx, vy, vz) = _floats(v)
+    tx = 2 * (y * vz - z * vy)
+    ty = 2 * (z * vx - x * vz)
+    tz = 2 * (x * vy - y * vx)
+    return (vx + w * tx + y * tz - z * ty,
+            vy + w * ty + z * tx - x * tz,
+            vz + w * tz + x * ty - y * tx)
+
+
+# numpy scalars are much slower than floats in plain arithmetic
+def _floats(values):
+    if isinstance(values, ndarray):
+        return values.tolist()
+    return values
+
+
+# Batched rotate: row i of the result is v[i] (or v) rotated by q[i].
+def rotate_batch(q, v):
+    q = asarray(q)
+    return _rotate_batch(q[:, :1], q[:, 1:], asarray(v))
+
+
+# Batched inverse_rotate: row i of the result is v[i] (or v) rotated by the inverse of q[i].
+def inverse_rotate_batch(q, v):
+    q = asarray(q)
+    return _rotate_batch(q[:, :1], -q[:, 1:], asarray(v))
+
+
+# Batched angle_to_axis: the angles between v rotated by each quaternion and the axis.
+def angle_to_axis_batch(q, v, axis):
+    return arccos(clip((rotate_batch(q, v) * axis).sum(axis=1), -1.0, 1.0))
+
+
+def _rotate_batch(w, u, v):
+    t = 2 * cross(u, v)
+    return v + w * t + cross(u, t)
@@ -0,0 +1,63 @@
+import unittest
+import math
+from numpy import array, allclose, dot
+from numpy.random import RandomState
+from pyquaternion import Quaternion
+from util.quaternion import rotate, inverse_rotate, angle_to_axis, rotate_batch, inverse_rotate_batch, \
+    angle_to_axis_batch
+
+UP_AXIS = array([0, 0, 1])
+FORWARD_AXIS = array([1, 0, 0])
+
+# fusionQPose of the sample IMU reading in state/attitude_state_test.py
+sample = (0.7744086980819702, 0.018158545717597008, -0.01572602242231369, 0.6322295069694519)
+
+
+def random_unit_quaternions(N, seed=7):
+    q = RandomState(seed).randn(N, 4)
+    return q / ((q * q).sum(axis=1) ** 0.5)[:, None]
+
+
+# compares the results with pyquaternion
+class TestQuaternion(unittest.TestCase):
+
+    def test_rotate(self):
+        v = (0.049072265625, 0.008544921875, 1.035888671875)
+        self.assertTrue(allclose(rotate(sample, v), Quaternion(array=sample).rotate(v)))
+        self.assertTrue(allclose(rotate(array(sample), array(v)), Quaternion(array=sample).rotate(v)))
+
+    def test_inverse_rotate(self):
+        v = (0.049072265625, 0.008544921875, 1.035888671875)
+        self.assertTrue(allclose(inverse_rotate(sample, v), Quaternion(array=sample).inverse.rotate(v)))
+        self.assertTrue(allclose(rotate(sample, inverse_rotate(sample, v)), v))
+
+    def test_angle_to_axis(self):
+        up = Quaternion(array=sample).rotate(UP_AXIS)
+        self.assertAlmostEqual(angle_to_axis(sample, UP_AXIS, UP_AXIS), math.acos(dot(up, UP_AXIS)))
+        self.assertEqual(angle_to_axis((1, 0, 0, 0), UP_AXIS, UP_AXIS), 0)
+
+        # 90 degrees around the y axis turns forward to down
+        half = math.sqrt(0.5)
+        self.assertAlmostEqual(angle_to_axis((half, 0, half, 0), FORWARD_AXIS, UP_AXIS), math.pi)
+
+    def test_batch(self):
+        q = random_unit_quaternions(50)
+        v = RandomState(8).randn(50, 3)
+
+        rotated = rotate_batch(q, v)
+        inverse = inverse_rotate_batch(q, v)
+        angles = angle_to_axis_batch(q, FORWARD_AXIS, UP_AXIS)
+        for i in range(len(q)):
+            self.assertTrue(allclose(rotated[i], Quaternion(array=q[i]).rotate(v[i])))
+            self.assertTrue(allclose(inverse[i], Quaternion(array=q[i]).inverse.rotate(v[i])))
+            self.assertAlmostEqual(angles[i], angle_to_axis(q[i], FORWARD_AXIS, UP_AXIS))
+
+    def test_batch_with_one_vector(self):
+        q = random_unit_quaternions(10)
+        rotated = rotate_batch(q, UP_AXIS)
+        for i in range(len(q)):
+            self.assertTrue(allclose(rotated[i], rotate(q[i], UP_AXIS)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,20 @@
-from datetime import datetime
+from util.clock import default_clock
 
 
 # Helper class to quickly get the time since last update / last method invocation
 class Timer:
 
-    def __init__(self):
+    # clock: see util.clock, the default clock if None
+    def __init__(self, clock=None):
+        self.__clock = clock if clock is not None else default_clock()
         self.__lastUpdate = 0
         self.reset()
 
     def reset(self):
-        self.__lastUpdate = datetime.now()
+        self.__lastUpdate = self.__clock()
 
     def readAndReset(self):
-        time_since_last_reset = (datetime.now() - self.__lastUpdate).total_seconds()
-        self.reset()
+        now = self.__clock()
+        time_since_last_reset = now - self.__lastUpdate
+        self.__lastUpdate = now
         return time_since_last_reset